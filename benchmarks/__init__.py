@@ -0,0 +1,5 @@
+"""
+Бенчмарки конвейера анализа запасов на синтетических данных.
+
+Запуск: python -m benchmarks.run_benchmarks --scale small --output results.json
+"""
@@ -0,0 +1,169 @@
+"""
+Генераторы синтетических данных запасов для бенчмарков.
+
+Данные повторяют формат шаблона historical_data_correct_template.xlsx
+(см. scripts/create_correct_template.py): сезонное потребление с трендом,
+нерегулярные поставки и балансовое уравнение
+конец = начало + поступление - потребление. Размер задается числом
+материалов × филиалов × периодов, генерация векторная - миллионы строк
+строятся за секунды.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Колонки исторических данных (распознаются auto_detect_columns)
+DATE_COLUMN = 'Дата'
+BRANCH_COLUMN = 'Филиал'
+MATERIAL_COLUMN = 'Материал'
+START_COLUMN = 'Начальный остаток'
+ARRIVAL_COLUMN = 'Поступление'
+CONSUMPTION_COLUMN = 'Потребление'
+END_COLUMN = 'Конечный остаток'
+COST_COLUMN = 'Конечная стоимость'
+PLANNED_DEMAND_COLUMN = 'Плановый спрос'
+
+# Масштабы: (материалов, филиалов, периодов)
+SCALES = {
+    'tiny': (5, 2, 24),
+    'small': (50, 5, 36),
+    'medium': (500, 10, 36),
+    'large': (5000, 20, 36),
+}
+
+
+def make_historical_data(n_materials, n_branches, n_periods, seed=0, start_date='2021-01-01'):
+    """
+    Синтетическая история остатков: n_materials × n_branches рядов по n_periods месяцев.
+
+    Parameters:
+    -----------
+    n_materials : int
+        Число материалов
+    n_branches : int
+        Число филиалов
+    n_periods : int
+        Число месяцев истории
+    seed : int
+        Seed генератора (одинаковый seed - одинаковые данные)
+    start_date : str
+        Первый месяц истории
+
+    Returns:
+    --------
+    pd.DataFrame: история в формате шаблона, отсортированная по материалу, филиалу и дате
+    """
+    rng = np.random.default_rng(seed)
+    n_series = n_materials * n_branches
+    t = np.arange(n_periods)
+
+    # Потребление: база ряда × сезонность × тренд × шум
+    base = rng.integers(80, 150, n_series)[:, None]
+    seasonal = 1 + 0.3 * np.sin(2 * np.pi * t / 12)[None, :]
+    trend = 1 + 0.01 * t[None, :]
+    noise = rng.uniform(0.8, 1.2, (n_series, n_periods))
+    consumption = np.round(base * seasonal * trend * noise, 2)
+
+    # Поставки примерно в 60% месяцев, объем - 1.5-2.5 месяца потребления
+    delivered = rng.random((n_series, n_periods)) < 0.6
+    arrival = np.round(np.where(delivered, consumption * rng.uniform(1.5, 2.5, (n_series, n_periods)), 0.0), 2)
+
+    # Балансовое уравнение; остаток уходит в ноль при дефиците (как в шаблоне)
+    start = np.empty((n_series, n_periods))
+    end = np.empty((n_series, n_periods))
+    balance = rng.integers(300, 500, n_series).astype(float)
+    for i in range(n_periods):
+        start[:, i] = balance
+        balance = np.round(np.maximum(0.0, balance + arrival[:, i] - consumption[:, i]), 2)
+        end[:, i] = balance
+
+    unit_price = rng.uniform(40, 70, n_series)[:, None] * (1 + 0.003 * t[None, :])
+
+    materials = np.array([f'MAT-{i:06d}' for i in range(n_materials)], dtype=object)
+    branches = np.array([f'Филиал {j + 1}' for j in range(n_branches)], dtype=object)
+    dates = pd.date_range(start_date, periods=n_periods, freq='MS')
+
+    return pd.DataFrame({
+        DATE_COLUMN: np.tile(dates.to_numpy(), n_series),
+        BRANCH_COLUMN: np.repeat(np.tile(branches, n_materials), n_periods),
+        MATERIAL_COLUMN: np.repeat(np.repeat(materials, n_branches), n_periods),
+        START_COLUMN: start.ravel(),
+        ARRIVAL_COLUMN: arrival.ravel(),
+        CONSUMPTION_COLUMN: consumption.ravel(),
+        END_COLUMN: end.ravel(),
+        COST_COLUMN: np.round(end * unit_price, 2).ravel(),
+    })
+
+
+def make_irregular_history(periods_list, n_branches=2, seed=0, start_date='2021-01-01', zero_share=0.2,
+                           deficit_share=0.1):
+    """
+    История с группами разной длины (в т.ч. короче сезонного окна), месяцами
+    без списания и дефицитами (отрицательный конечный остаток); строки перемешаны.
+
+    Parameters:
+    -----------
+    periods_list : sequence of int
+        Число месяцев истории материала i (у всех его филиалов)
+    n_branches : int
+        Число филиалов
+    seed : int
+        Seed генератора
+    start_date : str
+        Первый месяц истории
+    zero_share : float
+        Доля месяцев без списания
+    deficit_share : float
+        Доля месяцев с дефицитом
+
+    Returns:
+    --------
+    pd.DataFrame: история в формате шаблона (как make_historical_data)
+    """
+    rng = np.random.default_rng(seed)
+    df = make_historical_data(len(periods_list), n_branches, max(periods_list), seed=seed, start_date=start_date)
+
+    # Обрезаем ряды материала i до periods_list[i] месяцев
+    material_index = df[MATERIAL_COLUMN].str.slice(4).astype(int).to_numpy()
+    period_index = np.tile(np.arange(max(periods_list)), len(periods_list) * n_branches)
+    df = df[period_index < np.asarray(periods_list)[material_index]].reset_index(drop=True)
+
+    zero = rng.random(len(df)) < zero_share
+    df.loc[zero, CONSUMPTION_COLUMN] = 0.0
+    deficit = rng.random(len(df)) < deficit_share
+    df.loc[deficit, END_COLUMN] = -np.round(rng.uniform(1, 50, int(deficit.sum())), 2)
+
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def make_forecast_data(historical_df, n_periods=12, seed=0):
+    """
+    Прогнозный файл (ручной режим) на n_periods месяцев после конца истории.
+
+    Плановый спрос - среднее потребление ряда с шумом ±20%.
+    """
+    rng = np.random.default_rng(seed)
+    keys = historical_df[[MATERIAL_COLUMN, BRANCH_COLUMN]].drop_duplicates()
+    mean_consumption = (
+        historical_df.groupby([MATERIAL_COLUMN, BRANCH_COLUMN], sort=False)[CONSUMPTION_COLUMN].mean()
+        .reindex(pd.MultiIndex.from_frame(keys)).to_numpy()
+    )
+    dates = pd.date_range(historical_df[DATE_COLUMN].max() + pd.DateOffset(months=1), periods=n_periods, freq='MS')
+    n_series = len(keys)
+
+    return pd.DataFrame({
+        DATE_COLUMN: np.tile(dates.to_numpy(), n_series),
+        MATERIAL_COLUMN: np.repeat(keys[MATERIAL_COLUMN].to_numpy(), n_periods),
+        BRANCH_COLUMN: np.repeat(keys[BRANCH_COLUMN].to_numpy(), n_periods),
+        PLANNED_DEMAND_COLUMN: np.round(
+            np.repeat(mean_consumption, n_periods) * rng.uniform(0.8, 1.2, n_series * n_periods), 2
+        ),
+    })
+
+
+def make_scale(scale, seed=0):
+    """История и прогноз для именованного масштаба из SCALES"""
+    if scale not in SCALES:
+        raise ValueError(f"Неизвестный масштаб: '{scale}'. Доступны: {', '.join(SCALES)}")
+    historical_df = make_historical_data(*SCALES[scale], seed=seed)
+    return historical_df, make_forecast_data(historical_df, seed=seed)
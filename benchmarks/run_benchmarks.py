@@ -0,0 +1,337 @@
+"""
+Бенчмарки этапов анализа: время, пиковая память, JSON для сравнения версий.
+
+Этапы:
+- historical - analyze_historical_data
+- forecast:<модель> - auto_forecast_demand для каждой модели
+- start_balance - forecast_start_balance
+- recommendations - calculate_purchase_recommendations
+- export - export_full_report (xlsx во временный каталог)
+
+Время - минимум и медиана по --repeat запускам; пиковая память - отдельный
+запуск под tracemalloc (он замедляет код, поэтому не смешивается с замером
+времени). Прогноз линеен по числу рядов и медленный, поэтому считается на
+первых --forecast-series рядах.
+
+Примеры:
+    python -m benchmarks.run_benchmarks --scale small --output bench_small.json
+    python -m benchmarks.run_benchmarks --scale small --compare bench_small.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import data_generators as gen
+from src.analysis.historical_analysis import analyze_historical_data
+from src.analysis.forecast_analysis import (
+    auto_forecast_demand, forecast_start_balance, calculate_purchase_recommendations
+)
+
+
+FORECAST_MODELS = ['naive', 'moving_average', 'exponential_smoothing', 'holt_winters', 'sarima', 'auto']
+STAGES = ['historical', 'forecast', 'start_balance', 'recommendations', 'export']
+
+
+def measure(func, repeat=3, track_memory=True):
+    """
+    Время выполнения func (секунды) и пиковая память Python-аллокаций (МБ).
+
+    Returns:
+    --------
+    dict: min_s, median_s, runs_s, peak_memory_mb (None без track_memory)
+    """
+    runs = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+
+    peak_memory_mb = None
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_memory_mb = peak / 1024 ** 2
+
+    return {
+        'min_s': min(runs),
+        'median_s': statistics.median(runs),
+        'runs_s': runs,
+        'peak_memory_mb': peak_memory_mb,
+    }
+
+
+def _stage_result(stage, rows, measurement, **extra):
+    result = {'stage': stage, 'rows': int(rows), **measurement, **extra}
+    result['rows_per_s'] = rows / measurement['median_s'] if measurement['median_s'] > 0 else None
+    return result
+
+
+def _first_series(historical_df, n_series):
+    """Строки первых n_series рядов материал/филиал"""
+    codes = historical_df.groupby([gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN], sort=False).ngroup()
+    return historical_df[codes.to_numpy() < n_series].reset_index(drop=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=root_dir,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment():
+    import scipy
+    import statsmodels
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__,
+        'statsmodels': statsmodels.__version__,
+        'git_commit': _git_commit(),
+    }
+
+
+def run_benchmarks(scale='small', stages=None, models=None, repeat=3, forecast_series=200,
+                   forecast_periods=12, track_memory=True, seed=0, log=print):
+    """
+    Запускает бенчмарки выбранных этапов на синтетических данных.
+
+    Parameters:
+    -----------
+    scale : str
+        Масштаб данных из data_generators.SCALES
+    stages : list, optional
+        Этапы из STAGES (по умолчанию все)
+    models : list, optional
+        Модели для этапа forecast (по умолчанию FORECAST_MODELS)
+    repeat : int
+        Число запусков для замера времени
+    forecast_series : int
+        Сколько рядов прогнозировать на этапе forecast
+    forecast_periods : int
+        Горизонт прогноза (месяцев)
+    track_memory : bool
+        Замерять пиковую память (дополнительный запуск под tracemalloc)
+    seed : int
+        Seed генератора данных
+    log : callable
+        Вывод прогресса (None - без вывода)
+
+    Returns:
+    --------
+    dict: метаданные запуска и список результатов этапов ('results')
+    """
+    stages = list(stages or STAGES)
+    models = list(models or FORECAST_MODELS)
+    log = log or (lambda message: None)
+
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Неизвестные этапы: {unknown}. Доступны: {', '.join(STAGES)}")
+
+    historical_df, forecast_df = gen.make_scale(scale, seed=seed)
+    n_materials, n_branches, n_periods = gen.SCALES[scale]
+    log(f"Масштаб '{scale}': {len(historical_df)} строк истории, {len(forecast_df)} строк прогноза")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'scale': scale,
+        'dimensions': {'materials': n_materials, 'branches': n_branches, 'periods': n_periods},
+        'historical_rows': len(historical_df),
+        'forecast_rows': len(forecast_df),
+        'repeat': repeat,
+        'environment': _environment(),
+        'results': [],
+    }
+
+    historical_args = (gen.DATE_COLUMN, gen.BRANCH_COLUMN, gen.MATERIAL_COLUMN, gen.START_COLUMN,
+                       gen.END_COLUMN, gen.COST_COLUMN, 0.05)
+
+    def add(result):
+        report['results'].append(result)
+        memory = f", пик памяти {result['peak_memory_mb']:.1f} МБ" if result['peak_memory_mb'] is not None else ''
+        log(f"  {result['stage']:<32} {result['median_s']:9.3f} с{memory}")
+
+    hist_results = None
+    if 'historical' in stages or 'export' in stages:
+        def historical():
+            return analyze_historical_data(historical_df.copy(), *historical_args,
+                                           consumption_column=gen.CONSUMPTION_COLUMN)
+        if 'historical' in stages:
+            add(_stage_result('historical', len(historical_df), measure(historical, repeat, track_memory)))
+        hist_results, _ = historical()
+
+    if 'forecast' in stages:
+        subset = _first_series(historical_df, forecast_series)
+        n_series = subset.groupby([gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN], sort=False).ngroups
+        for model in models:
+            def forecast():
+                return auto_forecast_demand(subset.copy(), forecast_periods, gen.DATE_COLUMN, gen.MATERIAL_COLUMN,
+                                            gen.BRANCH_COLUMN, gen.CONSUMPTION_COLUMN, forecast_model=model)
+            measurement = measure(forecast, repeat, track_memory)
+            add(_stage_result(f'forecast:{model}', len(subset), measurement, series=n_series,
+                              series_per_s=n_series / measurement['median_s']))
+
+    forecast_frame = forecast_df.copy()
+    if 'start_balance' in stages or 'recommendations' in stages or 'export' in stages:
+        def start_balance():
+            return forecast_start_balance(historical_df, forecast_df, gen.DATE_COLUMN, gen.MATERIAL_COLUMN,
+                                          gen.BRANCH_COLUMN, gen.END_COLUMN, gen.DATE_COLUMN,
+                                          gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN, forecast_model='naive')
+        if 'start_balance' in stages:
+            add(_stage_result('start_balance', len(forecast_df), measure(start_balance, repeat, track_memory)))
+        forecast_frame['Прогноз остатка на начало'] = start_balance()
+        forecast_frame['Прогноз остатка на конец'] = (
+            forecast_frame['Прогноз остатка на начало'] - forecast_frame[gen.PLANNED_DEMAND_COLUMN]
+        )
+
+    if 'recommendations' in stages or 'export' in stages:
+        def recommendations():
+            return calculate_purchase_recommendations(
+                forecast_frame, 'Прогноз остатка на конец', gen.PLANNED_DEMAND_COLUMN, 0.2,
+                group_columns=[gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN], date_column=gen.DATE_COLUMN
+            )
+        if 'recommendations' in stages:
+            add(_stage_result('recommendations', len(forecast_frame), measure(recommendations, repeat, track_memory)))
+        forecast_frame = pd.concat([forecast_frame, recommendations()], axis=1)
+
+    if 'export' in stages:
+        # Экспорт использует xlsxwriter и не требует PyQt
+        from src.desktop.excel_export_desktop import export_full_report
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'report.xlsx')
+
+            def export():
+                if not export_full_report(path, hist_results, None, forecast_frame, None):
+                    raise RuntimeError("export_full_report завершился с ошибкой")
+
+            measurement = measure(export, repeat, track_memory)
+            add(_stage_result('export', len(hist_results) + len(forecast_frame), measurement,
+                              file_size_mb=os.path.getsize(path) / 1024 ** 2))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report['max_rss_mb'] = _max_rss_mb()
+    return report
+
+
+def _max_rss_mb():
+    """Пиковый RSS процесса (только Unix)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+def save_results(report, path):
+    """Сохраняет результаты в JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    Сравнивает медианное время этапов с базовым запуском.
+
+    Parameters:
+    -----------
+    baseline, current : dict
+        Результаты run_benchmarks (или загруженные из JSON)
+    threshold : float
+        Допустимое относительное замедление (0.2 = 20%)
+
+    Returns:
+    --------
+    list of dict: stage, baseline_s, current_s, ratio, regression - для этапов,
+        которые есть в обоих запусках
+    """
+    baseline_by_stage = {result['stage']: result for result in baseline['results']}
+    comparison = []
+    for result in current['results']:
+        base = baseline_by_stage.get(result['stage'])
+        if base is None:
+            continue
+        ratio = result['median_s'] / base['median_s'] if base['median_s'] > 0 else np.inf
+        comparison.append({
+            'stage': result['stage'],
+            'baseline_s': base['median_s'],
+            'current_s': result['median_s'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки конвейера анализа запасов")
+    parser.add_argument('--scale', default='small', choices=list(gen.SCALES), help="Масштаб синтетических данных")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help="Этапы (по умолчанию все)")
+    parser.add_argument('--models', nargs='+', choices=FORECAST_MODELS, help="Модели для этапа forecast")
+    parser.add_argument('--repeat', type=int, default=3, help="Число запусков для замера времени")
+    parser.add_argument('--forecast-series', type=int, default=200, help="Рядов на этапе forecast")
+    parser.add_argument('--no-memory', action='store_true', help="Не замерять пиковую память")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Файл JSON для результатов")
+    parser.add_argument('--compare', help="JSON базового запуска для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Допустимое замедление (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        scale=args.scale, stages=args.stages, models=args.models, repeat=args.repeat,
+        forecast_series=args.forecast_series, track_memory=not args.no_memory, seed=args.seed
+    )
+    if args.output:
+        save_results(report, args.output)
+        print(f"Результаты сохранены: {args.output}")
+
+    if args.compare:
+        comparison = compare_results(load_results(args.compare), report, args.threshold)
+        print(f"\nСравнение с {args.compare} (порог {args.threshold:.0%}):")
+        for row in comparison:
+            mark = 'РЕГРЕССИЯ' if row['regression'] else 'ok'
+            print(f"  {row['stage']:<32} {row['baseline_s']:9.3f} с -> {row['current_s']:9.3f} с "
+                  f"(x{row['ratio']:.2f}) {mark}")
+        if any(row['regression'] for row in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+-- История запасов для локального хранилища (src/utils/history_store.py, SQLite).
+-- Одна строка - материал/филиал/период; колонки названы по ролям auto_detect_columns.
+-- Скрипт идемпотентен: выполняется при каждом открытии хранилища.
+
+CREATE TABLE IF NOT EXISTS historical_data (
+    id INTEGER PRIMARY KEY,
+    material TEXT NOT NULL,
+    branch TEXT NOT NULL,            -- '' для файлов без колонки филиала
+    date TEXT NOT NULL,              -- ISO 8601: YYYY-MM-DDTHH:MM:SS
+    start_quantity REAL,
+    arrival REAL,
+    consumption REAL,
+    end_quantity REAL,
+    end_cost REAL,
+    planned_demand REAL,
+    load_id INTEGER REFERENCES history_loads (id)
+);
+
+-- Срезы по группе и диапазону дат, упорядоченное чтение групп, водяные знаки групп (MAX(date))
+CREATE INDEX IF NOT EXISTS idx_historical_data_group_date ON historical_data (material, branch, date);
+
+-- Последняя дата в базе и выборки по диапазону дат
+CREATE INDEX IF NOT EXISTS idx_historical_data_date ON historical_data (date);
+
+-- Журнал загрузок
+CREATE TABLE IF NOT EXISTS history_loads (
+    id INTEGER PRIMARY KEY,
+    loaded_at TEXT NOT NULL,
+    source TEXT,
+    rows INTEGER NOT NULL,
+    min_date TEXT,
+    max_date TEXT
+);
@@ -33,6 +33,7 @@ HIDDEN_IMPORTS = [
     'src.analysis.historical_analysis',
     'src.analysis.forecast_analysis',
     'src.analysis.forecasting_models',
+    'src.analysis.pipeline',
     'src.utils.data_validation',
     'src.utils.utils',
     'src.utils.visualization',
@@ -1,13 +1,23 @@
 """Analysis modules for inventory management"""
-from .historical_analysis import analyze_historical_data
+from .historical_analysis import analyze_historical_data, analyze_historical_data_stream, analyze_historical_data_incremental
 from .historical_analysis import get_explanation as get_historical_explanation
+from .historical_metrics import compute_historical_metrics, format_historical_metrics, FormattedHistoricalView
+from .historical_incremental import HistoricalAggregates
 from .forecast_analysis import analyze_forecast_data, forecast_start_balance, calculate_purchase_recommendations, auto_forecast_demand
 from .forecast_analysis import get_explanation as get_forecast_explanation
-from .forecasting_models import forecast_demand, auto_select_best_model
+from .forecasting_models import forecast_demand, auto_select_best_model, auto_select_best_model_batch
+from .model_cache import ModelCache
+from .what_if import WhatIfCache
 
 __all__ = [
     'analyze_historical_data',
+    'analyze_historical_data_stream',
+    'analyze_historical_data_incremental',
     'get_historical_explanation',
+    'compute_historical_metrics',
+    'format_historical_metrics',
+    'FormattedHistoricalView',
+    'HistoricalAggregates',
     'analyze_forecast_data',
     'get_forecast_explanation',
     'forecast_start_balance',
@@ -15,4 +25,7 @@ __all__ = [
     'auto_forecast_demand',
     'forecast_demand',
     'auto_select_best_model',
+    'auto_select_best_model_batch',
+    'ModelCache',
+    'WhatIfCache',
 ]
@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import plotly.express as px
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
 # Добавляем корневую директорию в PYTHONPATH
@@ -10,6 +12,13 @@ root_dir = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(root_dir))
 
 from src.analysis import forecasting_models as fm
+from src.analysis.historical_metrics import sorted_group_offsets
+from src.utils.progress import AnalysisCancelled, ProgressTracker, check_cancelled
+
+# Пачек на воркер, когда нужен прогресс: пачки мельче - прогресс и отмена точнее
+PROGRESS_BATCHES_PER_WORKER = 16
+# Как часто (с) проверять отмену, пока воркеры считают пачки
+CANCEL_POLL_S = 0.2
 
 def analyze_forecast_data(df, date_column, material_column, branch_column, demand_column,
                           start_balance_column, end_balance_column, recommendation_column,
@@ -353,10 +362,14 @@ def get_explanation(row, date_column, material_column, branch_column, demand_col
 
 def forecast_start_balance(historical_df, forecast_df, date_column, material_column, branch_column, end_quantity_column,
                            forecast_date_column, forecast_material_column, forecast_branch_column,
-                           forecast_model='naive', seasonal_periods=12):
+                           forecast_model='naive', seasonal_periods=12, progress=None, cancel_token=None):
     """
     Прогнозирует начальные остатки с использованием моделей прогнозирования
 
+    Историю сортируем один раз и строим индекс (материал, филиал) -> остатки;
+    модель подбирается один раз на уникальный ключ прогноза, результат
+    раскладывается по всем его строкам.
+
     Parameters:
     -----------
     forecast_model : str
@@ -364,48 +377,262 @@ def forecast_start_balance(historical_df, forecast_df, date_column, material_col
         'holt_winters', 'sarima', 'auto' (по умолчанию 'naive')
     seasonal_periods : int
         Длина сезонного цикла для моделей с сезонностью (по умолчанию 12 для месячных данных)
+    progress : callable, optional
+        progress(info) - прогресс по уникальным ключам прогноза (см. src.utils.progress.ProgressTracker)
+    cancel_token : CancellationToken, optional
+        Токен отмены: расчет прерывается исключением AnalysisCancelled
 
     Returns:
     --------
     pd.Series: Прогнозированные начальные остатки
     """
-    forecast_start_balances = []
+    # Индекс (материал, филиал) -> отсортированный по дате срез конечных остатков
+    order, bounds, keys = sorted_group_offsets(historical_df, [material_column, branch_column], date_column)
+    end_values = historical_df[end_quantity_column].to_numpy()[order]
+    group_index = {key: i for i, key in enumerate(keys)}
+
+    # Уникальные ключи прогноза: одна модель на ключ, а не на каждую строку
+    row_keys = pd.Series(
+        list(zip(forecast_df[forecast_material_column].tolist(), forecast_df[forecast_branch_column].tolist())),
+        dtype=object
+    )
+    codes, unique_keys = pd.factorize(row_keys)
+    tracker = ProgressTracker('start_balance', len(unique_keys), callback=progress, cancel_token=cancel_token)
+    tracker.start()
+
+    balances = []
+    model_positions = []
+    model_series = []
+    for key in unique_keys:
+        i = group_index.get(key)
+        if i is None:
+            # Нет исторических данных - используем 0
+            balances.append(0)
+            continue
+        historical_series = end_values[bounds[i]:bounds[i + 1]]
+        # Naive forecast или слишком мало данных - последний остаток
+        balances.append(historical_series[-1])
+        if forecast_model != 'naive' and len(historical_series) >= 3:
+            model_positions.append(len(balances) - 1)
+            model_series.append(historical_series)
+    # Ключи без модели готовы сразу, ряды с моделью отмечаются по мере прогноза
+    tracker.advance(len(unique_keys) - len(model_series))
+
+    # Прогноз моделью (при ошибке - naive, см. _forecast_series)
+    for position, forecast in zip(model_positions,
+                                  _forecast_all_series(model_series, 1, forecast_model, seasonal_periods,
+                                                       tracker=tracker)):
+        balances[position] = forecast[0]
+    tracker.finish()
+
+    # Раскладываем значения по строкам прогноза
+    unique_balances = pd.Series(balances, dtype=None if balances else float)
+    return pd.Series(unique_balances.to_numpy()[codes], index=forecast_df.index)
+
+# Ключи метаданных прогноза ряда (см. fm.forecast_demand)
+FORECAST_METADATA_KEYS = ('model_requested', 'model_selected', 'model_used', 'fallback_chain', 'fit_time_s',
+                          'selection_time_s', 'iterations', 'cache_hit', 'n_obs')
+
+
+def _naive_metadata(forecast_model, n_obs, reason):
+    """Метаданные ряда, для которого вместо модели использован naive"""
+    return {
+        'model_requested': forecast_model,
+        'model_selected': forecast_model,
+        'model_used': 'naive',
+        'fallback_chain': [{'model': forecast_model, 'reason': reason}] if forecast_model != 'naive' else [],
+        'fit_time_s': 0.0,
+        'selection_time_s': 0.0,
+        'iterations': None,
+        'cache_hit': None,
+        'n_obs': n_obs,
+    }
+
+
+def _forecast_series(values, forecast_periods, forecast_model, seasonal_periods, forecast_kwargs=None):
+    """
+    Прогноз одного ряда потребления; при любой ошибке - naive (последнее значение).
 
-    for _, forecast_row in forecast_df.iterrows():
-        material = forecast_row[forecast_material_column]
-        branch = forecast_row[forecast_branch_column]
+    forecast_kwargs - дополнительные параметры fm.forecast_demand (n_folds, cache).
+    forecast_model может быть парой (модель пакетного выбора, ее MAPE): тогда
+    модель сначала сравнивается с holt_winters (fm.challenge_with_holt_winters).
 
-        # Получаем исторические данные для данного материала/филиала
-        historical_series = historical_df[
-            (historical_df[material_column] == material) &
-            (historical_df[branch_column] == branch)
-        ].sort_values(date_column)[end_quantity_column]
+    Returns:
+    --------
+    tuple: (прогноз - list, метаданные - dict с ключами FORECAST_METADATA_KEYS)
+    """
+    consumption_series = pd.Series(values)
+
+    if isinstance(forecast_model, tuple):
+        batch_model, batch_mape = forecast_model
+        forecast_model = fm.challenge_with_holt_winters(consumption_series, batch_model, batch_mape,
+                                                        seasonal_periods=seasonal_periods)
+
+    if len(consumption_series) < 3:
+        # Слишком мало данных - используем naive forecast
+        return ([consumption_series.iloc[-1]] * forecast_periods,
+                _naive_metadata(forecast_model, len(consumption_series), "меньше 3 наблюдений"))
+
+    try:
+        result = fm.forecast_demand(
+            consumption_series,
+            horizon=forecast_periods,
+            model=forecast_model,
+            seasonal_periods=seasonal_periods,
+            **(forecast_kwargs or {})
+        )
+        metadata = {key: result.get(key) for key in FORECAST_METADATA_KEYS}
+        metadata['n_obs'] = len(consumption_series)
+        return list(result['forecast']), metadata
+    except Exception as e:
+        # Fallback на naive
+        return ([consumption_series.iloc[-1]] * forecast_periods,
+                _naive_metadata(forecast_model, len(consumption_series), f"{type(e).__name__}: {e}"))
 
-        if len(historical_series) == 0:
-            # Нет исторических данных - используем 0
-            forecast_start_balances.append(0)
-        elif forecast_model == 'naive' or len(historical_series) < 3:
-            # Naive forecast или слишком мало данных
-            forecast_start_balances.append(historical_series.iloc[-1])
-        else:
-            # Используем модели прогнозирования
+
+def _forecast_series_batch(batch, forecast_periods, forecast_model, seasonal_periods, forecast_kwargs=None):
+    """
+    Прогноз пачки рядов (выполняется в процессе-воркере, порядок рядов сохраняется).
+
+    forecast_model - одна модель для всех рядов или список моделей по рядам.
+    Возвращает список пар (прогноз, метаданные).
+    """
+    models = forecast_model if isinstance(forecast_model, list) else [forecast_model] * len(batch)
+    return [
+        _forecast_series(values, forecast_periods, model, seasonal_periods, forecast_kwargs)
+        for values, model in zip(batch, models)
+    ]
+
+
+def _naive_batch(batch, forecast_periods, batch_models=None, reason="ошибка воркера"):
+    """Naive прогноз для пачки, если воркер не смог ее обработать"""
+    models = batch_models if isinstance(batch_models, list) else [batch_models] * len(batch)
+    models = [model[0] if isinstance(model, tuple) else model for model in models]
+    return [([values[-1]] * forecast_periods, _naive_metadata(model, len(values), reason))
+            for values, model in zip(batch, models)]
+
+
+def _resolve_n_jobs(n_jobs):
+    """n_jobs=-1 - все ядра, None/0/1 - последовательно"""
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def _forecast_all_series(series_list, forecast_periods, forecast_model, seasonal_periods,
+                         n_jobs=1, executor=None, chunk_size=None, forecast_kwargs=None, return_metadata=False,
+                         tracker=None):
+    """
+    Прогнозирует список рядов последовательно или в пуле процессов.
+
+    forecast_model - одна модель для всех рядов или список моделей по рядам.
+    Ряды режутся на пачки по chunk_size и раздаются воркерам; результаты
+    собираются в исходном порядке. Если пачка упала целиком (например,
+    умер процесс-воркер), для ее рядов используется naive прогноз.
+    При return_metadata=True возвращает (прогнозы, метаданные рядов).
+
+    tracker (ProgressTracker) получает прогресс по рядам и проверяет отмену:
+    после отмены незапущенные пачки снимаются, а собственный пул
+    останавливается, не дожидаясь работающих воркеров.
+    """
+    workers = _resolve_n_jobs(n_jobs)
+    if executor is None and (workers == 1 or len(series_list) < 2):
+        if tracker is None:
+            pairs = _forecast_series_batch(series_list, forecast_periods, forecast_model, seasonal_periods,
+                                           forecast_kwargs)
+            return _split_results(pairs, return_metadata)
+        models = forecast_model if isinstance(forecast_model, list) else [forecast_model] * len(series_list)
+        pairs = []
+        for values, model in zip(series_list, models):
+            tracker.check()
+            pairs.append(_forecast_series(values, forecast_periods, model, seasonal_periods, forecast_kwargs))
+            tracker.advance()
+        return _split_results(pairs, return_metadata)
+
+    if chunk_size is None:
+        # ~4 пачки на воркер: баланс между накладными расходами и равномерностью загрузки;
+        # с прогрессом - пачки мельче, чтобы прогресс и отмена срабатывали чаще
+        pool_size = workers if executor is None else getattr(executor, '_max_workers', workers)
+        batches_per_worker = 4 if tracker is None else PROGRESS_BATCHES_PER_WORKER
+        chunk_size = max(1, int(np.ceil(len(series_list) / (pool_size * batches_per_worker))))
+    batches = [series_list[i:i + chunk_size] for i in range(0, len(series_list), chunk_size)]
+    if isinstance(forecast_model, list):
+        model_batches = [forecast_model[i:i + chunk_size] for i in range(0, len(series_list), chunk_size)]
+    else:
+        model_batches = [forecast_model] * len(batches)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    futures = []
+    try:
+        futures = [
+            executor.submit(_forecast_series_batch, batch, forecast_periods, batch_models, seasonal_periods,
+                            forecast_kwargs)
+            for batch, batch_models in zip(batches, model_batches)
+        ]
+        if tracker is not None:
+            _wait_with_progress(futures, batches, tracker)
+
+        pairs = []
+        for batch, batch_models, future in zip(batches, model_batches, futures):
             try:
-                result = fm.forecast_demand(
-                    historical_series,
-                    horizon=1,
-                    model=forecast_model,
-                    seasonal_periods=seasonal_periods
-                )
-                forecast_start_balances.append(result['forecast'][0])
+                pairs.extend(future.result())
             except Exception as e:
-                # В случае ошибки fallback на naive
-                forecast_start_balances.append(historical_series.iloc[-1])
+                pairs.extend(_naive_batch(batch, forecast_periods, batch_models,
+                                          f"ошибка воркера: {type(e).__name__}: {e}"))
+        return _split_results(pairs, return_metadata)
+    except AnalysisCancelled:
+        if own_executor:
+            _terminate_pool(executor)
+        else:
+            # Чужой пул не трогаем: снимаем только еще не запущенные пачки
+            for future in futures:
+                future.cancel()
+        raise
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+
+
+def _wait_with_progress(futures, batches, tracker):
+    """Ждет пачки, сообщая прогресс по рядам; отмена проверяется каждые CANCEL_POLL_S секунд"""
+    batch_sizes = {future: len(batch) for future, batch in zip(futures, batches)}
+    pending = set(futures)
+    while pending:
+        tracker.check()
+        done, pending = wait(pending, timeout=CANCEL_POLL_S, return_when=FIRST_COMPLETED)
+        if done:
+            tracker.advance(sum(batch_sizes[future] for future in done))
+
+
+def _terminate_pool(executor):
+    """
+    Останавливает собственный пул после отмены, не дожидаясь работающих воркеров.
+
+    Пул сам помечает незавершенные пачки как BrokenProcessPool, поэтому
+    futures здесь не отменяем; shutdown(wait=True) затем лишь собирает процессы.
+    """
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        if process.is_alive():
+            process.terminate()
+
+
+def _split_results(pairs, return_metadata):
+    forecasts = [forecast for forecast, _ in pairs]
+    if return_metadata:
+        return forecasts, [metadata for _, metadata in pairs]
+    return forecasts
 
-    return pd.Series(forecast_start_balances, index=forecast_df.index)
 
 def auto_forecast_demand(historical_df, forecast_periods, date_column, material_column,
                          branch_column, consumption_column, forecast_model='auto',
-                         seasonal_periods=12):
+                         seasonal_periods=12, n_jobs=1, executor=None, chunk_size=None,
+                         batch_selection=False, n_folds=1, model_cache=None, return_metadata=False,
+                         progress=None, cancel_token=None):
     """
     Автоматически прогнозирует спрос на основе исторических данных
 
@@ -422,15 +649,45 @@ def auto_forecast_demand(historical_df, forecast_periods, date_column, material_
         'exponential_smoothing', 'holt_winters', 'sarima'
     seasonal_periods : int
         Длина сезонного цикла (12 для месячных данных)
+    n_jobs : int, optional
+        Число процессов для подбора моделей: 1 - последовательно (по умолчанию),
+        -1 - все ядра. Ряды раздаются воркерам пачками, порядок результата детерминирован
+    executor : concurrent.futures.Executor, optional
+        Готовый пул (например, общий для нескольких вызовов); n_jobs тогда игнорируется
+    chunk_size : int, optional
+        Рядов в одной пачке (по умолчанию ~4 пачки на воркер)
+    batch_selection : bool, optional
+        Для forecast_model='auto': выбрать модель для всех рядов сразу через
+        fm.auto_select_best_model_batch вместо отдельной проверки каждого ряда.
+        Векторно сравниваются fm.BATCH_CANDIDATE_MODELS, holt_winters проверяется
+        по рядам вместе с прогнозом (в пуле при n_jobs > 1). Только с n_folds=1
+    n_folds : int, optional
+        Для forecast_model='auto': число фолдов rolling-origin валидации
+        (fm.rolling_origin_backtest); 1 - одна отложенная выборка, как раньше
+    model_cache : ModelCache, optional
+        Дисковый кэш подобранных моделей (src.analysis.model_cache): ряды, которые
+        не изменились с прошлого запуска, не подбираются заново
+    return_metadata : bool, optional
+        Вернуть также метаданные подбора по рядам (см. forecast_metadata_frame)
+    progress : callable, optional
+        progress(info) - прогресс по рядам материал/филиал с оценкой скорости и
+        оставшегося времени (см. src.utils.progress.ProgressTracker)
+    cancel_token : CancellationToken, optional
+        Токен отмены: прогноз прерывается исключением AnalysisCancelled,
+        собственный пул процессов останавливается сразу
 
     Returns:
     --------
-    pd.DataFrame: Прогнозные данные с колонками [date, material, branch, forecasted_demand]
+    pd.DataFrame: Прогнозные данные с колонками [date, material, branch, forecasted_demand];
+        при return_metadata=True - tuple (прогноз, метаданные рядов)
     """
+    if forecast_model == 'auto' and batch_selection and n_folds != 1:
+        raise ValueError("batch_selection поддерживает только n_folds=1 (одна отложенная выборка)")
+
     forecast_results = []
 
     # Получаем уникальные комбинации материал/филиал
-    groups = historical_df.groupby([material_column, branch_column])
+    groups = historical_df.groupby([material_column, branch_column], observed=True)
 
     # Определяем частоту данных (месячные, недельные и т.д.)
     historical_df[date_column] = pd.to_datetime(historical_df[date_column])
@@ -438,32 +695,43 @@ def auto_forecast_demand(historical_df, forecast_periods, date_column, material_
     if date_freq is None:
         date_freq = 'MS'  # По умолчанию месячная частота
 
+    keys = []
+    series_list = []
+    last_dates = []
     for (material, branch), group in groups:
+        check_cancelled(cancel_token)
         # Сортируем по дате
         group = group.sort_values(date_column)
-
-        # Получаем временной ряд потребления
-        consumption_series = group[consumption_column]
-
-        if len(consumption_series) < 3:
-            # Слишком мало данных - используем naive forecast
-            forecasted_values = [consumption_series.iloc[-1]] * forecast_periods
-        else:
-            # Используем выбранную модель
-            try:
-                result = fm.forecast_demand(
-                    consumption_series,
-                    horizon=forecast_periods,
-                    model=forecast_model,
-                    seasonal_periods=seasonal_periods
-                )
-                forecasted_values = result['forecast']
-            except Exception as e:
-                # Fallback на naive
-                forecasted_values = [consumption_series.iloc[-1]] * forecast_periods
-
+        keys.append((material, branch))
+        series_list.append(group[consumption_column].to_numpy())
+        last_dates.append(group[date_column].max())
+
+    series_models = forecast_model
+    if forecast_model == 'auto' and batch_selection and series_list:
+        values, lengths = fm.pad_series(series_list)
+        best_models, metrics = fm.auto_select_best_model_batch(values, lengths, seasonal_periods=seasonal_periods,
+                                                               cancel_token=cancel_token)
+        # holt_winters сравнивается с победителем по рядам в _forecast_series
+        mape_index = {name: i for i, name in enumerate(fm.BATCH_CANDIDATE_MODELS)}
+        series_models = [(model, metrics[i, mape_index[model], 0]) for i, model in enumerate(best_models)]
+
+    tracker = ProgressTracker('forecast', len(series_list), callback=progress, cancel_token=cancel_token)
+    tracker.start()
+    all_forecasts, all_metadata = _forecast_all_series(
+        series_list, forecast_periods, series_models, seasonal_periods,
+        n_jobs=n_jobs, executor=executor, chunk_size=chunk_size,
+        forecast_kwargs={'n_folds': n_folds, 'cache': model_cache},
+        return_metadata=True,
+        tracker=tracker if progress is not None or cancel_token is not None else None
+    )
+    tracker.finish()
+    if forecast_model == 'auto' and batch_selection:
+        # Модель выбрана пакетно - запрошен был 'auto'
+        for metadata in all_metadata:
+            metadata['model_requested'] = 'auto'
+
+    for (material, branch), last_date, forecasted_values in zip(keys, last_dates, all_forecasts):
         # Генерируем будущие даты
-        last_date = group[date_column].max()
         future_dates = pd.date_range(
             start=last_date + pd.DateOffset(months=1 if date_freq == 'MS' else 7),
             periods=forecast_periods,
@@ -479,28 +747,161 @@ def auto_forecast_demand(historical_df, forecast_periods, date_column, material_
                 'Запланированная потребность': max(0, demand)  # Не допускаем отрицательные значения
             })
 
-    return pd.DataFrame(forecast_results)
+    forecast_df = pd.DataFrame(forecast_results)
+    if return_metadata:
+        return forecast_df, forecast_metadata_frame(keys, all_metadata, material_column, branch_column)
+    return forecast_df
 
 
-def calculate_forward_rolling_sum(series, window=3):
+def forecast_metadata_frame(keys, metadata_list, material_column, branch_column):
+    """
+    Метаданные подбора моделей по рядам в виде таблицы.
+
+    Колонки: материал, филиал, model_requested, model_selected (выбор для 'auto'),
+    model_used (модель, давшая прогноз), fallback, fallback_chain
+    ('sarima → holt_winters'), fallback_reason (последняя причина), fit_time_s,
+    selection_time_s, iterations, cache_hit, n_obs.
+    """
+    rows = []
+    for (material, branch), metadata in zip(keys, metadata_list):
+        chain = metadata.get('fallback_chain') or []
+        rows.append({
+            material_column: material,
+            branch_column: branch,
+            'model_requested': metadata.get('model_requested'),
+            'model_selected': metadata.get('model_selected'),
+            'model_used': metadata.get('model_used'),
+            'fallback': bool(chain),
+            'fallback_chain': ' → '.join([step['model'] for step in chain] + [metadata.get('model_used')])
+                              if chain else '',
+            'fallback_reason': chain[-1]['reason'] if chain else '',
+            'fit_time_s': metadata.get('fit_time_s'),
+            'selection_time_s': metadata.get('selection_time_s'),
+            'iterations': metadata.get('iterations'),
+            'cache_hit': metadata.get('cache_hit'),
+            'n_obs': metadata.get('n_obs'),
+        })
+    columns = [material_column, branch_column, 'model_requested', 'model_selected', 'model_used', 'fallback',
+               'fallback_chain', 'fallback_reason', 'fit_time_s', 'selection_time_s', 'iterations',
+               'cache_hit', 'n_obs']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def summarize_forecast_metadata(metadata_df):
+    """
+    Сводка по метаданным подбора: частота fallback и время по моделям.
+
+    Модели группируются по model_selected - модели, которую пытались подобрать
+    (для 'auto' - выбранной), поэтому видно, как часто дорогие модели падают
+    и заменяются более простыми.
+
+    Returns:
+    --------
+    dict: series, fallbacks, fallback_rate, fit_time_s, selection_time_s,
+        by_model {модель: series, fallbacks, fallback_rate, fit_time_s, mean_fit_time_s, mean_iterations},
+        used {модель: число рядов}
+    """
+    n_series = len(metadata_df)
+    summary = {
+        'series': n_series,
+        'fallbacks': int(metadata_df['fallback'].sum()) if n_series else 0,
+        'fallback_rate': float(metadata_df['fallback'].mean()) if n_series else 0.0,
+        'fit_time_s': float(metadata_df['fit_time_s'].sum()) if n_series else 0.0,
+        'selection_time_s': float(metadata_df['selection_time_s'].sum()) if n_series else 0.0,
+        'by_model': {},
+        'used': {},
+    }
+    if not n_series:
+        return summary
+
+    for model, group in metadata_df.groupby('model_selected', sort=True):
+        iterations = pd.to_numeric(group['iterations'], errors='coerce')
+        summary['by_model'][model] = {
+            'series': len(group),
+            'fallbacks': int(group['fallback'].sum()),
+            'fallback_rate': float(group['fallback'].mean()),
+            'fit_time_s': float(group['fit_time_s'].sum()),
+            'mean_fit_time_s': float(group['fit_time_s'].mean()),
+            'mean_iterations': float(iterations.mean()) if iterations.notna().any() else None,
+        }
+    summary['used'] = {model: int(count) for model, count in metadata_df['model_used'].value_counts().sort_index().items()}
+    return summary
+
+
+def calculate_forward_rolling_sum(series, window=3, groups=None, order=None):
     """
     Вычисляет rolling sum ВПЕРЕД (текущий + следующие периоды)
     вместо стандартного rolling (текущий + предыдущие периоды)
+
+    Считается за O(n) через накопленную сумму: сумма окна [i, i + window)
+    равна cumsum[i + window] - cumsum[i], конец окна ограничен концом группы.
+    Пропуски считаются нулями (как в Series.sum).
+
+    Parameters:
+    -----------
+    series : pd.Series
+        Значения (например, запланированная потребность)
+    window : int
+        Длина окна: текущий период + window - 1 следующих
+    groups : list of array-like, optional
+        Ключи групп (например, колонки материала и филиала); окно не выходит
+        за границы группы. По умолчанию весь ряд - одна группа
+    order : array-like, optional
+        Порядок периодов внутри группы (например, дата). По умолчанию - порядок строк
+
+    Returns:
+    --------
+    pd.Series: Сумма потребности на window периодов вперед, с индексом series
     """
-    result = []
-    for i in range(len(series)):
-        # Суммируем от текущего до текущего+window (не включая)
-        window_sum = series.iloc[i:min(i+window, len(series))].sum()
-        result.append(window_sum)
+    n = len(series)
+    values = np.nan_to_num(series.to_numpy(dtype=float), nan=0.0)
+
+    if groups is not None:
+        keys = pd.DataFrame({i: np.asarray(g) for i, g in enumerate(groups)})
+        group_codes = keys.groupby(list(keys.columns), sort=False, dropna=False).ngroup().to_numpy()
+    else:
+        group_codes = np.zeros(n, dtype=np.int64)
+
+    # Стабильная сортировка: группа, затем порядок внутри группы, затем исходная позиция
+    if order is not None:
+        order_codes = pd.factorize(np.asarray(order), sort=True)[0]
+        positions = np.lexsort((order_codes, group_codes))
+    else:
+        positions = np.argsort(group_codes, kind='stable')
+
+    sorted_codes = group_codes[positions]
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_codes)) + 1))
+    group_ends = np.append(group_starts[1:], n)
+    row_group_end = np.repeat(group_ends, np.diff(np.append(group_starts, n)))
+
+    cumsum = np.concatenate(([0.0], np.cumsum(values[positions])))
+    window_end = np.minimum(np.arange(n) + window, row_group_end)
+    sums_sorted = cumsum[window_end] - cumsum[np.arange(n)]
+
+    result = np.empty(n, dtype=float)
+    result[positions] = sums_sorted
     return pd.Series(result, index=series.index)
 
 
-def calculate_purchase_recommendations(df, end_quantity_column, forecast_quantity_column, safety_stock_percent):
+def calculate_purchase_recommendations(df, end_quantity_column, forecast_quantity_column, safety_stock_percent,
+                                       group_columns=None, date_column=None):
+    """
+    Рекомендации по закупке: спрос на 3 периода вперед + страховой запас - прогноз остатка.
+
+    group_columns (например, [материал, филиал]) ограничивает окно будущего спроса
+    одной группой, date_column задает порядок периодов внутри группы. Без них
+    окно считается по порядку строк всей таблицы, как раньше.
+    """
     safety_stock = df[forecast_quantity_column] * safety_stock_percent
 
     # ИСПРАВЛЕНИЕ ОШИБКИ #2: Используем forward rolling sum (текущий + 2 следующих)
     # вместо backward rolling sum (текущий + 2 предыдущих)
-    future_demand = calculate_forward_rolling_sum(df[forecast_quantity_column], window=3)
+    future_demand = calculate_forward_rolling_sum(
+        df[forecast_quantity_column],
+        window=3,
+        groups=[df[col] for col in group_columns] if group_columns else None,
+        order=df[date_column] if date_column else None
+    )
 
     recommendations = np.maximum(0, future_demand + safety_stock - df[end_quantity_column])
 
@@ -522,7 +923,7 @@ def analyze_coverage(df, start_quantity_column, forecast_quantity_column):
         return f"Текущих запасов недостаточно. Нехватка составляет {shortage:.0f} единиц."
 
 def plot_top_materials_by_cost(df, material_column, cost_column):
-    top_materials = df.groupby(material_column)[cost_column].sum().nlargest(10).reset_index()
+    top_materials = df.groupby(material_column, observed=True)[cost_column].sum().nlargest(10).reset_index()
     fig = px.bar(top_materials, x=material_column, y=cost_column, title='Топ 10 материалов по стоимости')
     return fig
 
@@ -530,7 +931,7 @@ def analyze_materials(df, material_column, date_column, start_quantity_column, e
     df['month'] = pd.to_datetime(df[date_column]).dt.month
     df['usage'] = df[start_quantity_column] - df[end_quantity_column]
     
-    analysis = df.groupby(material_column).agg({
+    analysis = df.groupby(material_column, observed=True).agg({
         'usage': ['mean', 'std'],
         start_quantity_column: 'mean',
         end_quantity_column: 'mean'
@@ -5,10 +5,49 @@ import pandas as pd
 import numpy as np
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+import time
 import warnings
+
+from src.utils.progress import check_cancelled
 warnings.filterwarnings('ignore')
 
 
+# ============================================================================
+# ТЕЛЕМЕТРИЯ ПОДБОРА (модель, fallback, итерации)
+# ============================================================================
+# trace - необязательный dict, который функции подбора заполняют по ходу работы:
+#   'model_used'     - модель, давшая прогноз (после всех fallback)
+#   'fallback_chain' - [{'model': ..., 'reason': ...}] - модели, которые не удалось применить
+#   'iterations'     - итераций оптимизатора у модели, давшей прогноз (0 - параметры из кэша)
+
+def _record_fallback(trace, failed_model, reason, next_model):
+    """Записывает переход на более простую модель"""
+    if trace is None:
+        return
+    if isinstance(reason, BaseException):
+        reason = f"{type(reason).__name__}: {reason}"
+    trace.setdefault('fallback_chain', []).append({'model': failed_model, 'reason': str(reason)})
+    trace['model_used'] = next_model
+
+
+def _fit_iterations(fitted_model):
+    """Число итераций оптимизатора statsmodels (None, если неизвестно)"""
+    retvals = getattr(fitted_model, 'mle_retvals', None)
+    if retvals is None:
+        return None
+    if isinstance(retvals, dict):
+        iterations = retvals.get('iterations', retvals.get('nit'))
+    else:
+        iterations = getattr(retvals, 'nit', None)
+    return int(iterations) if iterations is not None else None
+
+
+def _record_fit(trace, model, iterations):
+    if trace is not None:
+        trace['model_used'] = model
+        trace['iterations'] = iterations
+
+
 # ============================================================================
 # МЕТРИКИ КАЧЕСТВА ПРОГНОЗА
 # ============================================================================
@@ -125,16 +164,137 @@ def exponential_smoothing_forecast(series, alpha=0.3, horizon=1):
     --------
     array: Прогноз
     """
+    return _exponential_smoothing_fit(series, alpha, horizon)
+
+
+def _exponential_smoothing_fit(series, alpha=0.3, horizon=1, trace=None):
+    """exponential_smoothing_forecast с записью fallback в trace"""
     try:
         model = ExponentialSmoothing(series, trend=None, seasonal=None)
         fitted_model = model.fit(smoothing_level=alpha, optimized=False)
         forecast = fitted_model.forecast(steps=horizon)
+        _record_fit(trace, 'exponential_smoothing', 0)
         return forecast.values if isinstance(forecast, pd.Series) else forecast
-    except:
+    except Exception as e:
         # Fallback на moving average если не получилось
+        _record_fallback(trace, 'exponential_smoothing', e, 'moving_average')
         return moving_average_forecast(series, window=3, horizon=horizon)
 
 
+# ============================================================================
+# ПАКЕТНЫЕ ВАРИАНТЫ ПРОСТЫХ МОДЕЛЕЙ (много рядов за один вызов)
+# ============================================================================
+# Ряды передаются матрицей (n_series × T), выровненной по левому краю:
+# ряд i занимает values[i, :lengths[i]], остаток строки - заполнитель (NaN).
+
+def pad_series(series_list, fill_value=np.nan):
+    """
+    Собирает список рядов разной длины в матрицу (n_series × T) и вектор длин
+
+    Returns:
+    --------
+    tuple: (values, lengths)
+    """
+    lengths = np.array([len(s) for s in series_list], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    values = np.full((len(series_list), width), fill_value, dtype=np.float64)
+    for i, series in enumerate(series_list):
+        values[i, :lengths[i]] = np.asarray(series, dtype=np.float64)
+    return values, lengths
+
+
+def _last_values(values, lengths):
+    """Последнее наблюдение каждого ряда (NaN для пустых рядов)"""
+    rows = np.arange(len(lengths))
+    last = values[rows, np.maximum(lengths - 1, 0)] if values.shape[1] else np.full(len(lengths), np.nan)
+    return np.where(lengths > 0, last, np.nan)
+
+
+def naive_forecast_batch(values, lengths, horizon=1):
+    """
+    Наивный прогноз для всех рядов матрицы
+
+    Parameters:
+    -----------
+    values : np.ndarray
+        Матрица рядов (n_series × T), ряд i = values[i, :lengths[i]]
+    lengths : array-like
+        Длины рядов
+    horizon : int
+        Горизонт прогнозирования
+
+    Returns:
+    --------
+    np.ndarray: Прогнозы (n_series × horizon)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    return np.repeat(_last_values(values, lengths)[:, None], horizon, axis=1)
+
+
+def moving_average_forecast_batch(values, lengths, window=3, horizon=1):
+    """
+    Скользящее среднее за последние window периодов для всех рядов матрицы
+
+    Как и moving_average_forecast, для рядов короче window берется среднее всего ряда.
+
+    Returns:
+    --------
+    np.ndarray: Прогнозы (n_series × horizon)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+
+    effective_window = np.minimum(window, lengths)
+    offsets = np.arange(window)
+    columns = lengths[:, None] - effective_window[:, None] + offsets
+    in_window = offsets < effective_window[:, None]
+    columns = np.clip(columns, 0, max(values.shape[1] - 1, 0))
+
+    gathered = np.take_along_axis(values, columns, axis=1) if values.shape[1] else np.zeros_like(columns, float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ma_value = np.where(in_window, gathered, 0.0).sum(axis=1) / effective_window
+    ma_value = np.where(lengths > 0, ma_value, np.nan)
+
+    return np.repeat(ma_value[:, None], horizon, axis=1)
+
+
+# Веса МНК-свободного члена по первым 10 точкам (эвристика statsmodels для начального уровня)
+_HEURISTIC_LEVEL_WEIGHTS = np.linalg.pinv(np.c_[np.ones(10), np.arange(10) + 1])[0]
+
+
+def exponential_smoothing_forecast_batch(values, lengths, alpha=0.3, horizon=1):
+    """
+    Simple Exponential Smoothing для всех рядов матрицы одной векторной рекурсией
+
+    Повторяет exponential_smoothing_forecast (statsmodels, optimized=False):
+    начальный уровень - свободный член МНК по первым 10 точкам (если точек >= 10),
+    иначе первое наблюдение; далее level = alpha * y_t + (1 - alpha) * level.
+
+    Returns:
+    --------
+    np.ndarray: Прогнозы (n_series × horizon)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_series, width = values.shape
+
+    if width == 0:
+        return np.full((n_series, horizon), np.nan)
+
+    level = values[:, 0].copy()
+    if width >= 10:
+        heuristic = values[:, :10] @ _HEURISTIC_LEVEL_WEIGHTS
+        level = np.where(lengths >= 10, heuristic, level)
+
+    for t in range(width):
+        active = t < lengths
+        level = np.where(active, alpha * values[:, t] + (1 - alpha) * level, level)
+
+    level = np.where(lengths > 0, level, np.nan)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
 # ============================================================================
 # МОДЕЛЬ 4: HOLT-WINTERS (Тройное экспоненциальное сглаживание)
 # ============================================================================
@@ -161,6 +321,66 @@ def holt_winters_forecast(series, horizon=1, seasonal_periods=12, trend='add', s
     --------
     array: Прогноз
     """
+    forecast, _ = _holt_winters_fit(series, horizon, seasonal_periods, trend, seasonal)
+    return forecast
+
+
+def _warm_start_params(warm_state, config):
+    """Параметры прошлого подбора, если он был для той же конфигурации модели"""
+    if warm_state and warm_state.get('config') == config:
+        return warm_state['params']
+    return None
+
+
+def _holt_winters_state(fitted, config):
+    """
+    Состояние подбора Holt-Winters: оптимизированные параметры в порядке
+    start_params statsmodels ('params') и все параметры по именам fix_params ('fixed')
+    """
+    try:
+        formatted = fitted.params_formatted
+        fixed = {
+            name.replace('initial_seasons', 'initial_seasonal'): float(value)
+            for name, value in zip(formatted.index, formatted['param'])
+        }
+        return {
+            'config': config,
+            'params': formatted.loc[formatted['optimized'], 'param'].to_numpy(dtype=float),
+            'fixed': fixed,
+        }
+    except Exception:
+        return None
+
+
+def _holt_winters_fit(series, horizon=1, seasonal_periods=12, trend='add', seasonal='add',
+                      warm_state=None, keep_state=False, fixed_state=None, trace=None):
+    """
+    Holt-Winters с цепочкой fallback, как holt_winters_forecast.
+
+    warm_state - состояние прошлого подбора (теплый старт оптимизатора вместо
+    перебора по сетке). При keep_state=True возвращает новое состояние.
+    fixed_state - состояние подбора на этом же ряду (например, из ModelCache):
+    параметры фиксируются, оптимизация не выполняется.
+    trace - dict телеметрии (см. _record_fallback): модель без сезонности
+    записывается как 'holt_winters_trend'.
+
+    Returns:
+    --------
+    tuple: (forecast, state); state = None, если сработал fallback на moving average
+    """
+    def fit(model, config, name='holt_winters'):
+        fixed = _warm_start_params(fixed_state, config) is not None
+        if fixed:
+            with model.fix_params(fixed_state['fixed']):
+                fitted_model = model.fit()
+        else:
+            start_params = _warm_start_params(warm_state, config)
+            fitted_model = model.fit() if start_params is None else model.fit(start_params=start_params)
+        forecast = fitted_model.forecast(steps=horizon)
+        _record_fit(trace, name, 0 if fixed else _fit_iterations(fitted_model))
+        state = (fixed_state if fixed else _holt_winters_state(fitted_model, config)) if keep_state else None
+        return (forecast.values if isinstance(forecast, pd.Series) else forecast), state
+
     try:
         # Проверяем что данных достаточно
         if len(series) < 2 * seasonal_periods:
@@ -181,21 +401,18 @@ def holt_winters_forecast(series, horizon=1, seasonal_periods=12, trend='add', s
             seasonal_periods=seasonal_periods if seasonal else None
         )
 
-        fitted_model = model.fit()
-        forecast = fitted_model.forecast(steps=horizon)
-
-        return forecast.values if isinstance(forecast, pd.Series) else forecast
+        return fit(model, ('holt_winters', trend, seasonal, seasonal_periods if seasonal else None))
 
     except Exception as e:
         # Fallback: пробуем без сезонности
+        _record_fallback(trace, 'holt_winters', e, 'holt_winters_trend')
         try:
             model = ExponentialSmoothing(series, trend='add', seasonal=None)
-            fitted_model = model.fit()
-            forecast = fitted_model.forecast(steps=horizon)
-            return forecast.values if isinstance(forecast, pd.Series) else forecast
-        except:
+            return fit(model, ('holt_winters', 'add', None, None), name='holt_winters_trend')
+        except Exception as e:
             # Fallback на moving average
-            return moving_average_forecast(series, window=3, horizon=horizon)
+            _record_fallback(trace, 'holt_winters_trend', e, 'moving_average')
+            return moving_average_forecast(series, window=3, horizon=horizon), None
 
 
 # ============================================================================
@@ -222,12 +439,28 @@ def sarima_forecast(series, horizon=1, order=(1, 1, 1), seasonal_order=(1, 1, 1,
     --------
     array: Прогноз
     """
+    forecast, _ = _sarima_fit(series, horizon, order, seasonal_order)
+    return forecast
+
+
+def _sarima_fit(series, horizon=1, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12),
+                warm_state=None, keep_state=False, fixed_state=None, trace=None):
+    """
+    SARIMA с fallback на Holt-Winters, как sarima_forecast, с теплым стартом.
+    При fixed_state той же конфигурации модель только фильтруется с этими параметрами.
+
+    Returns:
+    --------
+    tuple: (forecast, state) - см. _holt_winters_fit
+    """
     try:
         # Проверяем что данных достаточно
         min_obs = max(order[0] + order[2] + seasonal_order[0] + seasonal_order[2] + seasonal_order[3], 20)
         if len(series) < min_obs:
             # Слишком мало данных для SARIMA
-            return holt_winters_forecast(series, horizon)
+            _record_fallback(trace, 'sarima', f"слишком мало данных ({len(series)} < {min_obs})", 'holt_winters')
+            return _holt_winters_fit(series, horizon, warm_state=warm_state, keep_state=keep_state,
+                                     fixed_state=fixed_state, trace=trace)
 
         model = SARIMAX(
             series,
@@ -237,21 +470,30 @@ def sarima_forecast(series, horizon=1, order=(1, 1, 1), seasonal_order=(1, 1, 1,
             enforce_invertibility=False
         )
 
-        fitted_model = model.fit(disp=False, maxiter=50)
+        config = ('sarima', tuple(order), tuple(seasonal_order))
+        fixed_params = _warm_start_params(fixed_state, config)
+        if fixed_params is not None:
+            fitted_model = model.filter(np.asarray(fixed_params, dtype=float))
+        else:
+            fitted_model = model.fit(disp=False, maxiter=50, start_params=_warm_start_params(warm_state, config))
         forecast = fitted_model.forecast(steps=horizon)
+        state = {'config': config, 'params': np.asarray(fitted_model.params)} if keep_state else None
+        _record_fit(trace, 'sarima', 0 if fixed_params is not None else _fit_iterations(fitted_model))
 
-        return forecast.values if isinstance(forecast, pd.Series) else forecast
+        return (forecast.values if isinstance(forecast, pd.Series) else forecast), state
 
-    except:
+    except Exception as e:
         # Fallback на Holt-Winters
-        return holt_winters_forecast(series, horizon)
+        _record_fallback(trace, 'sarima', e, 'holt_winters')
+        return _holt_winters_fit(series, horizon, warm_state=warm_state, keep_state=keep_state,
+                                 fixed_state=fixed_state, trace=trace)
 
 
 # ============================================================================
 # АВТОМАТИЧЕСКИЙ ВЫБОР ЛУЧШЕЙ МОДЕЛИ
 # ============================================================================
 
-def auto_select_best_model(series, test_size=3, seasonal_periods=12):
+def auto_select_best_model(series, test_size=3, seasonal_periods=12, n_folds=1, cache=None):
     """
     Автоматически выбирает лучшую модель на основе кросс-валидации
 
@@ -263,6 +505,11 @@ def auto_select_best_model(series, test_size=3, seasonal_periods=12):
         Количество последних наблюдений для тестирования
     seasonal_periods : int
         Длина сезонного цикла
+    n_folds : int
+        Количество фолдов; при n_folds > 1 используется rolling_origin_backtest
+        (расширяющееся окно с теплым стартом Holt-Winters), по умолчанию 1 - одна отложенная выборка
+    cache : ModelCache, optional
+        Кэш результатов выбора: для неизменившегося ряда выбор не пересчитывается
 
     Returns:
     --------
@@ -272,6 +519,19 @@ def auto_select_best_model(series, test_size=3, seasonal_periods=12):
         # Слишком мало данных для валидации
         return 'moving_average', {}
 
+    if cache is not None:
+        key = cache.make_key(series, 'auto', seasonal_periods, test_size=test_size, n_folds=n_folds)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['best_model'], entry['metrics']
+        best_model, metrics = auto_select_best_model(series, test_size, seasonal_periods, n_folds)
+        cache.put(key, {'best_model': best_model, 'metrics': metrics})
+        return best_model, metrics
+
+    if n_folds > 1:
+        return rolling_origin_backtest(series, models=CANDIDATE_MODELS, n_folds=n_folds, horizon=test_size,
+                                       seasonal_periods=seasonal_periods)
+
     # Разделяем на train/test
     train = series.iloc[:-test_size] if isinstance(series, pd.Series) else series[:-test_size]
     test = series.iloc[-test_size:] if isinstance(series, pd.Series) else series[-test_size:]
@@ -315,10 +575,286 @@ def auto_select_best_model(series, test_size=3, seasonal_periods=12):
         return 'moving_average', {}
 
 
+# Порядок метрик в последней оси тензора calculate_metrics_batch
+METRIC_NAMES = ('MAPE', 'MAE', 'RMSE', 'Bias')
+
+# Модели-кандидаты auto_select_best_model (в порядке перебора)
+CANDIDATE_MODELS = ('naive', 'moving_average', 'exponential_smoothing', 'holt_winters')
+
+# Модели, которые auto_select_best_model_batch считает векторно (кандидаты по умолчанию);
+# holt_winters подбирается по рядам - см. challenge_with_holt_winters
+BATCH_CANDIDATE_MODELS = ('naive', 'moving_average', 'exponential_smoothing')
+
+
+def calculate_metrics_batch(actual, predicted):
+    """
+    Метрики качества прогноза вдоль последней оси (пакетный calculate_metrics)
+
+    Parameters:
+    -----------
+    actual, predicted : np.ndarray
+        Массивы одинаковой (или совместимой по broadcasting) формы (..., horizon)
+
+    Returns:
+    --------
+    np.ndarray: Тензор формы (..., 4) с метриками в порядке METRIC_NAMES
+    """
+    actual = np.asarray(actual, dtype=np.float64)
+    predicted = np.asarray(predicted, dtype=np.float64)
+    actual, predicted = np.broadcast_arrays(actual, predicted)
+
+    error = predicted - actual
+    mask = actual != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(mask, np.abs(error) / np.where(mask, np.abs(actual), 1.0), 0.0)
+        mape_count = mask.sum(axis=-1)
+        mape = np.where(mape_count > 0, relative.sum(axis=-1) / mape_count * 100, np.nan)
+
+    mae = np.mean(np.abs(error), axis=-1)
+    rmse = np.sqrt(np.mean(error ** 2, axis=-1))
+    bias = np.mean(error, axis=-1)
+
+    return np.stack([mape, mae, rmse, bias], axis=-1)
+
+
+def auto_select_best_model_batch(values, lengths, test_size=3, seasonal_periods=12, models=BATCH_CANDIDATE_MODELS,
+                                 cancel_token=None):
+    """
+    Пакетный выбор лучшей модели для многих рядов (аналог auto_select_best_model)
+
+    Прогнозы всех моделей на отложенной выборке собираются в один тензор,
+    метрики считаются одной операцией вдоль оси горизонта. По умолчанию
+    кандидаты - векторные модели (BATCH_CANDIDATE_MODELS); holt_winters можно
+    передать в models, но он подбирается по рядам через statsmodels в этом же
+    процессе. Для выбора по всем CANDIDATE_MODELS без этого шага победителя
+    сравнивают с holt_winters по рядам (challenge_with_holt_winters), например
+    в пуле процессов, как auto_forecast_demand(batch_selection=True).
+
+    Parameters:
+    -----------
+    values : np.ndarray
+        Матрица рядов (n_series × T), ряд i = values[i, :lengths[i]]
+    lengths : array-like
+        Длины рядов
+    test_size : int
+        Количество последних наблюдений для тестирования
+    models : sequence of str
+        Модели-кандидаты (порядок задает ось моделей в тензоре метрик)
+    cancel_token : CancellationToken, optional
+        Токен отмены (проверяется перед каждой моделью и по рядам holt_winters)
+
+    Returns:
+    --------
+    tuple: (best_models, metrics)
+        best_models - массив имен лучших моделей (n_series,); для рядов короче
+                      test_size + 5 - 'moving_average', как в auto_select_best_model
+        metrics - тензор (n_series, len(models), 4) в порядке METRIC_NAMES;
+                  NaN для рядов, где выбор не выполнялся
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_series = len(lengths)
+    models = tuple(models)
+
+    metrics = np.full((n_series, len(models), len(METRIC_NAMES)), np.nan)
+    best_models = np.full(n_series, 'moving_average', dtype=object)
+
+    eligible = np.flatnonzero(lengths >= test_size + 5)
+    if len(eligible) == 0 or len(models) == 0:
+        return best_models, metrics
+
+    sub_values = values[eligible]
+    train_lengths = lengths[eligible] - test_size
+    test = np.take_along_axis(sub_values, train_lengths[:, None] + np.arange(test_size), axis=1)
+
+    def holt_winters_batch():
+        forecasts = []
+        for i in range(len(eligible)):
+            check_cancelled(cancel_token)
+            forecasts.append(holt_winters_forecast(pd.Series(sub_values[i, :train_lengths[i]]), horizon=test_size,
+                                                   seasonal_periods=seasonal_periods))
+        return np.array(forecasts, dtype=np.float64).reshape(len(eligible), test_size)
+
+    batch_models = {
+        'naive': lambda: naive_forecast_batch(sub_values, train_lengths, horizon=test_size),
+        'moving_average': lambda: moving_average_forecast_batch(sub_values, train_lengths, window=3, horizon=test_size),
+        'exponential_smoothing': lambda: exponential_smoothing_forecast_batch(
+            sub_values, train_lengths, alpha=0.3, horizon=test_size),
+        'holt_winters': holt_winters_batch,
+    }
+
+    unknown = [name for name in models if name not in batch_models]
+    if unknown:
+        raise ValueError(f"Неизвестные модели для пакетного выбора: {unknown}")
+
+    predictions = []
+    for name in models:
+        check_cancelled(cancel_token)
+        predictions.append(batch_models[name]())
+    predictions = np.stack(predictions, axis=1)  # (series, models, horizon)
+    sub_metrics = calculate_metrics_batch(test[:, None, :], predictions)
+    metrics[eligible] = sub_metrics
+
+    # Как в auto_select_best_model: минимальный MAPE, NaN = бесконечность, при равенстве - первая модель
+    mape = np.where(np.isnan(sub_metrics[..., 0]), np.inf, sub_metrics[..., 0])
+    best_models[eligible] = np.asarray(models, dtype=object)[np.argmin(mape, axis=1)]
+
+    return best_models, metrics
+
+
+def challenge_with_holt_winters(series, batch_model, batch_mape, test_size=3, seasonal_periods=12):
+    """
+    Завершает выбор auto_select_best_model_batch по BATCH_CANDIDATE_MODELS:
+    holt_winters на той же отложенной выборке сравнивается с лучшей векторной моделью.
+
+    Вместе с пакетным выбором дает ту же модель, что auto_select_best_model
+    (holt_winters - последний кандидат, при равном MAPE остается векторная модель).
+
+    Parameters:
+    -----------
+    series : array-like
+        Временной ряд
+    batch_model : str
+        Лучшая модель пакетного выбора для ряда
+    batch_mape : float
+        Ее MAPE (NaN - как бесконечность)
+
+    Returns:
+    --------
+    str: 'holt_winters' или batch_model
+    """
+    series = pd.Series(series)
+    if len(series) < test_size + 5:
+        return batch_model
+    try:
+        pred = holt_winters_forecast(series.iloc[:-test_size], horizon=test_size, seasonal_periods=seasonal_periods)
+        mape = calculate_metrics(series.iloc[-test_size:], pred)['MAPE']
+    except Exception:
+        return batch_model
+    best_mape = float('inf') if np.isnan(batch_mape) else batch_mape
+    return 'holt_winters' if not np.isnan(mape) and mape < best_mape else batch_model
+
+
+# ============================================================================
+# ROLLING-ORIGIN КРОСС-ВАЛИДАЦИЯ
+# ============================================================================
+
+def _rolling_origins(n_obs, n_folds, horizon, step, min_train_size):
+    """Точки разреза фолдов (длины обучающих частей) по возрастанию"""
+    origins = [n_obs - horizon - (n_folds - 1 - k) * step for k in range(n_folds)]
+    return [origin for origin in origins if origin >= min_train_size]
+
+
+def rolling_origin_backtest(series, models=CANDIDATE_MODELS, n_folds=3, horizon=3, step=1,
+                            seasonal_periods=12, min_train_size=5):
+    """
+    Rolling-origin кросс-валидация (расширяющееся окно) моделей forecast_demand
+
+    Фолд k обучается на series[:origin_k] и проверяется на следующих horizon точках,
+    origin_k = len(series) - horizon - (n_folds - 1 - k) * step. Последний фолд совпадает
+    с разбиением auto_select_best_model. Holt-Winters и SARIMA на каждом следующем
+    фолде стартуют оптимизацию с параметров предыдущего фолда (теплый старт),
+    а не с перебора по сетке - это основная экономия времени.
+
+    Parameters:
+    -----------
+    series : array-like
+        Временной ряд
+    models : sequence of str
+        Модели: 'naive', 'moving_average', 'exponential_smoothing', 'holt_winters', 'sarima'
+    n_folds : int
+        Количество фолдов
+    horizon : int
+        Длина проверочной части каждого фолда
+    step : int
+        Сдвиг точки разреза между соседними фолдами
+    min_train_size : int
+        Минимальная длина обучающей части (более ранние фолды пропускаются)
+
+    Returns:
+    --------
+    tuple: (best_model_name, metrics_dict)
+        metrics_dict[model] - средние по фолдам MAPE/MAE/RMSE/Bias и 'folds' - метрики каждого фолда
+    """
+    if not isinstance(series, pd.Series):
+        series = pd.Series(series)
+    series = series.reset_index(drop=True)
+
+    origins = _rolling_origins(len(series), n_folds, horizon, step, min_train_size)
+    if not origins:
+        return 'moving_average', {}
+
+    stateless = {
+        'naive': lambda train: naive_forecast(train, horizon=horizon),
+        'moving_average': lambda train: moving_average_forecast(train, window=3, horizon=horizon),
+        'exponential_smoothing': lambda train: exponential_smoothing_forecast(train, alpha=0.3, horizon=horizon),
+    }
+    stateful = {
+        'holt_winters': lambda train, state: _holt_winters_fit(
+            train, horizon, seasonal_periods, warm_state=state, keep_state=True),
+        'sarima': lambda train, state: _sarima_fit(
+            train, horizon, (1, 1, 1), (1, 1, 1, seasonal_periods), warm_state=state, keep_state=True),
+    }
+
+    fold_metrics = {name: [] for name in models}
+    warm_states = {}
+
+    for origin in origins:
+        train = series.iloc[:origin]
+        test = series.iloc[origin:origin + horizon]
+
+        for name in models:
+            try:
+                if name in stateless:
+                    pred = stateless[name](train)
+                elif name in stateful:
+                    pred, warm_states[name] = stateful[name](train, warm_states.get(name))
+                else:
+                    raise ValueError(f"Неизвестная модель: {name}")
+                fold_metrics[name].append(calculate_metrics(test, pred))
+            except ValueError:
+                raise
+            except Exception:
+                pass
+
+    metrics = {}
+    for name, folds in fold_metrics.items():
+        if not folds:
+            continue
+        metrics[name] = {
+            metric: (np.nan if all(np.isnan(f[metric]) for f in folds)
+                     else float(np.nanmean([f[metric] for f in folds])))
+            for metric in METRIC_NAMES
+        }
+        metrics[name]['folds'] = folds
+
+    if not metrics:
+        return 'moving_average', {}
+
+    best_model = min(metrics.items(), key=lambda x: x[1]['MAPE'] if not np.isnan(x[1]['MAPE']) else float('inf'))
+    return best_model[0], metrics
+
+
 # ============================================================================
 # ЕДИНАЯ ФУНКЦИЯ ПРОГНОЗИРОВАНИЯ
 # ============================================================================
 
+def _cached_fit(cache, series, model, seasonal_periods, params, fit, trace=None):
+    """
+    Подбор модели через кэш: при попадании параметры фиксируются (без оптимизации),
+    при промахе модель подбирается и ее состояние сохраняется.
+    """
+    key = cache.make_key(series, model, seasonal_periods, **params)
+    entry = cache.get(key)
+    cached_state = entry.get('state') if entry else None
+    if trace is not None:
+        trace['cache_hit'] = cached_state is not None
+    forecast, state = fit(cached_state)
+    if state is not None and cached_state is None:
+        cache.put(key, {'model': model, 'state': state})
+    return forecast
+
+
 def forecast_demand(series, horizon=1, model='auto', seasonal_periods=12, **kwargs):
     """
     Универсальная функция прогнозирования спроса
@@ -336,13 +872,23 @@ def forecast_demand(series, horizon=1, model='auto', seasonal_periods=12, **kwar
         Длина сезонного цикла (12 для месячных данных)
     **kwargs : dict
         Дополнительные параметры для моделей
+        (n_folds - число фолдов rolling-origin валидации для model='auto';
+        cache - ModelCache: выбор модели и параметры Holt-Winters/SARIMA берутся
+        из кэша, если ряд не изменился)
 
     Returns:
     --------
     dict: {
         'forecast': array,
-        'model_used': str,
-        'metrics': dict (если model='auto')
+        'model_used': str - модель, давшая прогноз (с учетом fallback),
+        'metrics': dict (если model='auto'),
+        'model_requested': str - запрошенная модель,
+        'model_selected': str - модель, выбранная для model='auto' (иначе = model),
+        'fallback_chain': list - [{'model', 'reason'}] модели, которые не удалось применить,
+        'fit_time_s': float - время подбора выбранной модели,
+        'selection_time_s': float - время выбора модели (model='auto'),
+        'iterations': int or None - итераций оптимизатора (0 - параметры из кэша),
+        'cache_hit': bool or None - параметры взяты из кэша
     }
     """
     if not isinstance(series, pd.Series):
@@ -351,16 +897,32 @@ def forecast_demand(series, horizon=1, model='auto', seasonal_periods=12, **kwar
     result = {
         'forecast': None,
         'model_used': model,
-        'metrics': {}
+        'metrics': {},
+        'model_requested': model,
+        'model_selected': model,
+        'fallback_chain': [],
+        'fit_time_s': 0.0,
+        'selection_time_s': 0.0,
+        'iterations': None,
+        'cache_hit': None,
     }
+    cache = kwargs.get('cache')
 
     if model == 'auto':
         # Автоматический выбор лучшей модели
-        best_model, metrics = auto_select_best_model(series, seasonal_periods=seasonal_periods)
+        started = time.perf_counter()
+        best_model, metrics = auto_select_best_model(series, seasonal_periods=seasonal_periods,
+                                                     n_folds=kwargs.get('n_folds', 1), cache=cache)
+        result['selection_time_s'] = time.perf_counter() - started
         result['model_used'] = best_model
+        result['model_selected'] = best_model
         result['metrics'] = metrics
         model = best_model
 
+    # Функции подбора дописывают в trace фактическую модель, fallback и итерации
+    trace = {'model_used': model, 'fallback_chain': result['fallback_chain'], 'iterations': None}
+    started = time.perf_counter()
+
     # Применяем выбранную модель
     if model == 'naive':
         result['forecast'] = naive_forecast(series, horizon)
@@ -371,24 +933,44 @@ def forecast_demand(series, horizon=1, model='auto', seasonal_periods=12, **kwar
 
     elif model == 'exponential_smoothing':
         alpha = kwargs.get('alpha', 0.3)
-        result['forecast'] = exponential_smoothing_forecast(series, alpha, horizon)
+        result['forecast'] = _exponential_smoothing_fit(series, alpha, horizon, trace=trace)
 
     elif model == 'holt_winters':
         trend = kwargs.get('trend', 'add')
         seasonal = kwargs.get('seasonal', 'add')
-        result['forecast'] = holt_winters_forecast(
-            series, horizon, seasonal_periods, trend, seasonal
-        )
+        if cache is None:
+            result['forecast'], _ = _holt_winters_fit(series, horizon, seasonal_periods, trend, seasonal,
+                                                      trace=trace)
+        else:
+            result['forecast'] = _cached_fit(
+                cache, series, model, seasonal_periods, {'trend': trend, 'seasonal': seasonal},
+                lambda fixed_state: _holt_winters_fit(series, horizon, seasonal_periods, trend, seasonal,
+                                                      keep_state=True, fixed_state=fixed_state, trace=trace),
+                trace=trace
+            )
 
     elif model == 'sarima':
         order = kwargs.get('order', (1, 1, 1))
         seasonal_order = kwargs.get('seasonal_order', (1, 1, 1, seasonal_periods))
-        result['forecast'] = sarima_forecast(series, horizon, order, seasonal_order)
+        if cache is None:
+            result['forecast'], _ = _sarima_fit(series, horizon, order, seasonal_order, trace=trace)
+        else:
+            result['forecast'] = _cached_fit(
+                cache, series, model, seasonal_periods, {'order': order, 'seasonal_order': seasonal_order},
+                lambda fixed_state: _sarima_fit(series, horizon, order, seasonal_order,
+                                                keep_state=True, fixed_state=fixed_state, trace=trace),
+                trace=trace
+            )
 
     else:
         # Неизвестная модель - используем moving average
+        _record_fallback(trace, model, "неизвестная модель", 'moving_average')
         result['forecast'] = moving_average_forecast(series, window=3, horizon=horizon)
-        result['model_used'] = 'moving_average'
+
+    result['fit_time_s'] = time.perf_counter() - started
+    result['model_used'] = trace['model_used']
+    result['iterations'] = trace['iterations']
+    result['cache_hit'] = trace.get('cache_hit')
 
     return result
 
@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 from statsmodels.tsa.seasonal import seasonal_decompose
 from scipy import stats
+import os
 import sys
+import warnings
 from pathlib import Path
 
 # Добавляем корневую директорию в PYTHONPATH
@@ -10,8 +12,16 @@ root_dir = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(root_dir))
 
 from src.utils import data_validation as dv
+from src.analysis.historical_incremental import HistoricalAggregates
+from src.analysis.historical_metrics import (
+    sorted_group_offsets, compute_historical_metrics, format_historical_metrics, seasonal_strength_and_slope
+)
+from src.utils.progress import ProgressTracker, check_cancelled
 
-def analyze_historical_data(df, date_column, branch_column, material_column, start_quantity_column, end_quantity_column, end_cost_column, interest_rate, consumption_column=None, lead_time_days=30, consumption_convention='AUTO'):
+# На сколько блоков групп делится числовой расчет, когда нужен прогресс или отмена
+HISTORICAL_PROGRESS_BLOCKS = 20
+
+def analyze_historical_data(df, date_column, branch_column, material_column, start_quantity_column, end_quantity_column, end_cost_column, interest_rate, consumption_column=None, lead_time_days=30, consumption_convention='AUTO', engine='fast', output='strings', float_dtype=np.float32, progress=None, cancel_token=None):
     """
     Анализ исторических данных по запасам
 
@@ -21,17 +31,107 @@ def analyze_historical_data(df, date_column, branch_column, material_column, sta
         Время выполнения заказа в днях (по умолчанию 30)
     consumption_convention : str, optional
         Конвенция знака списания: 'AUTO', 'POSITIVE', 'NEGATIVE', 'ABS' (по умолчанию 'AUTO')
+    engine : str, optional
+        Движок расчета по группам материал/филиал:
+        'fast' - одна сортировка и разбиение по смещениям групп (по умолчанию)
+        'loop' - исходный цикл с фильтрацией всего DataFrame по маске для каждой группы
+    output : str, optional
+        'strings' - отформатированные строки для отчета (по умолчанию)
+        'numeric' - типизированные числовые колонки float32/int32 (см. historical_metrics);
+        строки для показа формирует FormattedHistoricalView
+    float_dtype : numpy dtype, optional
+        Тип вещественных колонок для output='numeric' (по умолчанию float32;
+        с float64 format_historical_metrics дает те же строки, что и 'strings')
+    progress : callable, optional
+        progress(info) - прогресс по группам материал/филиал (см. src.utils.progress.ProgressTracker)
+    cancel_token : CancellationToken, optional
+        Токен отмены: расчет прерывается исключением AnalysisCancelled
+    """
+    check_cancelled(cancel_token)
+    df = _prepare_history(df, date_column, start_quantity_column, end_quantity_column, consumption_column,
+                          consumption_convention)
+
+    if output == 'numeric':
+        metric_args = (date_column, branch_column, material_column, start_quantity_column, end_quantity_column,
+                       end_cost_column, interest_rate, consumption_column, lead_time_days)
+        if progress is None and cancel_token is None:
+            metrics = compute_historical_metrics(df, *metric_args, float_dtype=float_dtype)
+        else:
+            metrics = _compute_metrics_in_blocks(df, metric_args, float_dtype, progress, cancel_token)
+        explanation = get_explanation(format_historical_metrics(metrics, [0]).iloc[0])
+        return metrics, explanation
+    elif output != 'strings':
+        raise ValueError(f"Неизвестный формат результата: {output}")
+
+    if engine == 'fast':
+        results = _analyze_groups_sorted(
+            df, date_column, branch_column, material_column, start_quantity_column,
+            end_quantity_column, end_cost_column, interest_rate, consumption_column, lead_time_days,
+            progress, cancel_token
+        )
+    elif engine == 'loop':
+        results = _analyze_groups_loop(
+            df, date_column, branch_column, material_column, start_quantity_column,
+            end_quantity_column, end_cost_column, interest_rate, consumption_column, lead_time_days,
+            progress, cancel_token
+        )
+    else:
+        raise ValueError(f"Неизвестный движок расчета: {engine}")
+
+    results_df = pd.DataFrame(results)
+    explanation = get_explanation(results_df.iloc[0])
+    
+    return results_df, explanation
+
+def _compute_metrics_in_blocks(df, metric_args, float_dtype, progress, cancel_token):
+    """
+    compute_historical_metrics по блокам групп - с прогрессом и проверкой отмены между блоками.
+
+    Группы независимы, а блоки идут по возрастанию ключей, поэтому результат
+    совпадает с расчетом одним вызовом.
+    """
+    material_column, branch_column = metric_args[2], metric_args[1]
+    codes = df.groupby([material_column, branch_column], sort=True, observed=True).ngroup()
+    codes = codes.fillna(-1).to_numpy(dtype=np.int64)
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+
+    tracker = ProgressTracker('historical', n_groups, callback=progress, cancel_token=cancel_token)
+    tracker.start()
+    if n_groups == 0:
+        return compute_historical_metrics(df, *metric_args, float_dtype=float_dtype)
+
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind='stable')]
+    block_groups = max(1, -(-n_groups // HISTORICAL_PROGRESS_BLOCKS))
+    edges = np.searchsorted(codes[order], np.arange(0, n_groups + block_groups, block_groups))
+
+    blocks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if lo == hi:
+            continue
+        block = df.iloc[order[lo:hi]]
+        blocks.append(compute_historical_metrics(block, *metric_args, float_dtype=float_dtype))
+        tracker.advance(int(codes[order[hi - 1]] - codes[order[lo]]) + 1)
+    tracker.finish()
+    return pd.concat(blocks, ignore_index=True)
+
+
+def _prepare_history(df, date_column, start_quantity_column, end_quantity_column, consumption_column,
+                     consumption_convention, return_convention=False):
+    """
+    Приведение даты и нормализация списания перед расчетом метрик.
+
+    return_convention=True - вернуть также явную конвенцию списания
+    (dv.explicit_convention; None без колонки списания) для следующих частей данных.
     """
-    df = df.copy()  # Создаем копию чтобы не модифицировать оригинал
+    # Поверхностная копия: колонки даты и списания заменяются целиком, данные
+    # остальных колонок не копируются, а оригинал не модифицируется
+    df = df.copy(deep=False)
     df[date_column] = pd.to_datetime(df[date_column])
 
     # АВТОМАТИЧЕСКАЯ НОРМАЛИЗАЦИЯ СПИСАНИЯ
-    arrival_column = None
     # Пытаемся найти колонку прихода для более точной проверки
-    for col in df.columns:
-        if any(keyword in col.lower() for keyword in ['прих', 'закуп', 'поступ', 'arrival', 'purchase']):
-            arrival_column = col
-            break
+    arrival_column = _find_arrival_column(df.columns)
 
     if consumption_column and consumption_column in df.columns:
         # Нормализуем списание (всегда делаем положительным)
@@ -40,12 +140,319 @@ def analyze_historical_data(df, date_column, branch_column, material_column, sta
             convention=consumption_convention,
             start_column=start_quantity_column,
             end_column=end_quantity_column,
-            arrival_column=arrival_column
+            arrival_column=arrival_column,
+            inplace=True
+        )
+        if consumption_convention == 'AUTO':
+            print(f"[INFO] Нормализация списания: {detection['recommendation']}")
+        convention = dv.explicit_convention(detection)
+    else:
+        convention = None
+    if return_convention:
+        return df, convention
+    return df
+
+
+def analyze_historical_data_incremental(df, state_path, date_column, branch_column, material_column,
+                                        start_quantity_column, end_quantity_column, end_cost_column, interest_rate,
+                                        consumption_column=None, lead_time_days=30, consumption_convention='AUTO',
+                                        output='strings', float_dtype=np.float32):
+    """
+    Инкрементальный анализ: в сохраненные агрегаты добавляются только новые строки.
+
+    Агрегаты по группам материал/филиал (HistoricalAggregates) хранятся в state_path.
+    Первый запуск (файла нет) принимает всю историю и сохраняет агрегаты; следующие -
+    только новые периоды. Результат совпадает с analyze_historical_data по всей
+    накопленной истории.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Новые строки (при первом запуске - вся история); строки группы не позже
+        уже учтенных пропускаются, поэтому повторный запуск с тем же месяцем
+        ничего не меняет
+    state_path : str or Path
+        Файл агрегатов (Parquet); перезаписывается после успешного обновления
+    consumption_convention : str
+        Как в analyze_historical_data; 'AUTO' определяется при первом запуске,
+        дальше используется конвенция, сохраненная в агрегатах
+    остальные параметры - как в analyze_historical_data
+
+    Returns:
+    --------
+    tuple: (результаты, пояснение) - как у analyze_historical_data
+    """
+    if output not in ('strings', 'numeric'):
+        raise ValueError(f"Неизвестный формат результата: {output}")
+
+    aggregates = HistoricalAggregates.load(state_path) if os.path.exists(state_path) else HistoricalAggregates()
+    # Конвенция списания определяется один раз (по первой загрузке) и хранится в агрегатах:
+    # новый месяц нормализуется так же, как вся накопленная история
+    if consumption_convention == 'AUTO' and aggregates.consumption_convention is not None:
+        consumption_convention = aggregates.consumption_convention
+    df, convention = _prepare_history(df, date_column, start_quantity_column, end_quantity_column,
+                                      consumption_column, consumption_convention, return_convention=True)
+    aggregates.update(df, date_column, branch_column, material_column, start_quantity_column,
+                      end_quantity_column, end_cost_column, consumption_column)
+    if aggregates.consumption_convention is None:
+        aggregates.consumption_convention = convention
+    if aggregates.skipped_rows:
+        print(f"[INFO] Пропущено строк, уже учтенных в агрегатах: {aggregates.skipped_rows}")
+    aggregates.save(state_path)
+
+    # Строки формируются из float64 - как в строковом режиме analyze_historical_data
+    metrics = aggregates.metrics(interest_rate, lead_time_days,
+                                 float_dtype=float_dtype if output == 'numeric' else np.float64)
+    explanation = get_explanation(format_historical_metrics(metrics, [0]).iloc[0])
+    if output == 'strings':
+        return format_historical_metrics(metrics), explanation
+    return metrics, explanation
+
+
+def _find_arrival_column(columns):
+    """Колонка прихода/закупки по ключевым словам (или None)"""
+    for col in columns:
+        if any(keyword in col.lower() for keyword in ['прих', 'закуп', 'поступ', 'arrival', 'purchase']):
+            return col
+    return None
+
+
+def analyze_historical_data_stream(source, date_column, branch_column, material_column, start_quantity_column,
+                                   end_quantity_column, end_cost_column, interest_rate, consumption_column=None,
+                                   lead_time_days=30, consumption_convention='AUTO', output='strings',
+                                   chunk_rows=500_000):
+    """
+    Потоковый анализ исторических данных, которые не помещаются в память.
+
+    Данные читаются частями (row groups Parquet, record batches Feather, блоки CSV)
+    и должны быть сгруппированы по материалу/филиалу: все строки одной группы
+    идут подряд (например, файл отсортирован по материалу, филиалу и дате).
+    Группа, которая может продолжиться в следующей части, переносится в нее,
+    поэтому результаты по каждой группе совпадают с analyze_historical_data.
+    Конвенция списания при consumption_convention='AUTO' определяется один раз
+    по первой части и применяется ко всем следующим.
+
+    Parameters:
+    -----------
+    source : str, Path, file-like or iterable of pd.DataFrame
+        Файл Parquet/Feather/CSV, готовая последовательность частей
+        или HistoryStore (колонки - по ролям: 'date', 'branch', 'material', ...)
+    chunk_rows : int, optional
+        Примерное число строк в читаемой части
+    остальные параметры - как в analyze_historical_data
+
+    Yields:
+    -------
+    pd.DataFrame: результаты по группам, завершившимся в очередной части
+    (части - в порядке чтения, внутри части - по возрастанию ключей, как в analyze_historical_data)
+    """
+    from src.utils.data_loading import iter_table_chunks, read_header
+
+    if isinstance(source, (str, Path)) or hasattr(source, 'read'):
+        header = read_header(source)
+        needed = {date_column, branch_column, material_column, start_quantity_column,
+                  end_quantity_column, end_cost_column, consumption_column, _find_arrival_column(header)}
+        chunks = iter_table_chunks(source, columns=[col for col in header if col in needed], chunk_rows=chunk_rows)
+    else:
+        chunks = iter(source)
+
+    key_columns = [material_column, branch_column]
+    finished_keys = set()
+    convention = consumption_convention
+
+    def analyze(part):
+        nonlocal convention
+        part_keys = set(part[key_columns].drop_duplicates().itertuples(index=False, name=None))
+        repeated = part_keys & finished_keys
+        if repeated:
+            raise ValueError(
+                "Данные для потокового анализа должны быть сгруппированы по материалу/филиалу; "
+                f"группа {next(iter(repeated))} встречается повторно"
+            )
+        finished_keys.update(part_keys)
+        if convention == 'AUTO' and consumption_column in part.columns:
+            _, convention = _prepare_history(part, date_column, start_quantity_column, end_quantity_column,
+                                             consumption_column, convention, return_convention=True)
+        results, _ = analyze_historical_data(
+            part, date_column, branch_column, material_column, start_quantity_column,
+            end_quantity_column, end_cost_column, interest_rate, consumption_column, lead_time_days,
+            consumption_convention=convention, output=output
         )
-        print(f"[INFO] Нормализация списания: {detection['recommendation']}")
+        return results
+
+    carry = None
+    for chunk in chunks:
+        # Строки без ключа группы analyze_historical_data все равно пропускает
+        chunk = chunk.dropna(subset=key_columns)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+
+        # Последняя группа части может продолжиться в следующей - переносим ее
+        last = chunk.iloc[-1]
+        is_last_group = ((chunk[material_column] == last[material_column]) &
+                         (chunk[branch_column] == last[branch_column])).to_numpy()
+        carry = chunk[is_last_group]
+        complete = chunk[~is_last_group]
+
+        if not complete.empty:
+            yield analyze(complete)
+
+    if carry is not None and not carry.empty:
+        yield analyze(carry)
+
+
+def _analyze_groups_sorted(df, date_column, branch_column, material_column, start_quantity_column,
+                           end_quantity_column, end_cost_column, interest_rate, consumption_column, lead_time_days,
+                           progress=None, cancel_token=None):
+    """
+    Быстрый расчет метрик: одна сортировка, затем каждая группа - срез по смещениям.
 
+    Колонки извлекаются в NumPy массивы один раз, поэтому общая сложность
+    O(строк × log(строк)) вместо O(групп × строк). Результат совпадает с _analyze_groups_loop.
+    """
+    order, bounds, keys = sorted_group_offsets(df, [material_column, branch_column], date_column)
+    has_consumption = bool(consumption_column) and consumption_column in df.columns
+
+    def column(name):
+        return df[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+
+    dates = pd.to_datetime(df[date_column]).to_numpy()[order]
+    start_values = column(start_quantity_column)
+    end_values = column(end_quantity_column)
+    cost_values = column(end_cost_column)
+    consumption_values = column(consumption_column) if has_consumption else None
+    # Сезонность и тренд всех групп - одним векторным расчетом
+    seasonality_values, trend_values = seasonal_strength_and_slope(end_values, bounds)
+
+    tracker = ProgressTracker('historical', len(keys), callback=progress, cancel_token=cancel_token)
+    tracker.start()
     results = []
-    unique_combinations = df.groupby([material_column, branch_column]).groups.keys()
+    with warnings.catch_warnings():
+        # Пустые срезы и std одной точки дают NaN так же, как pandas
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        for group, ((material, branch), lo, hi) in enumerate(zip(keys, bounds[:-1], bounds[1:])):
+            starts = start_values[lo:hi]
+            ends = end_values[lo:hi]
+            group_dates = dates[lo:hi]
+            total_periods = hi - lo
+
+            start_quantity = starts[0]
+            end_quantity = ends[-1]
+            growth = end_quantity / start_quantity if start_quantity != 0 else np.inf
+            valid_dates = group_dates[~np.isnat(group_dates)]
+            months = pd.Timedelta(valid_dates.max() - valid_dates.min()).days / 30.44 if len(valid_dates) else np.nan
+
+            if has_consumption:
+                usage = consumption_values[lo:hi]
+                average_usage = np.nanmean(usage)
+                total_usage = np.nansum(usage)
+                usage_std = np.nanstd(usage, ddof=1)
+            else:
+                differences = starts - ends
+                average_usage = abs(np.nanmean(differences))
+                total_usage = abs(np.nansum(differences))
+                usage_std = abs(np.nanstd(differences, ddof=1))
+
+            average_inventory = abs(np.nanmean(starts + ends) / 2)
+
+            if average_inventory > 0:
+                turnover = abs(total_usage) / average_inventory
+                turnover_str = f'{turnover:.2f}'
+            elif total_usage == 0 and average_inventory == 0:
+                turnover_str = 'Нет движения'
+            elif total_usage == 0:
+                turnover_str = 'Нет использования'
+            elif average_inventory == 0:
+                turnover_str = 'Нет запаса'
+            else:
+                turnover_str = 'Ошибка в данных'
+
+            seasonality = seasonality_values[group]
+            trend = trend_values[group]
+
+            excess_inventory = "Да" if end_quantity > 2 * abs(average_usage) else "Нет"
+            coefficient_variation = usage_std / abs(average_usage) if average_usage != 0 else np.nan
+
+            end_cost = cost_values[hi - 1]
+            unit_cost = end_cost / end_quantity if end_quantity != 0 else 0
+
+            if excess_inventory == "Да":
+                excess_amount = end_quantity - 2 * abs(average_usage)
+                lost_profit = excess_amount * unit_cost * interest_rate / 100
+            else:
+                lost_profit = 0
+
+            if turnover_str != 'Нет движения' and turnover_str != 'Нет использования' and turnover_str != 'Нет запаса':
+                try:
+                    turnover_val = float(turnover_str)
+                    days_of_inventory = 365 / turnover_val if turnover_val > 0 else np.inf
+                    days_str = f'{days_of_inventory:.0f} дней' if days_of_inventory != np.inf else 'Н/Д'
+                except ValueError:
+                    days_str = 'Н/Д'
+            else:
+                days_str = 'Н/Д'
+
+            daily_usage = abs(average_usage) * 12 / 365
+            daily_std = usage_std / np.sqrt(30)
+            z_score = 1.65  # 95% service level
+            safety_stock_rop = z_score * daily_std * np.sqrt(lead_time_days)
+            reorder_point = (daily_usage * lead_time_days) + safety_stock_rop
+
+            deficit_mask = ends < 0
+            deficit_periods = int(np.count_nonzero(deficit_mask))
+            deficit_percentage = (deficit_periods / total_periods * 100) if total_periods > 0 else 0
+
+            if has_consumption:
+                total_demand = total_usage
+                unsatisfied_demand = abs(ends[deficit_mask].sum()) if deficit_periods > 0 else 0
+                fill_rate = ((total_demand - unsatisfied_demand) / total_demand * 100) if total_demand > 0 else 100
+                no_movement_periods = int(np.count_nonzero(usage == 0))
+            else:
+                fill_rate = 100 - deficit_percentage
+                no_movement_periods = int(np.count_nonzero(starts == ends))
+
+            dead_stock_percentage = (no_movement_periods / total_periods * 100) if total_periods > 0 else 0
+            is_dead_stock = "Да" if dead_stock_percentage > 50 else "Нет"
+
+            results.append({
+                'Материал': material,
+                'Филиал': branch,
+                'Рост за период': f'{growth:.2f} раз за {months:.1f} месяцев',
+                'Среднее списание': f'{average_usage:.0f} единиц в месяц',
+                'Оборачиваемость': turnover_str,
+                'Оборачиваемость (дни)': days_str,
+                'Сезонность': f'{seasonality:.2f}' if not np.isnan(seasonality) else 'Н/Д',
+                'Тренд': f'{trend:.2f}' if not np.isnan(trend) else 'Н/Д',
+                'Признаки накопления излишков': excess_inventory,
+                'ABC-класс': get_abc_class(abs(average_usage)),
+                'XYZ-класс': get_xyz_class(coefficient_variation),
+                'Коэффициент вариации спроса': f'{coefficient_variation:.2f}' if not np.isnan(coefficient_variation) else 'Н/Д',
+                'Рекомендуемый уровень запаса': f'{get_recommended_stock_level(abs(average_usage), seasonality, trend):.0f} единиц',
+                'Точка заказа (ROP)': f'{reorder_point:.0f} единиц',
+                'Упущенная выгода': f'{lost_profit:.2f} руб.',
+                'Периоды с дефицитом': f'{deficit_periods} из {total_periods} ({deficit_percentage:.1f}%)',
+                'Fill Rate': f'{fill_rate:.1f}%',
+                'Мертвый запас': f'{is_dead_stock} ({no_movement_periods}/{total_periods})'
+            })
+            tracker.advance()
+
+    return results
+
+
+def _analyze_groups_loop(df, date_column, branch_column, material_column, start_quantity_column,
+                         end_quantity_column, end_cost_column, interest_rate, consumption_column, lead_time_days,
+                         progress=None, cancel_token=None):
+    """
+    Исходный расчет метрик: для каждой группы фильтрует весь DataFrame по маске.
+    Сложность O(групп × строк), оставлен как эталон для сверки с быстрым движком.
+    """
+    results = []
+    unique_combinations = df.groupby([material_column, branch_column], observed=True).groups.keys()
+    tracker = ProgressTracker('historical', len(unique_combinations), callback=progress, cancel_token=cancel_token)
+    tracker.start()
 
     for material, branch in unique_combinations:
         group = df[(df[material_column] == material) & (df[branch_column] == branch)].sort_values(date_column)
@@ -188,11 +595,10 @@ def analyze_historical_data(df, date_column, branch_column, material_column, sta
             'Fill Rate': fill_rate_str,  # НОВАЯ МЕТРИКА
             'Мертвый запас': dead_stock_str  # НОВАЯ МЕТРИКА
         })
+        tracker.advance()
     
-    results_df = pd.DataFrame(results)
-    explanation = get_explanation(results_df.iloc[0])
-    
-    return results_df, explanation
+
+    return results
 
 def get_abc_class(average_usage):
     if average_usage > 100:
@@ -0,0 +1,429 @@
+"""
+Инкрементальный исторический анализ: агрегаты по группам материал/филиал.
+
+Ежемесячно к истории добавляется один период, а полный пересчет
+analyze_historical_data проходит по всем годам данных. HistoricalAggregates
+хранит по каждой группе накопленные величины, из которых выводятся все
+метрики compute_historical_metrics:
+
+- число строк, первую дату и начальный запас, последнюю дату, конечный
+  запас и стоимость;
+- суммы, количества и суммы квадратов отклонений (M2) списания, конечного
+  запаса и (начальный + конечный запас); M2 объединяются по формуле Чана,
+  что устойчивее суммы квадратов значений;
+- число периодов с дефицитом и без движения, сумму дефицита;
+- для тренда - суммы y и t·y по номеру периода t;
+- для сезонности - суммы остатков от скользящего среднего 2×12 по фазам
+  периода и последние 12 значений ряда: остаток точки окончателен, как
+  только известны 6 значений после нее.
+
+update складывает в агрегаты только новые строки, metrics выводит метрики
+теми же формулами (derive_historical_metrics), что и полный пересчет;
+результат совпадает с ним с точностью до порядка суммирования.
+
+Строки группы с датой не позже последней учтенной пропускаются, поэтому
+повторное применение того же периода ничего не меняет. Конвенция
+списания, определенная при первом обновлении, хранится вместе с
+агрегатами (consumption_convention).
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.historical_metrics import (
+    NUMERIC_METRIC_COLUMNS, sorted_group_offsets, derive_historical_metrics,
+    _group_nansum, _group_nancount, _trend_weights, _strength_from_phase_means, _KERNEL_MAX_CELLS
+)
+
+
+_NAT = np.iinfo(np.int64).min
+_DATE_LAST = np.iinfo(np.int64).max
+_NS_PER_DAY = 86_400 * 10 ** 9
+
+# Накопленные величины группы и их начальные значения
+_FIELDS = {
+    'periods': 0,
+    'first_date': _NAT,            # дата первой строки (нс)
+    'start_quantity': np.nan,      # начальный запас первой строки
+    'last_key': _NAT,              # ключ сортировки последней строки (NaT - в конце)
+    'end_quantity': np.nan,        # конечный запас последней строки
+    'end_cost': np.nan,            # стоимость последней строки
+    'max_date': _NAT,              # последняя непустая дата
+    'date_count': 0,
+    'usage_count': 0,
+    'usage_sum': 0.0,
+    'usage_m2': 0.0,
+    'no_movement': 0,
+    'inventory_count': 0,
+    'inventory_sum': 0.0,
+    'deficit_periods': 0,
+    'deficit_sum': 0.0,
+    'end_count': 0,
+    'end_sum': 0.0,
+    'end_m2': 0.0,
+    'end_sum_ty': 0.0,
+    'end_has_nan': False,
+}
+
+
+def _group_moments(values, starts, group_ids):
+    """Количество, сумма и сумма квадратов отклонений от среднего по группам (с пропуском NaN)"""
+    counts = _group_nancount(values, starts)
+    sums = _group_nansum(values, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(counts > 0, sums / counts, 0.0)
+    m2 = _group_nansum((values - mean[group_ids]) ** 2, starts)
+    return counts, sums, m2
+
+
+def _merge_m2(count_a, sum_a, m2_a, count_b, sum_b, m2_b):
+    """M2 объединения двух выборок (формула Чана)"""
+    total = count_a + count_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = sum_b / count_b - sum_a / count_a
+        correction = delta ** 2 * count_a * count_b / total
+    return m2_a + m2_b + np.where((count_a > 0) & (count_b > 0), correction, 0.0)
+
+
+class HistoricalAggregates:
+    """
+    Накопленные агрегаты исторического анализа по группам материал/филиал.
+
+    Пример:
+        aggregates = HistoricalAggregates()
+        aggregates.update(history, 'Дата', 'Филиал', 'Материал', ...)   # вся история
+        aggregates.save('aggregates.parquet')
+        ...
+        aggregates = HistoricalAggregates.load('aggregates.parquet')
+        aggregates.update(new_month, 'Дата', 'Филиал', 'Материал', ...)  # только новый период
+        metrics = aggregates.metrics(interest_rate=5.0)
+
+    Parameters:
+    -----------
+    period : int
+        Длина сезонного цикла (как в seasonal_strength_and_slope)
+    """
+
+    MIN_PERIODS = 12
+
+    def __init__(self, period=12):
+        self.period = period
+        self.half = period // 2
+        self.keys = []
+        self.has_consumption = None
+        # Явная конвенция списания (dv.explicit_convention), определенная при первом обновлении
+        self.consumption_convention = None
+        # Строк, пропущенных последним update как уже учтенные
+        self.skipped_rows = 0
+        self.data = {name: np.full(0, default, dtype=np.asarray(default).dtype) for name, default in _FIELDS.items()}
+        self.phase_sum = np.zeros((0, period))
+        self.phase_count = np.zeros((0, period), dtype=np.int64)
+        self.tail = np.zeros((0, 2 * self.half))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _add_groups(self, keys):
+        """Добавляет пустые агрегаты для новых групп"""
+        n_new = len(keys)
+        self.keys = self.keys + list(keys)
+        for name, default in _FIELDS.items():
+            self.data[name] = np.concatenate([self.data[name], np.full(n_new, default, dtype=self.data[name].dtype)])
+        self.phase_sum = np.vstack([self.phase_sum, np.zeros((n_new, self.period))])
+        self.phase_count = np.vstack([self.phase_count, np.zeros((n_new, self.period), dtype=np.int64)])
+        self.tail = np.vstack([self.tail, np.full((n_new, self.tail.shape[1]), np.nan)])
+
+    def _sort_groups(self):
+        """Упорядочивает группы по ключам, как df.groupby(sort=True)"""
+        order = pd.DataFrame(self.keys, columns=['material', 'branch']).sort_values(
+            ['material', 'branch'], kind='stable').index.to_numpy()
+        if np.array_equal(order, np.arange(len(order))):
+            return
+        self.keys = [self.keys[i] for i in order]
+        self.data = {name: values[order] for name, values in self.data.items()}
+        self.phase_sum = self.phase_sum[order]
+        self.phase_count = self.phase_count[order]
+        self.tail = self.tail[order]
+
+    def update(self, df, date_column, branch_column, material_column, start_quantity_column, end_quantity_column,
+               end_cost_column, consumption_column=None):
+        """
+        Складывает новые строки в агрегаты.
+
+        Ожидает уже нормализованное списание (см. analyze_historical_data).
+        Строки группы с датой не позже последней учтенной пропускаются (их число -
+        в skipped_rows): повторное применение того же периода ничего не меняет.
+
+        Returns:
+        --------
+        int: число групп, затронутых новыми строками
+        """
+        has_consumption = bool(consumption_column) and consumption_column in df.columns
+        if self.has_consumption is not None and len(self) and has_consumption != self.has_consumption:
+            raise ValueError("Колонка списания должна быть задана так же, как при накоплении агрегатов")
+
+        self.skipped_rows = 0
+        if self.keys:
+            new_rows = self._after_last_key(df, date_column, branch_column, material_column)
+            if not new_rows.all():
+                self.skipped_rows = int((~new_rows).sum())
+                df = df[new_rows]
+
+        order, bounds, new_keys = sorted_group_offsets(df, [material_column, branch_column], date_column)
+        if len(new_keys) == 0:
+            return 0
+
+        def column(name):
+            return df[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+
+        starts_idx = bounds[:-1]
+        ends_idx = bounds[1:] - 1
+        lengths = np.diff(bounds)
+        group_ids = np.repeat(np.arange(len(lengths)), lengths)
+
+        dates = pd.to_datetime(df[date_column]).to_numpy().astype('datetime64[ns]')[order].view(np.int64)
+        sort_keys = np.where(dates == _NAT, _DATE_LAST, dates)
+
+        # Группы агрегатов для новых ключей (строки не позже учтенных уже отброшены)
+        if self.keys:
+            known = pd.MultiIndex.from_tuples(self.keys)
+            positions = known.get_indexer(pd.MultiIndex.from_tuples(new_keys))
+        else:
+            positions = np.full(len(new_keys), -1)
+        existing = positions >= 0
+
+        missing = np.flatnonzero(~existing)
+        if len(missing):
+            positions[missing] = len(self) + np.arange(len(missing))
+            self._add_groups([new_keys[i] for i in missing])
+        self.has_consumption = has_consumption
+
+        data = self.data
+        groups = positions
+        n_old = data['periods'][groups].copy()
+        is_new = n_old == 0
+
+        start_values = column(start_quantity_column)
+        end_values = column(end_quantity_column)
+        cost_values = column(end_cost_column)
+
+        # Первая и последняя строки, даты
+        data['first_date'][groups] = np.where(is_new, dates[starts_idx], data['first_date'][groups])
+        data['start_quantity'][groups] = np.where(is_new, start_values[starts_idx], data['start_quantity'][groups])
+        data['last_key'][groups] = sort_keys[ends_idx]
+        data['end_quantity'][groups] = end_values[ends_idx]
+        data['end_cost'][groups] = cost_values[ends_idx]
+        date_counts = np.add.reduceat((dates != _NAT).astype(np.int64), starts_idx)
+        last_valid = starts_idx + np.maximum(date_counts, 1) - 1
+        data['max_date'][groups] = np.where(date_counts > 0, dates[last_valid], data['max_date'][groups])
+        data['date_count'][groups] += date_counts
+
+        # Списание (или разность остатков) и средний запас
+        if has_consumption:
+            usage = column(consumption_column)
+            no_movement = usage == 0
+        else:
+            usage = start_values - end_values
+            no_movement = start_values == end_values
+        self._merge_moments('usage', groups, *_group_moments(usage, starts_idx, group_ids))
+        data['no_movement'][groups] += np.add.reduceat(no_movement.astype(np.int64), starts_idx)
+
+        inventory = start_values + end_values
+        data['inventory_count'][groups] += _group_nancount(inventory, starts_idx)
+        data['inventory_sum'][groups] += _group_nansum(inventory, starts_idx)
+
+        deficit_mask = end_values < 0
+        data['deficit_periods'][groups] += np.add.reduceat(deficit_mask.astype(np.int64), starts_idx)
+        data['deficit_sum'][groups] += np.add.reduceat(np.where(deficit_mask, end_values, 0.0), starts_idx)
+
+        # Конечный запас: моменты, суммы для тренда и остатки для сезонности
+        self._merge_moments('end', groups, *_group_moments(end_values, starts_idx, group_ids))
+        data['end_has_nan'][groups] |= np.add.reduceat(np.isnan(end_values).astype(np.int64), starts_idx) > 0
+        t = n_old[group_ids] + (np.arange(len(end_values)) - starts_idx[group_ids])
+        data['end_sum_ty'][groups] += _group_nansum(t * end_values, starts_idx)
+        self._fold_seasonal(groups, n_old, end_values, bounds)
+
+        data['periods'][groups] += lengths
+        self._sort_groups()
+        return len(new_keys)
+
+    def _after_last_key(self, df, date_column, branch_column, material_column):
+        """
+        Маска строк позже последней учтенной строки своей группы (строки новых групп - всегда).
+
+        Строки без даты сортируются в конец группы; группа, последняя строка которой
+        без даты, не может принять новые датированные строки - нужен полный пересчет.
+        """
+        known = pd.MultiIndex.from_tuples(self.keys)
+        positions = known.get_indexer(pd.MultiIndex.from_arrays([df[material_column], df[branch_column]]))
+        dates = pd.to_datetime(df[date_column]).to_numpy().astype('datetime64[ns]').view(np.int64)
+        sort_keys = np.where(dates == _NAT, _DATE_LAST, dates)
+        last_keys = np.where(positions >= 0, self.data['last_key'][positions], _NAT)
+
+        blocked = (last_keys == _DATE_LAST) & (sort_keys != _DATE_LAST)
+        if blocked.any():
+            key = self.keys[positions[int(np.flatnonzero(blocked)[0])]]
+            raise ValueError(
+                f"Последняя учтенная строка группы {key} без даты, новые строки нельзя упорядочить; "
+                "для таких данных нужен полный пересчет"
+            )
+        return (positions < 0) | (sort_keys > last_keys)
+
+    def _merge_moments(self, prefix, groups, counts, sums, m2):
+        """Объединяет количество, сумму и M2 новых строк с накопленными"""
+        data = self.data
+        count_name, sum_name, m2_name = f'{prefix}_count', f'{prefix}_sum', f'{prefix}_m2'
+        data[m2_name][groups] = _merge_m2(data[count_name][groups], data[sum_name][groups], data[m2_name][groups],
+                                          counts, sums, m2)
+        data[count_name][groups] += counts
+        data[sum_name][groups] += sums
+
+    def _fold_seasonal(self, groups, n_old, values, bounds):
+        """
+        Остатки от скользящего среднего для точек, окно которых стало полным.
+
+        Для каждой группы ряд = хвост из 2×half последних учтенных значений + новые
+        значения; точка p окончательна, когда известны значения p - half .. p + half.
+        """
+        half, tail_width = self.half, self.tail.shape[1]
+        lengths = np.diff(bounds)
+        weights = _trend_weights(self.period)
+        width = tail_width + int(lengths.max())
+        batch = max(1, _KERNEL_MAX_CELLS // width)
+
+        for start in range(0, len(groups), batch):
+            part = np.arange(start, min(start + batch, len(groups)))
+            part_groups = groups[part]
+            part_lengths = lengths[part]
+
+            matrix = np.full((len(part), width), np.nan)
+            matrix[:, :tail_width] = self.tail[part_groups]
+            rows = np.repeat(np.arange(len(part)), part_lengths)
+            cols = tail_width + np.arange(part_lengths.sum()) - np.repeat(np.cumsum(part_lengths) - part_lengths,
+                                                                           part_lengths)
+            matrix[rows, cols] = values[np.repeat(bounds[part], part_lengths) + cols - tail_width]
+
+            # Центрированное скользящее среднее, как в _seasonal_strength
+            padded = np.pad(matrix, ((0, 0), (half, half)), constant_values=np.nan)
+            trend = np.zeros_like(matrix)
+            for k, weight in enumerate(weights):
+                trend += weight * padded[:, k:k + width]
+            detrended = matrix - trend
+
+            # Позиция колонки в ряду группы; точки до n_old - half уже учтены
+            positions = n_old[part][:, None] - tail_width + np.arange(width)[None, :]
+            ready = ~np.isnan(detrended) & (positions >= n_old[part][:, None] - half)
+            ready_rows, ready_cols = np.nonzero(ready)
+            phases = positions[ready_rows, ready_cols] % self.period
+            np.add.at(self.phase_sum, (part_groups[ready_rows], phases), detrended[ready_rows, ready_cols])
+            np.add.at(self.phase_count, (part_groups[ready_rows], phases), 1)
+
+            # Новый хвост - последние tail_width значений ряда
+            tail_cols = part_lengths[:, None] + np.arange(tail_width)[None, :]
+            self.tail[part_groups] = matrix[np.arange(len(part))[:, None], tail_cols]
+
+    def metrics(self, interest_rate, lead_time_days=30, float_dtype=np.float32):
+        """
+        Метрики по накопленным агрегатам.
+
+        Returns:
+        --------
+        pd.DataFrame: как compute_historical_metrics по всем учтенным строкам
+        """
+        if not self.keys:
+            return pd.DataFrame(columns=['Материал', 'Филиал'] + NUMERIC_METRIC_COLUMNS)
+
+        data = self.data
+        lengths = data['periods']
+        has_consumption = bool(self.has_consumption)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            span = (data['max_date'] - data['first_date']) // _NS_PER_DAY
+            months = np.where(data['date_count'] > 0, span.astype(np.float64), np.nan) / 30.44
+
+            usage_count = data['usage_count']
+            average_usage = np.where(usage_count > 0, data['usage_sum'] / usage_count, np.nan)
+            usage_std = np.where(usage_count > 1, np.sqrt(data['usage_m2'] / (usage_count - 1)), np.nan)
+            total_usage = data['usage_sum']
+            if not has_consumption:
+                average_usage, usage_std, total_usage = np.abs(average_usage), np.abs(usage_std), np.abs(total_usage)
+
+            inventory_count = data['inventory_count']
+            inventory_mean = np.where(inventory_count > 0, data['inventory_sum'] / inventory_count, np.nan)
+
+            seasonality, trend = self._seasonality_and_trend()
+
+        return derive_historical_metrics(
+            self.keys, lengths, months, data['start_quantity'], data['end_quantity'], data['end_cost'],
+            average_usage, usage_std, total_usage, data['no_movement'], inventory_mean, seasonality, trend,
+            data['deficit_periods'], np.abs(data['deficit_sum']), has_consumption, interest_rate,
+            lead_time_days, float_dtype
+        )
+
+    def _seasonality_and_trend(self):
+        """Сезонность и наклон тренда из накопленных сумм (условия - как в seasonal_strength_and_slope)"""
+        data = self.data
+        n = data['periods'].astype(np.float64)
+        valid = ~data['end_has_nan'] & (data['periods'] > self.MIN_PERIODS)
+
+        # Наклон OLS по t = 0..n-1: (Σty - t̄Σy) / Σ(t - t̄)²
+        t_mean = (n - 1) / 2
+        trend = (data['end_sum_ty'] - t_mean * data['end_sum']) / (n * (n ** 2 - 1) / 12)
+        trend = np.where(valid, trend, np.nan)
+
+        seasonality = np.full(len(n), np.nan)
+        decomposable = np.flatnonzero(valid & (data['periods'] >= 2 * self.period))
+        if len(decomposable):
+            phase_means = self.phase_sum[decomposable] / self.phase_count[decomposable]
+            series_std = np.sqrt(data['end_m2'][decomposable] / (n[decomposable] - 1))
+            seasonality[decomposable] = _strength_from_phase_means(
+                phase_means, data['periods'][decomposable], series_std, self.period
+            )
+        return seasonality, trend
+
+    def to_frame(self):
+        """Агрегаты в виде таблицы (по строке на группу)"""
+        materials = [key[0] for key in self.keys]
+        branches = [key[1] for key in self.keys]
+        frame = {'Материал': materials, 'Филиал': branches}
+        frame.update(self.data)
+        for name, matrix in (('phase_sum', self.phase_sum), ('phase_count', self.phase_count), ('tail', self.tail)):
+            for i in range(matrix.shape[1]):
+                frame[f'{name}_{i}'] = matrix[:, i]
+        frame['has_consumption'] = np.full(len(self.keys), bool(self.has_consumption))
+        frame['consumption_convention'] = [self.consumption_convention] * len(self.keys)
+        return pd.DataFrame(frame)
+
+    def save(self, path):
+        """Сохраняет агрегаты в Parquet (атомарно - через временный файл)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            self.to_frame().to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        """Загружает агрегаты, сохраненные save"""
+        frame = pd.read_parquet(path)
+        period = sum(1 for column in frame.columns if column.startswith('phase_sum_'))
+        aggregates = cls(period=period)
+        aggregates.keys = list(zip(frame['Материал'].tolist(), frame['Филиал'].tolist()))
+        aggregates.data = {
+            name: frame[name].to_numpy(dtype=np.asarray(default).dtype, copy=True) for name, default in _FIELDS.items()
+        }
+        aggregates.phase_sum = frame[[f'phase_sum_{i}' for i in range(period)]].to_numpy(dtype=np.float64, copy=True)
+        aggregates.phase_count = frame[[f'phase_count_{i}' for i in range(period)]].to_numpy(dtype=np.int64, copy=True)
+        aggregates.tail = frame[[f'tail_{i}' for i in range(2 * aggregates.half)]].to_numpy(dtype=np.float64, copy=True)
+        aggregates.has_consumption = bool(frame['has_consumption'].iloc[0]) if len(frame) else None
+        if 'consumption_convention' in frame.columns and len(frame):
+            # Файлы агрегатов без этой колонки (старые) - конвенция определится заново
+            aggregates.consumption_convention = frame['consumption_convention'].iloc[0]
+        return aggregates
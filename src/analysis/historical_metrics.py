@@ -0,0 +1,533 @@
+"""
+Векторные ядра метрик исторического анализа.
+
+Считает те же показатели, что и analyze_historical_data, но возвращает
+типизированный колоночный DataFrame (float32/int32) вместо строк вида
+'12 единиц в месяц'. Агрегация по группам материал/филиал выполняется
+через np.add.reduceat по отсортированным массивам без цикла по группам.
+
+Строки для отображения формирует отдельный ленивый слой
+(format_historical_metrics / FormattedHistoricalView) - только для
+тех строк, которые действительно показываются или выгружаются.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Колонки числового результата (ключи группы - 'Материал', 'Филиал')
+NUMERIC_METRIC_COLUMNS = [
+    'periods', 'months', 'start_quantity', 'end_quantity', 'growth',
+    'average_usage', 'total_usage', 'usage_std', 'average_inventory', 'turnover',
+    'days_of_inventory', 'seasonality', 'trend', 'excess_inventory',
+    'abc_class', 'xyz_class', 'coefficient_variation', 'recommended_stock',
+    'reorder_point', 'lost_profit', 'deficit_periods', 'deficit_percentage',
+    'fill_rate', 'no_movement_periods', 'dead_stock',
+]
+
+
+def sorted_group_offsets(df, key_columns, date_column):
+    """
+    Сортирует строки один раз по ключам группы и дате и находит границы групп.
+
+    Группы нумеруются так же, как в df.groupby(key_columns) (по возрастанию ключей,
+    строки с пропущенными ключами отбрасываются). Внутри группы строки упорядочены
+    по дате, пустые даты - в конце.
+
+    Returns:
+    --------
+    tuple: (order, bounds, keys)
+        order - позиции строк df в отсортированном порядке
+        bounds - массив смещений длины n_groups + 1; группа i = order[bounds[i]:bounds[i + 1]]
+        keys - список кортежей ключей групп
+    """
+    codes = df.groupby(key_columns, sort=True, observed=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+    dates = pd.to_datetime(df[date_column]).to_numpy().astype('datetime64[ns]').view(np.int64)
+    dates = np.where(dates == np.iinfo(np.int64).min, np.iinfo(np.int64).max, dates)  # NaT в конец
+
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.lexsort((dates[valid], codes[valid]))]
+
+    sorted_codes = codes[order]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(sorted_codes)) + 1, [len(order)]))
+    if len(order) == 0:
+        bounds = np.array([0])
+
+    first_rows = df.iloc[order[bounds[:-1]]]
+    keys = list(zip(*(first_rows[col].tolist() for col in key_columns)))
+
+    return order, bounds, keys
+
+
+def _group_nansum(values, starts):
+    """Сумма по группам с пропуском NaN (аналог pandas sum)"""
+    return np.add.reduceat(np.where(np.isnan(values), 0.0, values), starts)
+
+
+def _group_nancount(values, starts):
+    """Количество непустых значений в каждой группе"""
+    return np.add.reduceat((~np.isnan(values)).astype(np.int64), starts)
+
+
+def _group_nanmean_std(values, starts, group_ids):
+    """
+    Среднее и стандартное отклонение (ddof=1) по группам с пропуском NaN.
+
+    Двухпроходная схема (как в pandas): сначала среднее, затем сумма квадратов отклонений.
+    """
+    counts = _group_nancount(values, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(counts > 0, _group_nansum(values, starts) / counts, np.nan)
+        squares = (values - mean[group_ids]) ** 2
+        std = np.where(counts > 1, np.sqrt(_group_nansum(squares, starts) / (counts - 1)), np.nan)
+    return mean, std
+
+
+# Ограничение размера выровненной матрицы одной пачки групп (ячеек float64)
+_KERNEL_MAX_CELLS = 4_000_000
+
+
+def _padded_matrix(values, bounds, groups):
+    """Ряды групп, выровненные по левому краю в матрицу (хвост - NaN), и их длины"""
+    lengths = bounds[groups + 1] - bounds[groups]
+    matrix = np.full((len(groups), lengths.max()), np.nan)
+    rows = np.repeat(np.arange(len(groups)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.repeat(bounds[groups], lengths) + cols
+    matrix[rows, cols] = values[positions]
+    return matrix, lengths
+
+
+def _trend_weights(period):
+    """Веса центрированного скользящего среднего тренда (2×period для четного period)"""
+    if period % 2 == 0:
+        return np.r_[0.5, np.ones(period - 1), 0.5] / period
+    return np.ones(period) / period
+
+
+def _strength_from_phase_means(phase_means, lengths, series_std, period):
+    """
+    std(сезонная компонента) / std(ряд) по средним остаткам фаз периода.
+
+    phase_means - матрица (группы × period) средних остатков по фазам (до центрирования).
+    """
+    phase_means = phase_means - phase_means.mean(axis=1, keepdims=True)
+
+    # std сезонной компоненты длины n: фаза i повторяется counts[i] раз
+    counts = lengths[:, None] // period + (np.arange(period)[None, :] < (lengths % period)[:, None])
+    seasonal_mean = (counts * phase_means).sum(axis=1) / lengths
+    seasonal_var = (counts * (phase_means - seasonal_mean[:, None]) ** 2).sum(axis=1) / (lengths - 1)
+
+    return np.sqrt(seasonal_var) / series_std
+
+
+def _seasonal_strength(matrix, lengths, period):
+    """
+    std(сезонная компонента) / std(ряд) для строк матрицы без пропусков.
+
+    Повторяет seasonal_decompose(model='additive'): тренд - центрированное
+    скользящее среднее 2×period (для четного period), сезонность - средние
+    остатков по фазам периода минус их общее среднее.
+    """
+    n_rows, width = matrix.shape
+    half = period // 2
+
+    # Центрированное скользящее среднее с весами [0.5, 1, ..., 1, 0.5] / period
+    padded = np.pad(matrix, ((0, 0), (half, half)), constant_values=np.nan)
+    trend = np.zeros_like(matrix)
+    for k, weight in enumerate(_trend_weights(period)):
+        trend += weight * padded[:, k:k + width]
+
+    # Средние остатков по фазам периода
+    n_cycles = -(-width // period)
+    detrended = np.pad(matrix - trend, ((0, 0), (0, n_cycles * period - width)), constant_values=np.nan)
+    phase_means = np.nanmean(detrended.reshape(n_rows, n_cycles, period), axis=1)
+
+    return _strength_from_phase_means(phase_means, lengths, np.nanstd(matrix, axis=1, ddof=1), period)
+
+
+def _ols_slope(matrix, lengths):
+    """Наклон OLS по номеру периода 0..n-1 (как stats.linregress), NaN при пропусках"""
+    t = np.arange(matrix.shape[1], dtype=np.float64)[None, :]
+    valid = t < lengths[:, None]
+    t_centered = np.where(valid, t - (lengths[:, None] - 1) / 2, 0.0)
+    x_mean = np.nanmean(matrix, axis=1, keepdims=True)
+    has_nan = np.isnan(np.where(valid, matrix, 0.0)).any(axis=1)
+    x_centered = np.where(valid, matrix - x_mean, 0.0)
+    slope = (t_centered * x_centered).sum(axis=1) / (t_centered ** 2).sum(axis=1)
+    return np.where(has_nan, np.nan, slope)
+
+
+def seasonal_strength_and_slope(values, bounds, period=12, min_periods=12):
+    """
+    Сезонность и тренд для всех групп сразу (векторное ядро).
+
+    Заменяет поочередный вызов seasonal_decompose и stats.linregress по группам:
+    группы выравниваются в матрицу (пачками близкой длины, чтобы не раздувать
+    выравнивание) и считаются одними операциями NumPy.
+
+    Parameters:
+    -----------
+    values : np.ndarray
+        Значения, отсортированные по группам (см. sorted_group_offsets)
+    bounds : np.ndarray
+        Границы групп
+    period : int
+        Длина сезонного цикла
+    min_periods : int
+        Метрики считаются для групп длиннее min_periods
+
+    Returns:
+    --------
+    tuple: (seasonality, trend) - массивы длины n_groups.
+        seasonality = std(сезонная компонента) / std(ряд); NaN, если в группе меньше
+        двух полных циклов или есть пропуски (seasonal_decompose там не определен).
+        trend = наклон OLS; NaN при пропусках.
+    """
+    n_groups = len(bounds) - 1
+    seasonality = np.full(n_groups, np.nan)
+    trend = np.full(n_groups, np.nan)
+
+    lengths = np.diff(bounds)
+    eligible = np.flatnonzero(lengths > min_periods)
+    # Пачки групп близкой длины
+    eligible = eligible[np.argsort(lengths[eligible], kind='stable')]
+
+    start = 0
+    while start < len(eligible):
+        # Расширяем пачку, пока матрица укладывается в лимит (длины возрастают)
+        stop = start + 1
+        while stop < len(eligible) and (stop - start + 1) * lengths[eligible[stop]] <= _KERNEL_MAX_CELLS:
+            stop += 1
+        groups = eligible[start:stop]
+        matrix, group_lengths = _padded_matrix(values, bounds, groups)
+
+        trend[groups] = _ols_slope(matrix, group_lengths)
+
+        decomposable = (group_lengths >= 2 * period) & ~np.isnan(
+            np.where(np.arange(matrix.shape[1])[None, :] < group_lengths[:, None], matrix, 0.0)).any(axis=1)
+        if decomposable.any():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                seasonality[groups[decomposable]] = _seasonal_strength(
+                    matrix[decomposable], group_lengths[decomposable], period
+                )
+        start = stop
+
+    return seasonality, trend
+
+
+def compute_historical_metrics(df, date_column, branch_column, material_column, start_quantity_column,
+                               end_quantity_column, end_cost_column, interest_rate, consumption_column=None,
+                               lead_time_days=30, float_dtype=np.float32):
+    """
+    Числовые метрики по группам материал/филиал одной векторной агрегацией.
+
+    Ожидает уже нормализованное списание (см. analyze_historical_data).
+
+    Parameters:
+    -----------
+    float_dtype : numpy dtype, optional
+        Тип вещественных колонок результата (по умолчанию float32)
+
+    Returns:
+    --------
+    pd.DataFrame: 'Материал', 'Филиал' и колонки NUMERIC_METRIC_COLUMNS
+    """
+    order, bounds, keys = sorted_group_offsets(df, [material_column, branch_column], date_column)
+    has_consumption = bool(consumption_column) and consumption_column in df.columns
+
+    if len(keys) == 0:
+        return pd.DataFrame(columns=['Материал', 'Филиал'] + NUMERIC_METRIC_COLUMNS)
+
+    def column(name):
+        return df[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+
+    starts_idx = bounds[:-1]
+    ends_idx = bounds[1:] - 1
+    lengths = np.diff(bounds)
+    group_ids = np.repeat(np.arange(len(lengths)), lengths)
+
+    start_values = column(start_quantity_column)
+    end_values = column(end_quantity_column)
+    cost_values = column(end_cost_column)
+
+    # Период наблюдений в месяцах: NaT отсортированы в конец группы
+    dates = pd.to_datetime(df[date_column]).to_numpy().astype('datetime64[ns]')[order]
+    date_counts = np.add.reduceat((~np.isnat(dates)).astype(np.int64), starts_idx)
+    last_valid = starts_idx + np.maximum(date_counts, 1) - 1
+    span = (dates[last_valid] - dates[starts_idx]) // np.timedelta64(1, 'D')
+    months = np.where(date_counts > 0, span.astype(np.float64), np.nan) / 30.44
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        start_quantity = start_values[starts_idx]
+        end_quantity = end_values[ends_idx]
+
+        if has_consumption:
+            usage = column(consumption_column)
+            average_usage, usage_std = _group_nanmean_std(usage, starts_idx, group_ids)
+            total_usage = _group_nansum(usage, starts_idx)
+            no_movement = np.add.reduceat((usage == 0).astype(np.int64), starts_idx)
+        else:
+            differences = start_values - end_values
+            average_usage, usage_std = _group_nanmean_std(differences, starts_idx, group_ids)
+            average_usage, usage_std = np.abs(average_usage), np.abs(usage_std)
+            total_usage = np.abs(_group_nansum(differences, starts_idx))
+            no_movement = np.add.reduceat((start_values == end_values).astype(np.int64), starts_idx)
+
+        inventory_mean, _ = _group_nanmean_std(start_values + end_values, starts_idx, group_ids)
+        seasonality, trend = seasonal_strength_and_slope(end_values, bounds)
+
+        deficit_mask = end_values < 0
+        deficit_periods = np.add.reduceat(deficit_mask.astype(np.int64), starts_idx)
+        unsatisfied = np.abs(np.add.reduceat(np.where(deficit_mask, end_values, 0.0), starts_idx))
+
+    return derive_historical_metrics(
+        keys, lengths, months, start_quantity, end_quantity, cost_values[ends_idx], average_usage, usage_std,
+        total_usage, no_movement, inventory_mean, seasonality, trend, deficit_periods, unsatisfied,
+        has_consumption, interest_rate, lead_time_days, float_dtype
+    )
+
+
+def excess_holding_value(end_quantity, average_usage, end_cost):
+    """
+    Стоимость запаса сверх двух средних списаний - база упущенной выгоды без ставки.
+
+    Не зависит от параметров анализа, поэтому пересчет упущенной выгоды
+    при другой ставке - одно умножение (lost_profit_from_value).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        abs_usage = np.abs(average_usage)
+        unit_cost = np.where(end_quantity != 0, end_cost / end_quantity, 0.0)
+        return np.where(end_quantity > 2 * abs_usage, (end_quantity - 2 * abs_usage) * unit_cost, 0.0)
+
+
+def lost_profit_from_value(holding_value, interest_rate):
+    """
+    Упущенная выгода по стоимости излишков и ставке (%).
+
+    interest_rate может быть массивом формы (k, 1) - тогда результат (k, число групп).
+    """
+    return holding_value * np.asarray(interest_rate, dtype=np.float64) / 100
+
+
+def reorder_point_values(average_usage, usage_std, lead_time_days):
+    """
+    Точка заказа: дневное списание * срок поставки + страховой запас (z=1.65).
+
+    lead_time_days может быть массивом формы (k, 1) - тогда результат (k, число групп).
+    """
+    lead_time_days = np.asarray(lead_time_days, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        daily_usage = np.abs(average_usage) * 12 / 365
+        daily_std = usage_std / np.sqrt(30)
+        return daily_usage * lead_time_days + 1.65 * daily_std * np.sqrt(lead_time_days)
+
+
+def derive_historical_metrics(keys, lengths, months, start_quantity, end_quantity, end_cost, average_usage,
+                              usage_std, total_usage, no_movement, inventory_mean, seasonality, trend,
+                              deficit_periods, unsatisfied, has_consumption, interest_rate, lead_time_days=30,
+                              float_dtype=np.float32):
+    """
+    Метрики compute_historical_metrics из агрегатов по группам.
+
+    Общая часть полного расчета и инкрементального (historical_incremental):
+    все показатели выводятся из одних и тех же агрегатов одними формулами.
+
+    Parameters:
+    -----------
+    keys : list of tuple
+        Ключи групп (материал, филиал)
+    lengths, months : np.ndarray
+        Число строк группы и период наблюдений в месяцах
+    start_quantity, end_quantity, end_cost : np.ndarray
+        Начальный запас первой строки, конечный запас и стоимость последней строки
+    average_usage, usage_std, total_usage : np.ndarray
+        Среднее, стандартное отклонение (ddof=1) и сумма списания
+        (без колонки списания - уже по модулю, см. compute_historical_metrics)
+    no_movement, deficit_periods : np.ndarray
+        Число периодов без движения и с отрицательным конечным запасом
+    inventory_mean : np.ndarray
+        Среднее (начальный + конечный запас)
+    seasonality, trend : np.ndarray
+        Сила сезонности и наклон тренда конечного запаса
+    unsatisfied : np.ndarray
+        Модуль суммы отрицательных конечных запасов
+    has_consumption : bool
+        Списание задано колонкой (влияет на Fill Rate)
+
+    Returns:
+    --------
+    pd.DataFrame: 'Материал', 'Филиал' и колонки NUMERIC_METRIC_COLUMNS
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(start_quantity != 0, end_quantity / start_quantity, np.inf)
+
+        average_inventory = np.abs(inventory_mean / 2)
+        turnover = np.where(average_inventory > 0, np.abs(total_usage) / average_inventory, np.nan)
+        days_of_inventory = np.where(turnover > 0, 365 / turnover, np.nan)
+
+        abs_usage = np.abs(average_usage)
+        excess_inventory = end_quantity > 2 * abs_usage
+        coefficient_variation = np.where(average_usage != 0, usage_std / abs_usage, np.nan)
+
+        lost_profit = lost_profit_from_value(excess_holding_value(end_quantity, average_usage, end_cost),
+                                             interest_rate)
+
+        recommended_stock = abs_usage * 2
+        recommended_stock = np.where(seasonality > 0.5, recommended_stock * 1.2, recommended_stock)
+        recommended_stock = np.where(trend > 0, recommended_stock * 1.1, recommended_stock)
+
+        reorder_point = reorder_point_values(average_usage, usage_std, lead_time_days)
+
+        deficit_percentage = deficit_periods / lengths * 100
+
+        if has_consumption:
+            fill_rate = np.where(total_usage > 0, (total_usage - unsatisfied) / total_usage * 100, 100.0)
+        else:
+            fill_rate = 100 - deficit_percentage
+
+        dead_stock = no_movement / lengths * 100 > 50
+
+    abc_class = np.select([abs_usage > 100, abs_usage > 50], ['A', 'B'], 'C')
+    xyz_class = np.select([coefficient_variation < 0.1, coefficient_variation < 0.3], ['X', 'Y'], 'Z')
+
+    def as_float(values):
+        return np.asarray(values, dtype=float_dtype)
+
+    materials, branches = zip(*keys)
+    return pd.DataFrame({
+        'Материал': list(materials),
+        'Филиал': list(branches),
+        'periods': np.asarray(lengths).astype(np.int32),
+        'months': as_float(months),
+        'start_quantity': as_float(start_quantity),
+        'end_quantity': as_float(end_quantity),
+        'growth': as_float(growth),
+        'average_usage': as_float(average_usage),
+        'total_usage': as_float(total_usage),
+        'usage_std': as_float(usage_std),
+        'average_inventory': as_float(average_inventory),
+        'turnover': as_float(turnover),
+        'days_of_inventory': as_float(days_of_inventory),
+        'seasonality': as_float(seasonality),
+        'trend': as_float(trend),
+        'excess_inventory': excess_inventory,
+        'abc_class': pd.Categorical(abc_class, categories=['A', 'B', 'C']),
+        'xyz_class': pd.Categorical(xyz_class, categories=['X', 'Y', 'Z']),
+        'coefficient_variation': as_float(coefficient_variation),
+        'recommended_stock': as_float(recommended_stock),
+        'reorder_point': as_float(reorder_point),
+        'lost_profit': as_float(lost_profit),
+        'deficit_periods': np.asarray(deficit_periods).astype(np.int32),
+        'deficit_percentage': as_float(deficit_percentage),
+        'fill_rate': as_float(fill_rate),
+        'no_movement_periods': np.asarray(no_movement).astype(np.int32),
+        'dead_stock': dead_stock,
+    })
+
+
+# ============================================================================
+# ЛЕНИВЫЙ СЛОЙ ПРЕДСТАВЛЕНИЯ
+# ============================================================================
+
+def _format_turnover(total_usage, average_inventory, turnover):
+    if average_inventory > 0:
+        return f'{turnover:.2f}'
+    elif total_usage == 0 and average_inventory == 0:
+        return 'Нет движения'
+    elif total_usage == 0:
+        return 'Нет использования'
+    elif average_inventory == 0:
+        return 'Нет запаса'
+    return 'Ошибка в данных'
+
+
+def _format_days(turnover_str):
+    try:
+        turnover_val = float(turnover_str)
+    except ValueError:
+        return 'Н/Д'
+    days_of_inventory = 365 / turnover_val if turnover_val > 0 else np.inf
+    return f'{days_of_inventory:.0f} дней' if days_of_inventory != np.inf else 'Н/Д'
+
+
+def _format_optional(value):
+    return f'{value:.2f}' if not np.isnan(value) else 'Н/Д'
+
+
+def _format_row(row):
+    turnover_str = _format_turnover(row.total_usage, row.average_inventory, row.turnover)
+    return {
+        'Материал': row.Материал,
+        'Филиал': row.Филиал,
+        'Рост за период': f'{row.growth:.2f} раз за {row.months:.1f} месяцев',
+        'Среднее списание': f'{row.average_usage:.0f} единиц в месяц',
+        'Оборачиваемость': turnover_str,
+        'Оборачиваемость (дни)': _format_days(turnover_str),
+        'Сезонность': _format_optional(row.seasonality),
+        'Тренд': _format_optional(row.trend),
+        'Признаки накопления излишков': 'Да' if row.excess_inventory else 'Нет',
+        'ABC-класс': row.abc_class,
+        'XYZ-класс': row.xyz_class,
+        'Коэффициент вариации спроса': _format_optional(row.coefficient_variation),
+        'Рекомендуемый уровень запаса': f'{row.recommended_stock:.0f} единиц',
+        'Точка заказа (ROP)': f'{row.reorder_point:.0f} единиц',
+        'Упущенная выгода': f'{row.lost_profit:.2f} руб.',
+        'Периоды с дефицитом': f'{row.deficit_periods} из {row.periods} ({row.deficit_percentage:.1f}%)',
+        'Fill Rate': f'{row.fill_rate:.1f}%',
+        'Мертвый запас': f"{'Да' if row.dead_stock else 'Нет'} ({row.no_movement_periods}/{row.periods})",
+    }
+
+
+def format_historical_metrics(metrics, rows=None):
+    """
+    Форматирует числовые метрики в строки в формате analyze_historical_data.
+
+    Parameters:
+    -----------
+    metrics : pd.DataFrame
+        Результат compute_historical_metrics
+    rows : slice or array-like, optional
+        Позиции строк для форматирования (по умолчанию - все)
+
+    Returns:
+    --------
+    pd.DataFrame: Строковое представление выбранных строк
+    """
+    subset = metrics if rows is None else metrics.iloc[rows]
+    formatted = [_format_row(row) for row in subset.itertuples(index=False)]
+    return pd.DataFrame(formatted, index=subset.index)
+
+
+class FormattedHistoricalView:
+    """
+    Ленивое строковое представление числовых метрик.
+
+    Хранит только числовой DataFrame и форматирует строки по запросу:
+    view.head(20), view[100:150], view.iter_chunks(10000) для выгрузки.
+    """
+
+    def __init__(self, metrics: pd.DataFrame):
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            return format_historical_metrics(self.metrics, [rows]).iloc[0]
+        return format_historical_metrics(self.metrics, rows)
+
+    def head(self, n=5):
+        """Первые n строк в строковом виде"""
+        return self[:n]
+
+    def iter_chunks(self, chunk_size=10000):
+        """Генератор строковых блоков по chunk_size строк"""
+        for start in range(0, len(self.metrics), chunk_size):
+            yield self[start:start + chunk_size]
+
+    def to_frame(self):
+        """Полное строковое представление (эквивалент analyze_historical_data)"""
+        return format_historical_metrics(self.metrics)
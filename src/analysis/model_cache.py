@@ -0,0 +1,162 @@
+"""
+Дисковый кэш подобранных моделей прогнозирования.
+
+Хранит подобранные параметры Holt-Winters/SARIMA и результаты автоматического
+выбора модели. Ключ - хэш значений ряда, имени модели, seasonal_periods и
+параметров модели, поэтому при ежемесячном перезапуске заново подбираются
+только ряды, история которых изменилась.
+
+Каждая запись - отдельный JSON-файл в каталоге кэша. Размер каталога
+ограничен max_bytes: при превышении удаляются давно не использованные
+записи (LRU по времени последнего обращения к файлу).
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _to_json(value):
+    """numpy-типы и кортежи -> JSON-совместимые значения"""
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _from_json(value):
+    """Списки -> кортежи (конфигурации моделей сравниваются как кортежи)"""
+    if isinstance(value, dict):
+        return {k: _from_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return tuple(_from_json(v) for v in value)
+    return value
+
+
+class ModelCache:
+    """
+    LRU-кэш подобранных моделей в каталоге на диске.
+
+    Объект можно передавать в процессы-воркеры: состояние - только путь
+    и индекс размеров файлов, запись выполняется атомарно (через os.replace).
+
+    Parameters:
+    -----------
+    cache_dir : str or Path
+        Каталог кэша (создается при необходимости)
+    max_bytes : int
+        Максимальный суммарный размер записей
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._sizes = self._scan()
+
+    @staticmethod
+    def make_key(series, model, seasonal_periods, **params):
+        """
+        Ключ записи: sha256 от значений ряда, модели, seasonal_periods и параметров.
+
+        Ряд приводится к float64, поэтому int/float представления одних данных
+        дают одинаковый ключ.
+        """
+        values = np.ascontiguousarray(np.asarray(series, dtype=np.float64))
+        digest = hashlib.sha256(values.tobytes())
+        spec = json.dumps([model, seasonal_periods, _to_json(params)], sort_keys=True)
+        digest.update(spec.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def _scan(self):
+        """Размеры записей по содержимому каталога"""
+        sizes = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.SUFFIX):
+                try:
+                    sizes[name[:-len(self.SUFFIX)]] = os.path.getsize(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return sizes
+
+    def get(self, key):
+        """Запись по ключу или None; обращение обновляет время использования"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+        return _from_json(entry)
+
+    def put(self, key, entry):
+        """Сохраняет запись (dict) и при переполнении вытесняет старые"""
+        data = json.dumps(_to_json(entry)).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._sizes[key] = len(data)
+        if sum(self._sizes.values()) > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер не станет <= max_bytes"""
+        # Другие процессы могли писать в тот же каталог - пересчитываем по диску
+        self._sizes = self._scan()
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(key):
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+            total -= self._sizes.pop(key)
+
+    def clear(self):
+        """Удаляет все записи"""
+        for key in list(self._scan()):
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+        self._sizes = {}
+
+    @property
+    def size_bytes(self):
+        return sum(self._sizes.values())
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
@@ -0,0 +1,383 @@
+"""
+Полный цикл анализа запасов без интерфейса.
+
+run_analysis выполняет те же шаги, что и desktop-приложение:
+1. загрузка исторических данных (через кэш get_dataset);
+2. автоопределение колонок (явные колонки конфигурации имеют приоритет);
+3. исторический анализ (числовые метрики и строки для отчета);
+4. прогноз спроса (автоматический) или загрузка прогноза из файла (ручной);
+5. прогноз начальных остатков, конечные остатки, рекомендации по закупкам;
+6. пояснения расчетов и кэш для режима «что если» (src.analysis.what_if).
+
+Долгие этапы (исторический анализ, прогноз спроса, прогноз начальных
+остатков) сообщают прогресс по группам со скоростью и оценкой оставшегося
+времени и прерываются по токену отмены (src.utils.progress).
+
+Используется рабочим потоком desktop-приложения и пакетным запуском
+из командной строки (src/cli/batch.py).
+
+Конфигурация (dict) - ключи как в desktop-приложении:
+    historical_file, forecast_mode ('auto' | 'manual'), forecast_file,
+    forecast_periods, forecast_model, n_jobs, model_cache_dir,
+    safety_stock_pct, interest_rate, lead_time_days,
+    date_col, branch_col, material_col, start_qty_col, end_qty_col,
+    end_cost_col, consumption_col, planned_demand_col
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.historical_analysis import analyze_historical_data, get_explanation as get_historical_explanation
+from src.analysis.historical_metrics import format_historical_metrics
+from src.analysis.forecast_analysis import (
+    analyze_forecast_data,
+    auto_forecast_demand,
+    forecast_start_balance,
+    calculate_purchase_recommendations,
+    summarize_forecast_metadata
+)
+from src.analysis.model_cache import ModelCache
+from src.analysis.what_if import (
+    END_BALANCE_COLUMN, PARAMETER_DEPENDENCIES, START_BALANCE_COLUMN, WhatIfCache, forecast_explanation
+)
+from src.utils.data_loading import get_dataset
+from src.utils.instrumentation import RunProfile
+from src.utils.progress import check_cancelled, format_duration
+from src.utils.utils import auto_detect_columns
+
+
+logger = logging.getLogger(__name__)
+
+# Колонки, которые можно задать в конфигурации вручную
+EXPLICIT_COLUMN_KEYS = (
+    'date_col', 'branch_col', 'material_col', 'start_qty_col',
+    'end_qty_col', 'end_cost_col', 'consumption_col'
+)
+
+DEMAND_COLUMN = 'Запланированная потребность'
+
+# Параметры исполнения, не влияющие на результат (не мешают пересчету «что если»)
+EXECUTION_KEYS = ('n_jobs',)
+
+# Этап -> (начальный процент, конечный процент, подпись, единица) для общего прогресса
+STAGE_PROGRESS = {
+    'historical': (30, 50, 'Анализ исторических данных', 'групп'),
+    'forecast': (50, 70, 'Прогноз спроса', 'рядов'),
+    'start_balance': (70, 85, 'Прогноз начальных остатков', 'рядов'),
+}
+
+
+def stage_message(info):
+    """Сообщение о ходе этапа: 'Прогноз спроса: 120 из 800 рядов, 35 рядов/с, осталось ~20 с'"""
+    _, _, label, unit = STAGE_PROGRESS[info['stage']]
+    message = f"{label}: {info['done']} из {info['total']} {unit}"
+    if info['rate_per_s']:
+        message += f", {info['rate_per_s']:.0f} {unit}/с"
+    if info['done'] < info['total'] and info['eta_s'] is not None:
+        message += f", осталось ~{format_duration(info['eta_s'])}"
+    return message
+
+
+def _stage_progress(progress):
+    """Callback ProgressTracker, переводящий прогресс этапа в общий процент progress(процент, сообщение)"""
+    if progress is None:
+        return None
+
+    def callback(info):
+        start, end, _, _ = STAGE_PROGRESS[info['stage']]
+        message = stage_message(info)
+        logger.debug(message)
+        progress(int(start + (end - start) * info['fraction']), message)
+    return callback
+
+
+def resolve_columns(df_hist, config):
+    """
+    Колонки исторических данных: из конфигурации, автоопределение или по позиции.
+
+    Returns:
+    --------
+    dict: date, branch, material, start_qty, end_qty, end_cost, consumption
+    """
+    detected = auto_detect_columns(df_hist)
+    logger.info(f"Обнаружено колонок: {detected}")
+    return {
+        'date': config.get('date_col') or detected.get('date') or df_hist.columns[0],
+        'branch': config.get('branch_col') or detected.get('branch'),
+        'material': config.get('material_col') or detected.get('material') or df_hist.columns[1],
+        'start_qty': config.get('start_qty_col') or detected.get('start_quantity') or df_hist.columns[3],
+        'end_qty': config.get('end_qty_col') or detected.get('end_quantity') or df_hist.columns[6],
+        'end_cost': config.get('end_cost_col') or detected.get('end_cost'),
+        'consumption': config.get('consumption_col') or detected.get('consumption'),
+    }
+
+
+def _open_model_cache(config):
+    if not config.get('model_cache_dir'):
+        return None
+    try:
+        model_cache = ModelCache(config['model_cache_dir'])
+        logger.info(f"Кэш моделей: {len(model_cache)} записей")
+        return model_cache
+    except OSError as e:
+        logger.warning(f"Кэш моделей недоступен: {e}")
+        return None
+
+
+def _auto_forecast(df_hist, columns, config, profile, results, stage_progress=None, cancel_token=None):
+    """Автоматический прогноз спроса; (таблица прогноза, колонка спроса)"""
+    forecast_model = config.get('forecast_model', 'auto')
+    logger.info(f"Прогноз: модель={forecast_model}, периодов={config.get('forecast_periods', 12)}, "
+                f"n_jobs={config.get('n_jobs', 1)}")
+
+    with profile.stage('forecast', rows=len(df_hist)) as stage:
+        forecast_df, forecast_metadata = auto_forecast_demand(
+            historical_df=df_hist,
+            forecast_periods=config.get('forecast_periods', 12),
+            date_column=columns['date'],
+            material_column=columns['material'],
+            branch_column=columns['branch'],
+            consumption_column=columns['consumption'],
+            forecast_model=forecast_model,
+            n_jobs=config.get('n_jobs', 1),
+            model_cache=_open_model_cache(config),
+            return_metadata=True,
+            progress=stage_progress,
+            cancel_token=cancel_token
+        )
+        stage.rows_out = len(forecast_df)
+
+    # Телеметрия подбора: ряды по моделям, fallback, время подбора
+    results['forecast_metadata'] = forecast_metadata
+    model_summary = summarize_forecast_metadata(forecast_metadata)
+    profile.count(f'series:{forecast_model}', model_summary['series'])
+    profile.count('fallbacks', model_summary['fallbacks'])
+    profile.update_counters(model_summary['used'], prefix='used:')
+    profile.update_counters(
+        {model: stats['fallbacks'] for model, stats in model_summary['by_model'].items()},
+        prefix='fallback:'
+    )
+    profile.set_info('forecast_models', model_summary)
+    logger.info(f"Модели: {model_summary['used']}, fallback: {model_summary['fallbacks']} "
+                f"из {model_summary['series']} рядов")
+    return forecast_df, DEMAND_COLUMN
+
+
+def _load_forecast(config, profile):
+    """Прогноз из файла (ручной режим); (таблица прогноза, колонка спроса)"""
+    with profile.stage('load_forecast') as stage:
+        df_forecast = get_dataset(config['forecast_file']).take()
+        stage.rows_out = len(df_forecast)
+    logger.info(f"✓ Прогнозные данные загружены: {df_forecast.shape[0]} строк, {df_forecast.shape[1]} колонок")
+
+    forecast_detected = auto_detect_columns(df_forecast)
+    logger.info(f"Обнаружено колонок в прогнозе: {forecast_detected}")
+    demand_col = (config.get('planned_demand_col') or forecast_detected.get('planned_demand')
+                  or df_forecast.columns[3])
+    logger.info(f"Колонка планового спроса: {demand_col}")
+    return df_forecast, demand_col
+
+
+def run_analysis(config, progress=None, profile=None, cancel_token=None):
+    """
+    Выполняет анализ по конфигурации.
+
+    Parameters:
+    -----------
+    config : dict
+        Конфигурация запуска (ключи - в описании модуля)
+    progress : callable, optional
+        progress(процент, сообщение) - ход выполнения; на долгих этапах - по группам,
+        со скоростью и оценкой оставшегося времени
+    profile : RunProfile, optional
+        Профиль запуска (по умолчанию создается новый); завершает его вызывающий код
+    cancel_token : CancellationToken, optional
+        Токен отмены: анализ прерывается исключением AnalysisCancelled
+
+    Returns:
+    --------
+    dict: historical (строки для отчета), historical_metrics (числа), forecast,
+          forecast_metadata (автоматический режим), historical_explanation,
+          forecast_explanation, branch_col, config, profile,
+          what_if (WhatIfCache - пересчет при других safety_stock_pct, interest_rate, lead_time_days)
+    """
+    def report(percent, message):
+        check_cancelled(cancel_token)
+        logger.info(message)
+        if progress is not None:
+            progress(percent, message)
+
+    stage_progress = _stage_progress(progress)
+
+    if profile is None:
+        profile = RunProfile('analysis', logger=logger)
+        profile.set_info('config', config)
+    results = {'profile': profile}
+
+    # Шаг 1: Исторический анализ
+    report(10, "Загрузка исторических данных...")
+    logger.info(f"Файл: {config['historical_file']}")
+    # Если колонки заданы вручную, читаем все колонки; иначе - только найденные автоопределением
+    explicit_columns = any(config.get(key) for key in EXPLICIT_COLUMN_KEYS)
+    with profile.stage('load') as stage:
+        # Файл уже прочитан при валидации - забираем таблицу из кэша без копии
+        # (перечитывается, только если изменился); после анализа кэш ее не держит
+        df_hist = get_dataset(config['historical_file']).take(columns=None if explicit_columns else 'auto')
+        stage.rows_out = len(df_hist)
+    logger.info(f"✓ Данные загружены: {df_hist.shape[0]} строк, {df_hist.shape[1]} колонок")
+
+    report(30, "Анализ исторических данных...")
+    with profile.stage('detect'):
+        columns = resolve_columns(df_hist, config)
+    logger.info(f"Колонки анализа: {columns}")
+
+    with profile.stage('historical', rows=len(df_hist)) as stage:
+        # Числовые метрики (для выгрузки в Parquet/CSV) и строки для отчета из них;
+        # с float64 строки совпадают со строковым режимом analyze_historical_data
+        hist_metrics, _ = analyze_historical_data(
+            df=df_hist,
+            date_column=columns['date'],
+            branch_column=columns['branch'],
+            material_column=columns['material'],
+            start_quantity_column=columns['start_qty'],
+            end_quantity_column=columns['end_qty'],
+            end_cost_column=columns['end_cost'],
+            interest_rate=config.get('interest_rate', 0.05),
+            consumption_column=columns['consumption'],
+            lead_time_days=config.get('lead_time_days', 30),
+            output='numeric',
+            float_dtype=np.float64,
+            progress=stage_progress,
+            cancel_token=cancel_token
+        )
+        hist_results = format_historical_metrics(hist_metrics)
+        stage.rows_out = len(hist_results)
+    logger.info(f"✓ Исторический анализ: {len(hist_results)} строк")
+
+    results['historical'] = hist_results
+    results['historical_metrics'] = hist_metrics
+    results['branch_col'] = columns['branch']
+    results['historical_explanation'] = get_historical_explanation(hist_results.iloc[0])
+
+    # Шаг 2: Прогнозный анализ
+    forecast_mode = config.get('forecast_mode')
+    if forecast_mode == 'auto':
+        report(50, "Генерация автоматического прогноза...")
+        forecast_df, demand_col = _auto_forecast(df_hist, columns, config, profile, results,
+                                                 stage_progress, cancel_token)
+    else:
+        report(50, "Загрузка прогнозных данных...")
+        forecast_df, demand_col = _load_forecast(config, profile)
+
+    report(70, "Прогноз начальных остатков...")
+    with profile.stage('start_balance', rows=len(forecast_df)):
+        forecast_df[START_BALANCE_COLUMN] = forecast_start_balance(
+            df_hist,
+            forecast_df,
+            columns['date'],
+            columns['material'],
+            columns['branch'],
+            columns['end_qty'],
+            columns['date'],  # forecast_date_column
+            columns['material'],  # forecast_material_column
+            columns['branch'],  # forecast_branch_column
+            forecast_model='naive',
+            seasonal_periods=12,
+            progress=stage_progress,
+            cancel_token=cancel_token
+        )
+
+    # Расчет конечных остатков
+    forecast_df[END_BALANCE_COLUMN] = forecast_df[START_BALANCE_COLUMN] - forecast_df[demand_col]
+
+    report(85, "Расчет рекомендаций по закупкам...")
+    with profile.stage('recommendations', rows=len(forecast_df)):
+        recommendations_df = calculate_purchase_recommendations(
+            forecast_df,
+            END_BALANCE_COLUMN,
+            demand_col,
+            config.get('safety_stock_pct', 0.20),
+            group_columns=[columns['material'], columns['branch']],
+            date_column=columns['date']
+        )
+    forecast_df = pd.concat([forecast_df, recommendations_df], axis=1)
+
+    forecast_results, _ = analyze_forecast_data(
+        forecast_df,
+        columns['date'],
+        columns['material'],
+        columns['branch'],
+        demand_col,
+        START_BALANCE_COLUMN,
+        END_BALANCE_COLUMN,
+        'Рекомендация по закупке',
+        'Будущий спрос',
+        'Страховой запас'
+    )
+    results['forecast'] = forecast_results
+    logger.info(f"✓ Прогноз и закупки: {len(forecast_results)} строк")
+
+    results['forecast_explanation'] = forecast_explanation(forecast_results, columns, demand_col, config)
+
+    # Кэш для пересчета при изменении параметров без повторной загрузки и прогноза
+    with profile.stage('what_if_cache'):
+        results['what_if'] = WhatIfCache.from_history(
+            df_hist, config, columns, demand_col, hist_metrics, forecast_df, forecast_results
+        )
+    results['config'] = dict(config)
+    results['source_mtimes'] = _source_mtimes(config)
+
+    report(100, "Анализ завершен!")
+    return results
+
+
+def _source_mtimes(config):
+    """Время изменения входных файлов (для проверки, что кэш «что если» актуален)"""
+    paths = [config.get('historical_file'), config.get('forecast_file')]
+    return {path: os.path.getmtime(path) for path in paths if path and os.path.exists(path)}
+
+
+def apply_parameters(results, config, profile=None):
+    """
+    Пересчет результатов для новых safety_stock_pct, interest_rate, lead_time_days.
+
+    Если кроме этих параметров в конфигурации ничего не изменилось и входные
+    файлы те же, загрузка, исторические агрегаты и прогноз берутся из кэша
+    результатов (WhatIfCache), а пересчитываются только зависящие колонки.
+
+    Parameters:
+    -----------
+    results : dict
+        Предыдущий результат run_analysis (или apply_parameters)
+    config : dict
+        Новая конфигурация
+    profile : RunProfile, optional
+        Профиль пересчета (по умолчанию создается новый и завершается)
+
+    Returns:
+    --------
+    dict or None: новые результаты; None - нужен полный запуск run_analysis
+    """
+    what_if = results.get('what_if') if results else None
+    if what_if is None:
+        return None
+    previous = results.get('config', {})
+    keys = (set(previous) | set(config)) - set(PARAMETER_DEPENDENCIES) - set(EXECUTION_KEYS)
+    if any(previous.get(key) != config.get(key) for key in keys):
+        return None
+    if results.get('source_mtimes') != _source_mtimes(config):
+        return None
+
+    own_profile = profile is None
+    if own_profile:
+        profile = RunProfile('what_if', logger=logger)
+        profile.set_info('config', config)
+    with profile.stage('what_if'):
+        updated = what_if.apply(results, **{key: config.get(key) for key in PARAMETER_DEPENDENCIES})
+    if own_profile:
+        profile.finish()
+    updated['profile'] = profile
+    logger.info(f"Пересчет «что если»: {updated['what_if_changed'] or 'без изменений'}")
+    return updated
@@ -0,0 +1,315 @@
+"""
+Режим «что если»: пересчет только результатов, зависящих от параметров.
+
+Этапы анализа (src.analysis.pipeline) и их зависимость от параметров:
+
+    загрузка -> исторические агрегаты -> метрики ------------------ interest_rate, lead_time_days
+             -> прогноз спроса -> остатки -> будущий спрос -> рекомендации -- safety_stock_pct
+
+Загрузка, агрегаты по группам и прогноз (подбор моделей statsmodels) от
+параметров не зависят и берутся из кэша (WhatIfCache). При изменении
+параметров пересчитываются только колонки из PARAMETER_DEPENDENCIES:
+- interest_rate -> упущенная выгода (стоимость излишков * ставка);
+- lead_time_days -> точка заказа (ROP);
+- safety_stock_pct -> страховой запас и рекомендация по закупке.
+
+sweep / sweep_arrays считают сетку значений параметров одним вызовом:
+значения параметра - ось массива, расчет - broadcasting numpy.
+"""
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.historical_analysis import get_explanation as get_historical_explanation
+from src.analysis.historical_metrics import (
+    excess_holding_value, format_historical_metrics, lost_profit_from_value, reorder_point_values,
+    sorted_group_offsets
+)
+from src.analysis.forecast_analysis import get_explanation as get_forecast_explanation
+
+
+# Параметр -> колонки результатов, которые от него зависят
+PARAMETER_DEPENDENCIES = {
+    'interest_rate': ('lost_profit',),
+    'lead_time_days': ('reorder_point',),
+    'safety_stock_pct': ('Страховой запас', 'Рекомендация по закупке'),
+}
+
+# Значения по умолчанию - как в desktop-приложении
+DEFAULT_PARAMETERS = {'safety_stock_pct': 0.20, 'interest_rate': 0.05, 'lead_time_days': 30}
+
+# Предел элементов матрицы рекомендаций в одном блоке сетки safety_stock_pct
+SWEEP_BLOCK_ELEMENTS = 4_000_000
+
+RECOMMENDATION_COLUMN = 'Рекомендация по закупке'
+FUTURE_DEMAND_COLUMN = 'Будущий спрос'
+SAFETY_STOCK_COLUMN = 'Страховой запас'
+START_BALANCE_COLUMN = 'Прогноз остатка на начало'
+END_BALANCE_COLUMN = 'Прогноз остатка на конец'
+
+
+def group_end_values(df, date_column, branch_column, material_column, value_column):
+    """
+    Значение колонки в последней по дате строке каждой группы материал/филиал.
+
+    Группы - в порядке compute_historical_metrics (по возрастанию ключей).
+
+    Returns:
+    --------
+    np.ndarray: значения по группам (float64)
+    """
+    frame = df[[material_column, branch_column, date_column, value_column]].copy(deep=False)
+    frame[date_column] = pd.to_datetime(frame[date_column])
+    order, bounds, _ = sorted_group_offsets(frame, [material_column, branch_column], date_column)
+    values = frame[value_column].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+    return values[bounds[1:] - 1]
+
+
+def forecast_explanation(forecast_results, columns, demand_column, config):
+    """Пояснение расчетов прогноза по первой строке (как в desktop-приложении)"""
+    forecast_mode = config.get('forecast_mode')
+    return get_forecast_explanation(
+        forecast_results.iloc[0],
+        columns['date'],
+        columns['material'],
+        columns['branch'],
+        demand_column,
+        START_BALANCE_COLUMN,
+        END_BALANCE_COLUMN,
+        RECOMMENDATION_COLUMN,
+        FUTURE_DEMAND_COLUMN,
+        SAFETY_STOCK_COLUMN,
+        forecast_mode=forecast_mode,
+        forecast_model=config.get('forecast_model', 'auto') if forecast_mode == 'auto' else None,
+        forecast_periods=config.get('forecast_periods', 12) if forecast_mode == 'auto' else None
+    )
+
+
+def _as_grid(values):
+    """Сетка значений параметра: одномерный float64-массив"""
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))
+
+
+class WhatIfCache:
+    """
+    Кэш независимых от параметров результатов одного анализа.
+
+    Parameters:
+    -----------
+    config : dict
+        Конфигурация запуска (src.analysis.pipeline)
+    columns : dict
+        Колонки исторических данных (pipeline.resolve_columns)
+    demand_column : str
+        Колонка спроса в таблице прогноза
+    historical_metrics : pd.DataFrame
+        Числовые метрики (compute_historical_metrics)
+    holding_value : np.ndarray
+        Стоимость излишков по группам (excess_holding_value) в порядке historical_metrics
+    forecast_base : pd.DataFrame
+        Таблица прогноза до округления (с остатками и будущим спросом)
+    forecast_results : pd.DataFrame
+        Таблица прогноза для отчета (analyze_forecast_data)
+    """
+
+    def __init__(self, config, columns, demand_column, historical_metrics, holding_value, forecast_base,
+                 forecast_results):
+        self.config = dict(config)
+        self.columns = dict(columns)
+        self.demand_column = demand_column
+        self.historical_metrics = historical_metrics
+        self.holding_value = np.asarray(holding_value, dtype=np.float64)
+        self.demand = forecast_base[demand_column].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.end_balance = forecast_base[END_BALANCE_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.future_demand = forecast_base[FUTURE_DEMAND_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+        # Позиции строк отчета в forecast_base (отчет отсортирован по дате, материалу, филиалу)
+        self.report_positions = forecast_base.index.get_indexer(forecast_results.index)
+
+    @classmethod
+    def from_history(cls, df_hist, config, columns, demand_column, historical_metrics, forecast_base,
+                     forecast_results):
+        """Кэш по исходной истории: стоимость излишков считается по последней строке каждой группы"""
+        end_cost = group_end_values(df_hist, columns['date'], columns['branch'], columns['material'],
+                                    columns['end_cost'])
+        holding_value = excess_holding_value(
+            historical_metrics['end_quantity'].to_numpy(dtype=np.float64),
+            historical_metrics['average_usage'].to_numpy(dtype=np.float64),
+            end_cost
+        )
+        return cls(config, columns, demand_column, historical_metrics, holding_value, forecast_base,
+                   forecast_results)
+
+    def parameters(self, **overrides):
+        """Параметры конфигурации с заменой переданных (None - без замены)"""
+        parameters = {key: self.config.get(key, default) for key, default in DEFAULT_PARAMETERS.items()}
+        parameters.update({key: value for key, value in overrides.items() if value is not None})
+        return parameters
+
+    # ------------------------------------------------------------------
+    # Зависящие от параметров этапы
+    # ------------------------------------------------------------------
+
+    def lost_profit(self, interest_rate):
+        return lost_profit_from_value(self.holding_value, interest_rate)
+
+    def reorder_point(self, lead_time_days):
+        return reorder_point_values(
+            self.historical_metrics['average_usage'].to_numpy(dtype=np.float64),
+            self.historical_metrics['usage_std'].to_numpy(dtype=np.float64),
+            lead_time_days
+        )
+
+    def recommendations(self, safety_stock_pct):
+        """
+        (страховой запас, рекомендация) в порядке строк forecast_base.
+
+        safety_stock_pct может быть массивом формы (k, 1) - тогда результат (k, число строк).
+        """
+        safety_stock = self.demand * np.asarray(safety_stock_pct, dtype=np.float64)
+        return safety_stock, np.maximum(0, self.future_demand + safety_stock - self.end_balance)
+
+    # ------------------------------------------------------------------
+    # Пересчет результатов
+    # ------------------------------------------------------------------
+
+    def apply(self, results, safety_stock_pct=None, interest_rate=None, lead_time_days=None):
+        """
+        Результаты анализа для новых значений параметров.
+
+        Пересчитываются только колонки из PARAMETER_DEPENDENCIES для изменившихся
+        параметров; остальные таблицы и колонки переиспользуются.
+
+        Parameters:
+        -----------
+        results : dict
+            Результат run_analysis (или предыдущего apply)
+        safety_stock_pct, interest_rate, lead_time_days : float, optional
+            Новые значения (None - как в results)
+
+        Returns:
+        --------
+        dict: новый словарь результатов (исходный не изменяется); 'what_if_changed' -
+              список изменившихся параметров
+        """
+        current = {key: results.get('config', self.config).get(key, default)
+                   for key, default in DEFAULT_PARAMETERS.items()}
+        requested = {'safety_stock_pct': safety_stock_pct, 'interest_rate': interest_rate,
+                     'lead_time_days': lead_time_days}
+        changed = [key for key, value in requested.items() if value is not None and value != current[key]]
+        updated = dict(results)
+        updated['config'] = {**results.get('config', self.config),
+                             **{key: requested[key] for key in changed}}
+        updated['what_if_changed'] = changed
+
+        historical_changes = {}
+        if 'interest_rate' in changed:
+            historical_changes['lost_profit'] = self.lost_profit(interest_rate)
+        if 'lead_time_days' in changed:
+            historical_changes['reorder_point'] = self.reorder_point(lead_time_days)
+        if historical_changes:
+            metrics = results['historical_metrics'].copy(deep=False)
+            for column, values in historical_changes.items():
+                metrics[column] = values.astype(metrics[column].dtype)
+            historical = results['historical'].copy(deep=False)
+            if 'lost_profit' in historical_changes:
+                historical['Упущенная выгода'] = [f'{value:.2f} руб.' for value in metrics['lost_profit'].tolist()]
+            if 'reorder_point' in historical_changes:
+                historical['Точка заказа (ROP)'] = [f'{value:.0f} единиц'
+                                                    for value in metrics['reorder_point'].tolist()]
+            updated['historical_metrics'] = metrics
+            updated['historical'] = historical
+            updated['historical_explanation'] = get_historical_explanation(
+                format_historical_metrics(metrics, [0]).iloc[0]
+            )
+
+        if 'safety_stock_pct' in changed:
+            safety_stock, recommendation = self.recommendations(safety_stock_pct)
+            forecast = results['forecast'].copy(deep=False)
+            forecast[SAFETY_STOCK_COLUMN] = np.round(safety_stock[self.report_positions], 1)
+            forecast[RECOMMENDATION_COLUMN] = np.round(recommendation[self.report_positions], 1)
+            updated['forecast'] = forecast
+            updated['forecast_explanation'] = forecast_explanation(
+                forecast, self.columns, self.demand_column, updated['config']
+            )
+        return updated
+
+    def sweep_arrays(self, safety_stock_pct=None, interest_rate=None, lead_time_days=None):
+        """
+        Зависящие от параметров значения по сетке, по строкам и группам.
+
+        Каждый параметр - одномерная сетка значений (None - текущее значение).
+
+        Returns:
+        --------
+        dict:
+            'lost_profit' - (len(interest_rate), групп),
+            'reorder_point' - (len(lead_time_days), групп),
+            'safety_stock', 'recommendation' - (len(safety_stock_pct), строк прогноза)
+            и сами сетки под именами параметров
+        """
+        parameters = self.parameters()
+        grids = {
+            'safety_stock_pct': _as_grid(parameters['safety_stock_pct'] if safety_stock_pct is None
+                                         else safety_stock_pct),
+            'interest_rate': _as_grid(parameters['interest_rate'] if interest_rate is None else interest_rate),
+            'lead_time_days': _as_grid(parameters['lead_time_days'] if lead_time_days is None else lead_time_days),
+        }
+        safety_stock, recommendation = self.recommendations(grids['safety_stock_pct'][:, None])
+        return {
+            **grids,
+            'lost_profit': self.lost_profit(grids['interest_rate'][:, None]),
+            'reorder_point': self.reorder_point(grids['lead_time_days'][:, None]),
+            'safety_stock': safety_stock,
+            'recommendation': recommendation,
+        }
+
+    def sweep(self, safety_stock_pct=None, interest_rate=None, lead_time_days=None):
+        """
+        Итоги по сетке значений параметров одним вызовом.
+
+        Каждая комбинация значений - строка результата. Параметры влияют на
+        разные колонки, поэтому итоги считаются по каждой сетке отдельно
+        (матрица значения x группа/строка, блоками не больше SWEEP_BLOCK_ELEMENTS)
+        и затем объединяются в декартово произведение.
+
+        Parameters:
+        -----------
+        safety_stock_pct, interest_rate, lead_time_days : float or array-like, optional
+            Значения параметров (None - текущее значение)
+
+        Returns:
+        --------
+        pd.DataFrame: параметры и итоги - 'Упущенная выгода', 'Точка заказа (сумма)',
+        'Страховой запас', 'Объем закупок', 'Строк с закупкой'
+        """
+        parameters = self.parameters()
+        rates = _as_grid(parameters['interest_rate'] if interest_rate is None else interest_rate)
+        leads = _as_grid(parameters['lead_time_days'] if lead_time_days is None else lead_time_days)
+        pcts = _as_grid(parameters['safety_stock_pct'] if safety_stock_pct is None else safety_stock_pct)
+
+        lost_profit = np.nansum(self.lost_profit(rates[:, None]), axis=1)
+        reorder_point = np.nansum(self.reorder_point(leads[:, None]), axis=1)
+
+        n_rows = max(len(self.demand), 1)
+        block = max(1, SWEEP_BLOCK_ELEMENTS // n_rows)
+        safety_totals, purchase_totals, purchase_rows = [], [], []
+        for start in range(0, len(pcts), block):
+            safety_stock, recommendation = self.recommendations(pcts[start:start + block, None])
+            safety_totals.append(np.nansum(safety_stock, axis=1))
+            purchase_totals.append(np.nansum(recommendation, axis=1))
+            purchase_rows.append((recommendation > 0).sum(axis=1))
+
+        grid = np.array(list(product(range(len(pcts)), range(len(rates)), range(len(leads)))),
+                        dtype=np.int64).reshape(-1, 3)
+        pct_idx, rate_idx, lead_idx = grid[:, 0], grid[:, 1], grid[:, 2]
+        return pd.DataFrame({
+            'safety_stock_pct': pcts[pct_idx],
+            'interest_rate': rates[rate_idx],
+            'lead_time_days': leads[lead_idx],
+            'Упущенная выгода': lost_profit[rate_idx],
+            'Точка заказа (сумма)': reorder_point[lead_idx],
+            'Страховой запас': np.concatenate(safety_totals)[pct_idx],
+            'Объем закупок': np.concatenate(purchase_totals)[pct_idx],
+            'Строк с закупкой': np.concatenate(purchase_rows)[pct_idx],
+        })
@@ -0,0 +1,317 @@
+"""
+Пакетный анализ файлов без интерфейса (для запуска по расписанию).
+
+Каждый файл исторических данных в каталоге (например, выгрузка одного
+филиала) проходит тот же цикл, что и в desktop-приложении
+(src.analysis.pipeline.run_analysis): валидация, автоопределение колонок,
+исторический анализ, прогноз, рекомендации по закупкам. Файлы
+обрабатываются параллельно в отдельных процессах; ошибка в одном файле
+не останавливает остальные.
+
+Для каждого файла <имя> в выходной каталог пишутся:
+- <имя>_Анализ_запасов.xlsx (и части больших таблиц по филиалам);
+- <имя>_Анализ_запасов_Исторический_анализ.md, ..._Прогноз_закупки.md - пояснения;
+- <имя>_Анализ_запасов_Отчет_о_запуске.json - длительности этапов;
+- при --data-formats - таблицы результатов в Parquet/CSV.
+Сводка по всем файлам - batch_summary.json.
+
+Код возврата: 0 - все файлы обработаны, 1 - были ошибки, 2 - нет входных файлов.
+
+Примеры:
+    python -m src.cli.batch /data/branches --output /data/reports
+    python -m src.cli.batch /data/branches --output /data/reports/$(date +%F) \\
+        --workers 4 --forecast-model holt_winters --data-formats parquet
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.analysis.pipeline import run_analysis
+from src.desktop.excel_export_desktop import export_report_files
+from src.desktop.file_validation import validate_historical_data
+from src.utils.data_loading import FILE_FORMATS
+from src.utils.instrumentation import RunProfile
+from src.utils.result_export import DATA_EXPORT_FORMATS, export_result_tables
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_SUFFIX = 'Анализ_запасов'
+SUMMARY_FILE = 'batch_summary.json'
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(level='INFO', log_file=None):
+    """Логирование в stderr и, при необходимости, в файл"""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    logging.basicConfig(level=getattr(logging, str(level).upper()), format=LOG_FORMAT,
+                        handlers=handlers, force=True)
+
+
+def find_input_files(input_dir, pattern='*'):
+    """
+    Файлы исторических данных поддерживаемых форматов в каталоге.
+
+    Временные файлы Excel (~$...) пропускаются.
+
+    Returns:
+    --------
+    list of Path: отсортированные по имени
+    """
+    return sorted(
+        path for path in Path(input_dir).glob(pattern)
+        if path.is_file() and path.suffix.lower() in FILE_FORMATS and not path.name.startswith('~$')
+    )
+
+
+def build_config(args, historical_file):
+    """Конфигурация run_analysis для одного файла (ключи как в desktop-приложении)"""
+    config = {
+        'historical_file': str(historical_file),
+        'forecast_mode': args.forecast_mode,
+        'safety_stock_pct': args.safety_stock / 100,
+        'interest_rate': args.interest_rate / 100,
+        'lead_time_days': args.lead_time_days,
+    }
+    if args.forecast_mode == 'auto':
+        config['forecast_periods'] = args.forecast_periods
+        config['forecast_model'] = args.forecast_model
+        config['n_jobs'] = args.n_jobs
+        if args.model_cache_dir:
+            config['model_cache_dir'] = str(args.model_cache_dir)
+    else:
+        # Прогноз для файла - файл с тем же именем в каталоге прогнозов
+        matches = [path for path in find_input_files(args.forecast_dir) if path.stem == Path(historical_file).stem]
+        config['forecast_file'] = str(matches[0]) if matches else None
+    for key in ('date_col', 'branch_col', 'material_col', 'start_qty_col', 'end_qty_col',
+                'end_cost_col', 'consumption_col', 'planned_demand_col'):
+        if getattr(args, key, None):
+            config[key] = getattr(args, key)
+    return config
+
+
+def export_analysis_results(results, output_dir, base_name, data_formats=()):
+    """
+    Записывает отчеты одного анализа.
+
+    Parameters:
+    -----------
+    results : dict
+        Результат run_analysis
+    output_dir : str or Path
+        Каталог для файлов
+    base_name : str
+        Префикс имен файлов
+    data_formats : iterable
+        Форматы таблиц результатов (DATA_EXPORT_FORMATS); пусто - без них
+
+    Returns:
+    --------
+    list of str: пути записанных файлов
+    """
+    output_dir = Path(output_dir)
+    profile = results.get('profile')
+    written = []
+
+    for suffix, title, key in (
+        ('Исторический_анализ', 'Исторический анализ', 'historical_explanation'),
+        ('Прогноз_закупки', 'Прогноз и закупки', 'forecast_explanation'),
+    ):
+        md_path = output_dir / f"{base_name}_{suffix}.md"
+        with open(md_path, 'w', encoding='utf-8') as f:
+            f.write(f"# Подробные пояснения расчетов - {title}\n\n")
+            f.write(results.get(key, ''))
+        written.append(str(md_path))
+
+    export_rows = len(results['historical']) + len(results['forecast'])
+    with profile.stage('export', rows=export_rows):
+        # Таблицы длиннее листа Excel делятся целыми филиалами на отдельные книги
+        written += export_report_files(
+            str(output_dir / f"{base_name}.xlsx"),
+            df_historical=results['historical'],
+            df_forecast=results['forecast'],
+            split_by=results.get('branch_col')
+        )
+
+    if data_formats:
+        tables = {
+            'Исторический_анализ': results.get('historical_metrics', results['historical']),
+            'Прогноз_закупки': results['forecast'],
+            'Модели_прогноза': results.get('forecast_metadata'),
+        }
+        with profile.stage('export_data', rows=export_rows):
+            written += export_result_tables(output_dir, base_name, tables, data_formats)
+
+    profile.finish()
+    report_path = output_dir / f"{base_name}_Отчет_о_запуске.json"
+    profile.save(report_path)
+    written.append(str(report_path))
+    return written
+
+
+def process_file(config, output_dir, data_formats=()):
+    """
+    Анализ одного файла с записью отчетов (выполняется в процессе пула).
+
+    Ошибки не пробрасываются, а возвращаются в сводке файла.
+
+    Returns:
+    --------
+    dict: file, status ('ok' | 'invalid' | 'error'), outputs, duration_s, error
+    """
+    historical_file = config['historical_file']
+    started = time.perf_counter()
+    summary = {'file': historical_file, 'status': 'ok', 'outputs': [], 'duration_s': None, 'error': None}
+    logger.info(f"Анализ файла: {historical_file}")
+
+    try:
+        validation = validate_historical_data(historical_file)
+        if not validation.is_valid:
+            summary['status'] = 'invalid'
+            summary['error'] = validation.get_full_message()
+        elif config.get('forecast_mode') == 'manual' and not config.get('forecast_file'):
+            summary['status'] = 'invalid'
+            summary['error'] = "Не найден файл прогноза с тем же именем"
+        else:
+            profile = RunProfile('analysis', logger=logger)
+            profile.set_info('config', config)
+            results = run_analysis(config, profile=profile)
+            base_name = f"{Path(historical_file).stem}_{REPORT_SUFFIX}"
+            summary['outputs'] = export_analysis_results(results, output_dir, base_name, data_formats)
+    except Exception as e:
+        summary['status'] = 'error'
+        summary['error'] = f"{type(e).__name__}: {e}"
+        logger.error(f"Ошибка анализа {historical_file}: {summary['error']}")
+        logger.error(traceback.format_exc())
+
+    summary['duration_s'] = time.perf_counter() - started
+    if summary['status'] == 'invalid':
+        logger.warning(f"Файл пропущен ({historical_file}): {summary['error']}")
+    elif summary['status'] == 'ok':
+        logger.info(f"✓ {historical_file}: {summary['duration_s']:.1f} с, файлов: {len(summary['outputs'])}")
+    return summary
+
+
+def run_batch(configs, output_dir, workers=1, data_formats=(), log_level='INFO'):
+    """
+    Обрабатывает файлы (конфигурации run_analysis) в пуле процессов.
+
+    Parameters:
+    -----------
+    configs : list of dict
+        Конфигурации по файлам
+    output_dir : str or Path
+        Каталог отчетов (создается при необходимости)
+    workers : int
+        Число процессов (1 - последовательно в текущем процессе)
+    data_formats : iterable
+        Форматы таблиц результатов
+    log_level : str
+        Уровень логирования в процессах пула
+
+    Returns:
+    --------
+    list of dict: сводки process_file в порядке configs
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    data_formats = tuple(data_formats)
+    if workers <= 1 or len(configs) <= 1:
+        return [process_file(config, output_dir, data_formats) for config in configs]
+
+    summaries = [None] * len(configs)
+    with ProcessPoolExecutor(max_workers=min(workers, len(configs)),
+                             initializer=setup_logging, initargs=(log_level,)) as executor:
+        futures = {executor.submit(process_file, config, output_dir, data_formats): position
+                   for position, config in enumerate(configs)}
+        for future in as_completed(futures):
+            summaries[futures[future]] = future.result()
+    return summaries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.cli.batch',
+        description="Пакетный анализ запасов: каталог файлов исторических данных -> отчеты Excel"
+    )
+    parser.add_argument('input_dir', type=Path, help="Каталог файлов исторических данных")
+    parser.add_argument('-o', '--output', type=Path, required=True, help="Каталог для отчетов")
+    parser.add_argument('--pattern', default='*', help="Шаблон имен входных файлов (по умолчанию все поддерживаемые)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="Число процессов (по умолчанию - число ядер)")
+
+    analysis = parser.add_argument_group("параметры анализа (как в desktop-приложении)")
+    analysis.add_argument('--forecast-mode', choices=['auto', 'manual'], default='auto')
+    analysis.add_argument('--forecast-dir', type=Path,
+                          help="Ручной режим: каталог файлов прогноза (имя файла - как у исторического)")
+    analysis.add_argument('--forecast-periods', type=int, default=12)
+    analysis.add_argument('--forecast-model', default='auto',
+                          help="auto, naive, moving_average, exponential_smoothing, holt_winters, sarima")
+    analysis.add_argument('--n-jobs', type=int, default=1, help="Процессов подбора моделей внутри одного файла")
+    analysis.add_argument('--model-cache-dir', type=Path, help="Каталог кэша подобранных моделей")
+    analysis.add_argument('--safety-stock', type=float, default=20.0, help="Страховой запас, %%")
+    analysis.add_argument('--interest-rate', type=float, default=5.0, help="Ставка стоимости хранения, %%")
+    analysis.add_argument('--lead-time-days', type=int, default=30)
+
+    columns = parser.add_argument_group("колонки (по умолчанию - автоопределение)")
+    for key in ('date_col', 'branch_col', 'material_col', 'start_qty_col', 'end_qty_col',
+                'end_cost_col', 'consumption_col', 'planned_demand_col'):
+        columns.add_argument('--' + key.replace('_', '-'), dest=key)
+
+    output = parser.add_argument_group("вывод")
+    output.add_argument('--data-formats', nargs='*', default=[], choices=list(DATA_EXPORT_FORMATS),
+                        help="Дополнительно сохранить таблицы результатов (parquet, csv)")
+    output.add_argument('--log-file', type=Path, help="Файл лога (дополнительно к stderr)")
+    output.add_argument('--log-level', default='INFO')
+
+    args = parser.parse_args(argv)
+    if args.forecast_mode == 'manual' and not args.forecast_dir:
+        parser.error("для --forecast-mode manual нужен --forecast-dir")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level, args.log_file)
+
+    files = find_input_files(args.input_dir, args.pattern)
+    if not files:
+        logger.error(f"Нет входных файлов в {args.input_dir} (шаблон {args.pattern})")
+        return 2
+
+    logger.info(f"Файлов: {len(files)}, процессов: {min(args.workers, len(files))}, каталог отчетов: {args.output}")
+    started_at = datetime.now().isoformat(timespec='seconds')
+    started = time.perf_counter()
+    summaries = run_batch([build_config(args, path) for path in files], args.output,
+                          workers=args.workers, data_formats=args.data_formats, log_level=args.log_level)
+
+    failed = [summary for summary in summaries if summary['status'] != 'ok']
+    summary_path = Path(args.output) / SUMMARY_FILE
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'started_at': started_at,
+            'input_dir': str(args.input_dir),
+            'total_s': time.perf_counter() - started,
+            'files': summaries,
+        }, f, ensure_ascii=False, indent=2, default=str)
+
+    logger.info(f"Готово: {len(files) - len(failed)} из {len(files)} файлов, сводка: {summary_path}")
+    for summary in failed:
+        logger.error(f"  {summary['file']}: {summary['status']} - {summary['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
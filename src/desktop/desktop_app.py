@@ -16,6 +16,7 @@ import os
 import pandas as pd
 import logging
 import traceback
+from contextlib import nullcontext
 from datetime import datetime
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -27,6 +28,10 @@ from PyQt6.QtGui import QIcon
 
 # Глобальная переменная для логгера и лог файла
 log_file = Path.home() / 'Nornickel_Inventory_Analysis.log'
+# Каталог кэша подобранных моделей прогнозирования (между запусками)
+model_cache_dir = Path.home() / '.nornickel_inventory_model_cache'
+# Машиночитаемый отчет о последнем запуске (длительности этапов, счетчики)
+run_report_file = Path.home() / 'Nornickel_Inventory_Run_Report.json'
 
 def setup_logging(enable_logging=True):
     """Настройка логирования с учетом пользовательских настроек"""
@@ -73,8 +78,10 @@ logger.info("Импорт модулей UI...")
 from src.desktop.desktop_ui_styles import *
 from src.desktop.desktop_ui_components import *
 from src.desktop.file_validation import *
-from src.desktop.excel_export_desktop import export_full_report
-from src.utils.utils import auto_detect_columns
+from src.desktop.excel_export_desktop import export_report_files
+from src.utils.instrumentation import RunProfile
+from src.utils.progress import AnalysisCancelled, CancellationToken
+from src.utils.result_export import export_result_tables
 from src.desktop.help_content import (
     get_help_general,
     get_help_data_structure,
@@ -88,35 +95,26 @@ logger.info("✓ Модули UI импортированы")
 # Импорт логики анализа из существующих модулей
 logger.info("Импорт модулей анализа...")
 try:
-    from src.analysis.historical_analysis import analyze_historical_data, get_explanation as get_historical_explanation
-    logger.info("✓ historical_analysis импортирован")
-    logger.info(f"  - analyze_historical_data: {type(analyze_historical_data)}")
-    logger.info(f"  - get_historical_explanation: {type(get_historical_explanation)}")
+    from src.analysis.pipeline import run_analysis, apply_parameters
+    logger.info("✓ pipeline импортирован")
+    logger.info(f"  - run_analysis: {type(run_analysis)}")
+    logger.info(f"  - apply_parameters: {type(apply_parameters)}")
 except Exception as e:
-    logger.error(f"✗ Ошибка импорта historical_analysis: {e}")
-    logger.error(traceback.format_exc())
-
-try:
-    from src.analysis.forecast_analysis import (
-        analyze_forecast_data,
-        auto_forecast_demand,
-        forecast_start_balance,
-        calculate_purchase_recommendations,
-        get_explanation as get_forecast_explanation
-    )
-    logger.info("✓ forecast_analysis импортирован")
-    logger.info(f"  - analyze_forecast_data: {type(analyze_forecast_data)}")
-    logger.info(f"  - auto_forecast_demand: {type(auto_forecast_demand)}")
-    logger.info(f"  - forecast_start_balance: {type(forecast_start_balance)}")
-    logger.info(f"  - calculate_purchase_recommendations: {type(calculate_purchase_recommendations)}")
-    logger.info(f"  - get_forecast_explanation: {type(get_forecast_explanation)}")
-except Exception as e:
-    logger.error(f"✗ Ошибка импорта forecast_analysis: {e}")
+    logger.error(f"✗ Ошибка импорта pipeline: {e}")
     logger.error(traceback.format_exc())
 
 logger.info("Все модули импортированы успешно")
 
 
+def save_run_report(profile):
+    """Сохраняет отчет о запуске (RunProfile) рядом с логом"""
+    try:
+        profile.save(run_report_file)
+        logger.info(f"Отчет о запуске: {run_report_file}")
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить отчет о запуске: {e}")
+
+
 class AnalysisWorker(QThread):
     """Рабочий поток для выполнения анализа в фоне"""
 
@@ -126,6 +124,12 @@ class AnalysisWorker(QThread):
     def __init__(self, config):
         super().__init__()
         self.config = config
+        self.cancel_token = CancellationToken()
+
+    def cancel(self):
+        """Отменить анализ (из потока интерфейса): расчет прервется на ближайшей группе"""
+        logger.info("Запрошена отмена анализа")
+        self.cancel_token.cancel()
 
     def run(self):
         """Выполнить анализ"""
@@ -134,273 +138,33 @@ class AnalysisWorker(QThread):
         logger.info(f"Конфигурация: {self.config}")
         logger.info("="*80)
 
-        try:
-            results = {}
-
-            # Шаг 1: Исторический анализ
-            logger.info("[ШАГ 1] Загрузка исторических данных...")
-            self.progress.emit(10, "Загрузка исторических данных...")
-            logger.info(f"Файл: {self.config['historical_file']}")
-            df_hist = pd.read_excel(self.config['historical_file'])
-            logger.info(f"✓ Данные загружены: {df_hist.shape[0]} строк, {df_hist.shape[1]} колонок")
-            logger.info(f"Колонки: {list(df_hist.columns)}")
-
-            logger.info("[ШАГ 2] Анализ исторических данных...")
-            self.progress.emit(30, "Анализ исторических данных...")
-
-            # Автоматическое определение колонок
-            logger.info("Автоматическое определение колонок...")
-            detected_cols = auto_detect_columns(df_hist)
-            logger.info(f"Обнаружено колонок: {detected_cols}")
-
-            # Получение колонок (либо из конфига, либо автоопределение, либо дефолт)
-            date_col = self.config.get('date_col') or detected_cols.get('date') or df_hist.columns[0]
-            branch_col = self.config.get('branch_col') or detected_cols.get('branch')
-            material_col = self.config.get('material_col') or detected_cols.get('material') or df_hist.columns[1]
-            start_qty_col = self.config.get('start_qty_col') or detected_cols.get('start_quantity') or df_hist.columns[3]
-            end_qty_col = self.config.get('end_qty_col') or detected_cols.get('end_quantity') or df_hist.columns[6]
-            end_cost_col = self.config.get('end_cost_col') or detected_cols.get('end_cost')
-            consumption_col = self.config.get('consumption_col') or detected_cols.get('consumption')
-
-            logger.info(f"Параметры анализа (после автоопределения):")
-            logger.info(f"  - date_column: {date_col}")
-            logger.info(f"  - branch_column: {branch_col}")
-            logger.info(f"  - material_column: {material_col}")
-            logger.info(f"  - start_quantity_column: {start_qty_col}")
-            logger.info(f"  - end_quantity_column: {end_qty_col}")
-            logger.info(f"  - end_cost_column: {end_cost_col}")
-            logger.info(f"  - consumption_column: {consumption_col}")
-            logger.info(f"  - interest_rate: {self.config.get('interest_rate', 0.05)}")
-            logger.info(f"  - lead_time_days: {self.config.get('lead_time_days', 30)}")
-
-            logger.info("Вызов analyze_historical_data()...")
-            logger.info(f"Тип функции: {type(analyze_historical_data)}")
-
-            hist_results, _ = analyze_historical_data(
-                df=df_hist,
-                date_column=date_col,
-                branch_column=branch_col,
-                material_column=material_col,
-                start_quantity_column=start_qty_col,
-                end_quantity_column=end_qty_col,
-                end_cost_column=end_cost_col,
-                interest_rate=self.config.get('interest_rate', 0.05),
-                consumption_column=consumption_col,
-                lead_time_days=self.config.get('lead_time_days', 30)
-            )
-            logger.info(f"✓ analyze_historical_data() выполнена успешно")
-            logger.info(f"Результат: тип={type(hist_results)}, shape={hist_results.shape if hasattr(hist_results, 'shape') else 'N/A'}")
-
-            results['historical'] = hist_results
-
-            logger.info("Вызов get_historical_explanation()...")
-            logger.info(f"Тип функции: {type(get_historical_explanation)}")
-            logger.info(f"Первая строка hist_results: {hist_results.iloc[0].to_dict() if hasattr(hist_results, 'iloc') else 'N/A'}")
-
-            results['historical_explanation'] = get_historical_explanation(hist_results.iloc[0])
-            logger.info(f"✓ get_historical_explanation() выполнена успешно")
-
-            # Шаг 2: Прогнозный анализ
-            logger.info("[ШАГ 3] Прогнозный анализ...")
-            forecast_mode = self.config.get('forecast_mode')
-            logger.info(f"Режим прогноза: {forecast_mode}")
-
-            if forecast_mode == 'auto':
-                # Автоматический прогноз
-                logger.info("[ШАГ 3.1] Генерация автоматического прогноза...")
-                self.progress.emit(50, "Генерация автоматического прогноза...")
-
-                logger.info("Вызов auto_forecast_demand()...")
-                logger.info(f"Тип функции: {type(auto_forecast_demand)}")
-                logger.info(f"Параметры:")
-                logger.info(f"  - forecast_periods: {self.config.get('forecast_periods', 12)}")
-                logger.info(f"  - date_column: {date_col}")
-                logger.info(f"  - material_column: {material_col}")
-                logger.info(f"  - branch_column: {branch_col}")
-                logger.info(f"  - consumption_column: {consumption_col}")
-                logger.info(f"  - forecast_model: {self.config.get('forecast_model', 'auto')}")
-
-                forecast_df = auto_forecast_demand(
-                    historical_df=df_hist,
-                    forecast_periods=self.config.get('forecast_periods', 12),
-                    date_column=date_col,
-                    material_column=material_col,
-                    branch_column=branch_col,
-                    consumption_column=consumption_col,
-                    forecast_model=self.config.get('forecast_model', 'auto')
-                )
-                logger.info(f"✓ auto_forecast_demand() выполнена успешно")
-                logger.info(f"Результат: тип={type(forecast_df)}, shape={forecast_df.shape if hasattr(forecast_df, 'shape') else 'N/A'}")
-
-                logger.info("[ШАГ 3.2] Прогноз начальных остатков...")
-                self.progress.emit(70, "Прогноз начальных остатков...")
-                logger.info("Вызов forecast_start_balance()...")
-                logger.info(f"Тип функции: {type(forecast_start_balance)}")
-
-                # Прогноз начальных остатков
-                forecast_df['Прогноз остатка на начало'] = forecast_start_balance(
-                    df_hist,
-                    forecast_df,
-                    date_col,
-                    material_col,
-                    branch_col,
-                    end_qty_col,
-                    date_col,  # forecast_date_column
-                    material_col,  # forecast_material_column
-                    branch_col,  # forecast_branch_column
-                    forecast_model='naive',
-                    seasonal_periods=12
-                )
-                logger.info(f"✓ forecast_start_balance() выполнена успешно")
-
-                # Расчет конечных остатков
-                logger.info("[ШАГ 3.3] Расчет конечных остатков...")
-                forecast_df['Прогноз остатка на конец'] = forecast_df['Прогноз остатка на начало'] - forecast_df['Запланированная потребность']
-                logger.info(f"✓ Конечные остатки рассчитаны")
-
-                logger.info("[ШАГ 3.4] Расчет рекомендаций по закупкам...")
-                self.progress.emit(85, "Расчет рекомендаций по закупкам...")
-                logger.info("Вызов calculate_purchase_recommendations()...")
-                logger.info(f"Тип функции: {type(calculate_purchase_recommendations)}")
-
-                # Расчет рекомендаций
-                recommendations_df = calculate_purchase_recommendations(
-                    forecast_df,
-                    'Прогноз остатка на конец',
-                    'Запланированная потребность',
-                    self.config.get('safety_stock_pct', 0.20)
-                )
-                logger.info(f"✓ calculate_purchase_recommendations() выполнена успешно")
-
-                forecast_df = pd.concat([forecast_df, recommendations_df], axis=1)
-                logger.info(f"✓ Рекомендации добавлены в DataFrame")
-
-                # Анализ
-                logger.info("[ШАГ 3.5] Финальный анализ прогноза...")
-                logger.info("Вызов analyze_forecast_data()...")
-                logger.info(f"Тип функции: {type(analyze_forecast_data)}")
-
-                forecast_results, _ = analyze_forecast_data(
-                    forecast_df,
-                    date_col,
-                    material_col,
-                    branch_col,
-                    'Запланированная потребность',
-                    'Прогноз остатка на начало',
-                    'Прогноз остатка на конец',
-                    'Рекомендация по закупке',
-                    'Будущий спрос',
-                    'Страховой запас'
-                )
-                logger.info(f"✓ analyze_forecast_data() выполнена успешно")
-
-            else:
-                # Ручной прогноз из файла
-                logger.info("[ШАГ 3.1] Загрузка прогнозных данных...")
-                self.progress.emit(50, "Загрузка прогнозных данных...")
-                df_forecast = pd.read_excel(self.config['forecast_file'])
-                logger.info(f"✓ Прогнозные данные загружены: {df_forecast.shape[0]} строк, {df_forecast.shape[1]} колонок")
-
-                # Автоматическое определение колонок в прогнозном файле
-                logger.info("Автоматическое определение колонок прогноза...")
-                forecast_detected_cols = auto_detect_columns(df_forecast)
-                logger.info(f"Обнаружено колонок в прогнозе: {forecast_detected_cols}")
-
-                # Получение колонки планового спроса
-                planned_demand_col = self.config.get('planned_demand_col') or forecast_detected_cols.get('planned_demand') or df_forecast.columns[3]
-                logger.info(f"Колонка планового спроса: {planned_demand_col}")
-
-                logger.info("[ШАГ 3.2] Прогноз начальных остатков...")
-                self.progress.emit(70, "Прогноз начальных остатков...")
-                # Прогноз начальных остатков
-                df_forecast['Прогноз остатка на начало'] = forecast_start_balance(
-                    df_hist,
-                    df_forecast,
-                    date_col,
-                    material_col,
-                    branch_col,
-                    end_qty_col,
-                    date_col,  # forecast_date_column
-                    material_col,  # forecast_material_column
-                    branch_col,  # forecast_branch_column
-                    forecast_model='naive',
-                    seasonal_periods=12
-                )
-                logger.info(f"✓ forecast_start_balance() выполнена успешно")
-
-                # Расчет конечных остатков
-                logger.info("[ШАГ 3.3] Расчет конечных остатков...")
-                df_forecast['Прогноз остатка на конец'] = df_forecast['Прогноз остатка на начало'] - df_forecast[planned_demand_col]
-                logger.info(f"✓ Конечные остатки рассчитаны")
-
-                logger.info("[ШАГ 3.4] Расчет рекомендаций по закупкам...")
-                self.progress.emit(85, "Расчет рекомендаций по закупкам...")
-                # Расчет рекомендаций
-                recommendations_df = calculate_purchase_recommendations(
-                    df_forecast,
-                    'Прогноз остатка на конец',
-                    planned_demand_col,
-                    self.config.get('safety_stock_pct', 0.20)
-                )
-                logger.info(f"✓ calculate_purchase_recommendations() выполнена успешно")
-
-                df_forecast = pd.concat([df_forecast, recommendations_df], axis=1)
-                logger.info(f"✓ Рекомендации добавлены в DataFrame")
-
-                # Анализ
-                logger.info("[ШАГ 3.5] Финальный анализ прогноза...")
-                forecast_results, _ = analyze_forecast_data(
-                    df_forecast,
-                    date_col,
-                    material_col,
-                    branch_col,
-                    planned_demand_col,
-                    'Прогноз остатка на начало',
-                    'Прогноз остатка на конец',
-                    'Рекомендация по закупке',
-                    'Будущий спрос',
-                    'Страховой запас'
-                )
-                logger.info(f"✓ analyze_forecast_data() выполнена успешно")
+        profile = RunProfile('analysis', logger=logger)
+        profile.set_info('config', self.config)
 
-            logger.info("[ШАГ 4] Сохранение результатов прогноза...")
-            results['forecast'] = forecast_results
-            logger.info(f"✓ Результаты прогноза сохранены")
-
-            logger.info("Вызов get_forecast_explanation()...")
-            logger.info(f"Тип функции: {type(get_forecast_explanation)}")
-            logger.info(f"Первая строка forecast_results: {forecast_results.iloc[0].to_dict() if hasattr(forecast_results, 'iloc') else 'N/A'}")
+        try:
+            results = run_analysis(self.config, progress=self.progress.emit, profile=profile,
+                                   cancel_token=self.cancel_token)
 
-            # Определяем имена колонок для explanation
-            if forecast_mode == 'auto':
-                demand_col_name = 'Запланированная потребность'
-            else:
-                demand_col_name = planned_demand_col
-
-            results['forecast_explanation'] = get_forecast_explanation(
-                forecast_results.iloc[0],
-                date_col,
-                material_col,
-                branch_col,
-                demand_col_name,
-                'Прогноз остатка на начало',
-                'Прогноз остатка на конец',
-                'Рекомендация по закупке',
-                'Будущий спрос',
-                'Страховой запас',
-                forecast_mode=forecast_mode,
-                forecast_model=self.config.get('forecast_model', 'auto') if forecast_mode == 'auto' else None,
-                forecast_periods=self.config.get('forecast_periods', 12) if forecast_mode == 'auto' else None
-            )
-            logger.info(f"✓ get_forecast_explanation() выполнена успешно")
+            profile.finish()
+            save_run_report(profile)
 
             logger.info("="*80)
             logger.info("АНАЛИЗ ЗАВЕРШЕН УСПЕШНО!")
             logger.info("="*80)
 
-            self.progress.emit(100, "Анализ завершен!")
             self.finished.emit(True, results)
 
+        except AnalysisCancelled:
+            logger.info("="*80)
+            logger.info("АНАЛИЗ ОТМЕНЕН ПОЛЬЗОВАТЕЛЕМ")
+            logger.info("="*80)
+
+            profile.set_info('cancelled', True)
+            profile.finish()
+            save_run_report(profile)
+
+            self.finished.emit(False, "Анализ отменен")
+
         except Exception as e:
             logger.error("="*80)
             logger.error("ОШИБКА ПРИ ВЫПОЛНЕНИИ АНАЛИЗА!")
@@ -411,6 +175,10 @@ class AnalysisWorker(QThread):
             logger.error(traceback.format_exc())
             logger.error("="*80)
 
+            # Отчет сохраняется и при ошибке - видно, на каком этапе она произошла
+            profile.finish()
+            save_run_report(profile)
+
             error_message = f"{type(e).__name__}: {str(e)}\n\nПодробности в логе: {log_file}"
             self.finished.emit(False, error_message)
 
@@ -630,6 +398,19 @@ class MainWindow(QMainWindow):
         model_layout.addStretch()
         auto_layout.addLayout(model_layout)
 
+        # Число процессов для подбора моделей (по умолчанию - все ядра)
+        jobs_layout = QHBoxLayout()
+        jobs_layout.addWidget(QLabel("Процессов для подбора моделей:"))
+        cpu_count = os.cpu_count() or 1
+        self.n_jobs_spin = QSpinBox()
+        self.n_jobs_spin.setRange(1, cpu_count)
+        self.n_jobs_spin.setValue(min(self.settings.value('n_jobs', cpu_count, type=int), cpu_count))
+        self.n_jobs_spin.setStyleSheet(get_input_style())
+        self.n_jobs_spin.valueChanged.connect(lambda value: self.settings.setValue('n_jobs', value))
+        jobs_layout.addWidget(self.n_jobs_spin)
+        jobs_layout.addStretch()
+        auto_layout.addLayout(jobs_layout)
+
         auto_settings.setLayout(auto_layout)
         layout.addWidget(auto_settings)
         self.auto_forecast_settings = auto_settings
@@ -725,6 +506,26 @@ class MainWindow(QMainWindow):
         logging_layout.addWidget(logging_caption)
         col2_layout.addLayout(logging_layout)
 
+        # Чекбокс выгрузки данных для BI
+        data_export_layout = QVBoxLayout()
+        self.export_data_checkbox = QCheckBox("🗃 Сохранять данные в Parquet и CSV")
+        self.export_data_checkbox.setChecked(self.settings.value('export_data_files', False, type=bool))
+        self.export_data_checkbox.setStyleSheet(f"""
+            QCheckBox {{
+                font-size: {NornikFonts.SIZE_BODY}px;
+                color: {NornikColors.TEXT_PRIMARY};
+            }}
+            QCheckBox::indicator {{
+                width: 20px;
+                height: 20px;
+            }}
+        """)
+        self.export_data_checkbox.stateChanged.connect(self.on_export_data_checkbox_changed)
+        data_export_layout.addWidget(self.export_data_checkbox)
+        data_export_caption = NornikCaptionLabel("Таблицы результатов с числовыми типами рядом с Excel-отчетом (.parquet, .csv.gz)")
+        data_export_layout.addWidget(data_export_caption)
+        col2_layout.addLayout(data_export_layout)
+
         params_layout.addLayout(col2_layout, 1)
 
         layout.addLayout(params_layout)
@@ -748,6 +549,11 @@ class MainWindow(QMainWindow):
         self.run_button.clicked.connect(self.run_analysis)
         buttons_layout.addWidget(self.run_button)
 
+        self.cancel_button = NornikSecondaryButton("⏹ Отменить")
+        self.cancel_button.clicked.connect(self.cancel_analysis)
+        self.cancel_button.setVisible(False)
+        buttons_layout.addWidget(self.cancel_button)
+
         self.export_button = NornikSecondaryButton("💾 Сохранить в Excel")
         self.export_button.clicked.connect(self.export_results)
         self.export_button.setEnabled(False)
@@ -874,6 +680,8 @@ class MainWindow(QMainWindow):
             config['forecast_periods'] = self.forecast_periods_spin.value()
             model_text = self.forecast_model_combo.currentText()
             config['forecast_model'] = model_text.split(' ')[0].lower()
+            config['n_jobs'] = self.n_jobs_spin.value()
+            config['model_cache_dir'] = str(model_cache_dir)
         else:
             config['forecast_file'] = self.forecast_file
 
@@ -881,9 +689,20 @@ class MainWindow(QMainWindow):
         for key, value in config.items():
             logger.info(f"  - {key}: {value}")
 
+        # Изменились только страховой запас, ставка или срок поставки -
+        # пересчет зависящих колонок без загрузки файла и подбора моделей
+        what_if_results = apply_parameters(self.analysis_results, config)
+        if what_if_results is not None:
+            logger.info("✓ Результаты пересчитаны из кэша (режим «что если»)")
+            save_run_report(what_if_results['profile'])
+            self.on_analysis_finished(True, what_if_results)
+            return
+
         # Запуск анализа в фоновом потоке
         logger.info("Запуск рабочего потока анализа...")
         self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setVisible(True)
         self.progress_bar.setVisible(True)
         self.progress_label.setVisible(True)
         self.progress_bar.setValue(0)
@@ -894,6 +713,13 @@ class MainWindow(QMainWindow):
         self.worker.start()
         logger.info("✓ Рабочий поток запущен")
 
+    def cancel_analysis(self):
+        """Отменить выполняющийся анализ"""
+        if getattr(self, 'worker', None) is not None and self.worker.isRunning():
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText("Отмена анализа...")
+            self.worker.cancel()
+
     def on_analysis_progress(self, percent, message):
         """Обработчик прогресса анализа"""
         self.progress_bar.setValue(percent)
@@ -902,6 +728,7 @@ class MainWindow(QMainWindow):
     def on_analysis_finished(self, success, result):
         """Обработчик завершения анализа"""
         self.run_button.setEnabled(True)
+        self.cancel_button.setVisible(False)
         self.progress_bar.setVisible(False)
         self.progress_label.setVisible(False)
 
@@ -932,6 +759,13 @@ class MainWindow(QMainWindow):
                     "Результаты отображены ниже. Вы можете сохранить их позже кнопкой '💾 Сохранить в Excel'",
                     "info"
                 )
+        elif getattr(self, 'worker', None) is not None and self.worker.cancel_token.cancelled:
+            show_message_box(
+                self,
+                "Отменено",
+                "Анализ отменен. Предыдущие результаты сохранены.",
+                "info"
+            )
         else:
             show_message_box(
                 self,
@@ -976,6 +810,8 @@ class MainWindow(QMainWindow):
         </ul>
         </div>
 
+        {self.format_profile_html(results.get('profile'))}
+
         <hr style='border: 2px solid {NornikColors.PRIMARY_BLUE}; margin: 30px 0;'>
 
         <div style='background-color: #fffef0; padding: 20px; border-radius: 10px; border-left: 5px solid {NornikColors.ACCENT_ORANGE};'>
@@ -985,6 +821,7 @@ class MainWindow(QMainWindow):
         • <b>Excel файл</b> - таблицы со всеми данными и расчетами<br>
         • <b>Исторический_анализ.md</b> - подробные пояснения расчетов исторических метрик<br>
         • <b>Прогноз_закупки.md</b> - подробные пояснения расчетов прогноза<br>
+        • <b>Отчет_о_запуске.json</b> - длительности этапов и счетчики запуска<br>
         </p>
         </div>
 
@@ -1019,6 +856,31 @@ class MainWindow(QMainWindow):
                 logger.error(f"Критическая ошибка отображения: {e2}")
                 logger.error(traceback.format_exc())
 
+    def format_profile_html(self, profile):
+        """HTML-таблица длительностей этапов и счетчиков запуска"""
+        if profile is None:
+            return ''
+
+        rows = ''.join(
+            f"<tr><td>{name}</td><td align='right'>{duration}</td><td align='right'>{share}</td>"
+            f"<td align='right'>{rate}</td><td align='right'>{memory}</td></tr>"
+            for name, duration, share, rate, memory in profile.summary_rows()
+        )
+        counters = ', '.join(f"{name}: {value}" for name, value in sorted(profile.counters.items()))
+        counters_html = f"<p style='font-size: 13px;'><b>Счетчики:</b> {counters}</p>" if counters else ''
+
+        return f"""
+        <div style='background-color: #f5f5f5; padding: 20px; border-radius: 10px; margin: 20px 0;'>
+        <h3 style='color: {NornikColors.PRIMARY_BLUE}; margin-top: 0;'>⏱ Профиль выполнения ({profile.total_s:.1f} с):</h3>
+        <table cellpadding='4' style='font-size: 13px;'>
+            <tr><th align='left'>Этап</th><th>Время</th><th>Доля</th><th>Строк/с</th><th>Память</th></tr>
+            {rows}
+        </table>
+        {counters_html}
+        <p style='font-size: 12px; color: {NornikColors.TEXT_SECONDARY};'>Отчет: {run_report_file}</p>
+        </div>
+        """
+
     def export_results(self):
         """Экспортировать результаты в Excel и markdown файлы"""
         if not self.analysis_results:
@@ -1066,13 +928,56 @@ class MainWindow(QMainWindow):
 
                 # 2. Экспорт Excel БЕЗ текстовых пояснений (только таблицы)
                 logger.info("Экспорт Excel файла с таблицами...")
-                success = export_full_report(
-                    file_path,
-                    df_historical=self.analysis_results['historical'],
-                    explanation_historical=None,  # Не включаем в Excel
-                    df_forecast=self.analysis_results['forecast'],
-                    explanation_forecast=None  # Не включаем в Excel
-                )
+                profile = self.analysis_results.get('profile')
+                export_rows = len(self.analysis_results['historical']) + len(self.analysis_results['forecast'])
+                with profile.stage('export', rows=export_rows) if profile else nullcontext():
+                    try:
+                        # Таблицы длиннее листа Excel делятся целыми филиалами на отдельные книги
+                        excel_files = export_report_files(
+                            file_path,
+                            df_historical=self.analysis_results['historical'],
+                            explanation_historical=None,  # Не включаем в Excel
+                            df_forecast=self.analysis_results['forecast'],
+                            explanation_forecast=None,  # Не включаем в Excel
+                            split_by=self.analysis_results.get('branch_col')
+                        )
+                        success = True
+                    except Exception as e:
+                        logger.error(f"Ошибка при записи Excel: {e}")
+                        logger.error(traceback.format_exc())
+                        excel_files = []
+                        success = False
+
+                # Таблицы результатов для BI (числовые типы сохраняются)
+                data_files = []
+                if self.settings.value('export_data_files', False, type=bool):
+                    logger.info("Сохранение таблиц результатов в Parquet и CSV...")
+                    tables = {
+                        'Исторический_анализ': self.analysis_results.get('historical_metrics',
+                                                                         self.analysis_results['historical']),
+                        'Прогноз_закупки': self.analysis_results['forecast'],
+                        'Модели_прогноза': self.analysis_results.get('forecast_metadata'),
+                    }
+                    try:
+                        with profile.stage('export_data', rows=export_rows) if profile else nullcontext():
+                            data_files = export_result_tables(output_dir, base_name, tables)
+                        for data_path in data_files:
+                            logger.info(f"✓ Сохранен файл: {data_path}")
+                    except Exception as e:
+                        logger.warning(f"Не удалось сохранить таблицы в Parquet/CSV: {e}")
+                        logger.warning(traceback.format_exc())
+
+                # Отчет о запуске (длительности этапов, включая экспорт)
+                report_path = None
+                if profile:
+                    report_path = output_dir / f"{base_name}_Отчет_о_запуске.json"
+                    try:
+                        profile.save(report_path)
+                        save_run_report(profile)
+                        logger.info(f"✓ Отчет о запуске сохранен: {report_path}")
+                    except OSError as e:
+                        logger.warning(f"Не удалось сохранить отчет о запуске: {e}")
+                        report_path = None
 
                 # 3. Копируем лог-файл в ту же папку (только если логирование включено)
                 enable_logging = self.settings.value('enable_logging', True, type=bool)
@@ -1101,6 +1006,16 @@ class MainWindow(QMainWindow):
                         f"📄 Пояснения (прогноз): {forecast_md_path.name}"
                     )
 
+                    if len(excel_files) > 1:
+                        message += (f"\n📚 Части больших таблиц: {len(excel_files) - 1} файл(ов), "
+                                    f"список - на вкладке «Оглавление»")
+
+                    if data_files:
+                        message += f"\n🗃 Данные (Parquet, CSV): {len(data_files)} файл(ов)"
+
+                    if report_path:
+                        message += f"\n⏱ Отчет о запуске: {report_path.name}"
+
                     if enable_logging:
                         message += f"\n📋 Лог выполнения: {log_dest.name}"
                     else:
@@ -1198,6 +1113,10 @@ class MainWindow(QMainWindow):
         # Показываем модальное окно
         dialog.exec()
 
+    def on_export_data_checkbox_changed(self, state):
+        """Обработчик чекбокса выгрузки данных в Parquet/CSV - сохраняет выбор в настройки"""
+        self.settings.setValue('export_data_files', self.export_data_checkbox.isChecked())
+
     def on_logging_checkbox_changed(self, state):
         """Обработчик изменения состояния чекбокса логирования"""
         # Сохраняем новое состояние в настройки
@@ -1248,4 +1167,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов прогнозирования в собранном EXE (Windows spawn)
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -16,6 +16,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont, QPixmap, QPainter, QColor
 from src.desktop.desktop_ui_styles import *
+from src.utils.data_loading import FILE_DIALOG_FILTER
 
 
 class NornikPrimaryButton(QPushButton):
@@ -122,7 +123,7 @@ class FileUploadCard(QFrame):
 
     def select_file(self):
         """Открыть диалог выбора файла"""
-        file_filter = "Excel Files (*.xlsx *.xls)"
+        file_filter = FILE_DIALOG_FILTER
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             f"Выберите {self.file_type} файл",
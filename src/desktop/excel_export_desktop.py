@@ -6,12 +6,35 @@
 2. Прогноз и закупки (рекомендации)
 3. Инструкция (как пользоваться)
 4. Экономический эффект (польза для бизнеса)
+
+Таблицы, не помещающиеся на лист Excel, делятся на части (по бюджету строк
+или целыми филиалами), каждая часть пишется в отдельную книгу параллельно,
+а в основной книге появляется вкладка "Оглавление" со ссылками на части.
 """
 
+import os
 import pandas as pd
 import xlsxwriter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+
+from src.utils.excel_writer import (
+    CONSTANT_MEMORY_OPTIONS, EXCEL_MAX_ROWS, estimate_column_widths, plan_shards, write_table
+)
+
+
+# Строк данных на простой вкладке: предел листа минус шапка (4 строки) и заголовки таблицы
+SHEET_ROW_BUDGET = EXCEL_MAX_ROWS - 5
+
+# Вкладка со списком частей разделенных таблиц
+INDEX_SHEET_NAME = 'Оглавление'
+
+# Вкладки таблиц с текстовыми пояснениями
+EXPLAINED_SHEET_NAMES = {
+    'Исторический анализ': '1. Исторический анализ',
+    'Прогноз и закупки': '2. Прогноз и закупки',
+}
 
 
 class ExcelExporter:
@@ -24,15 +47,17 @@ class ExcelExporter:
     COLOR_LIGHT_GRAY = "#C8C8C8"
     COLOR_WHITE = "#FFFFFF"
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, constant_memory: bool = True):
         """
         Инициализация экспортера.
 
         Args:
             file_path: Путь к файлу для сохранения
+            constant_memory: Сбрасывать строки на диск по мере записи (память
+                не растет с размером таблиц; строки листа пишутся только по порядку)
         """
         self.file_path = file_path
-        self.workbook = xlsxwriter.Workbook(file_path)
+        self.workbook = xlsxwriter.Workbook(file_path, CONSTANT_MEMORY_OPTIONS if constant_memory else {})
         self._create_formats()
 
     def _create_formats(self):
@@ -137,24 +162,8 @@ class ExcelExporter:
         worksheet.write(start_row, 0, 'ДАННЫЕ:', self.format_subtitle)
         start_row += 1
 
-        # Записать заголовки
-        for col_num, column in enumerate(df_results.columns):
-            worksheet.write(start_row, col_num, str(column), self.format_header)
-
-        # Записать данные
-        for row_num, row_data in enumerate(df_results.values):
-            for col_num, value in enumerate(row_data):
-                # Определить формат ячейки
-                if pd.isna(value):
-                    cell_format = self.format_normal
-                elif isinstance(value, (int, float)):
-                    cell_format = self.format_number
-                elif isinstance(value, datetime):
-                    cell_format = self.format_date
-                else:
-                    cell_format = self.format_normal
-
-                worksheet.write(start_row + 1 + row_num, col_num, value, cell_format)
+        # Записать заголовки и данные
+        self._write_table(worksheet, df_results, start_row)
 
         # Настройка ширины колонок
         for col_num in range(len(df_results.columns)):
@@ -190,28 +199,12 @@ class ExcelExporter:
         worksheet.write(start_row, 0, 'ДАННЫЕ:', self.format_subtitle)
         start_row += 1
 
-        # Записать заголовки
-        for col_num, column in enumerate(df_results.columns):
-            worksheet.write(start_row, col_num, str(column), self.format_header)
-
-        # Записать данные
-        for row_num, row_data in enumerate(df_results.values):
-            for col_num, value in enumerate(row_data):
-                # Определить формат ячейки
-                if pd.isna(value):
-                    cell_format = self.format_normal
-                elif isinstance(value, (int, float)):
-                    # Выделить рекомендации по закупкам
-                    if col_num == len(df_results.columns) - 1:  # Последняя колонка - рекомендации
-                        cell_format = self.format_highlight
-                    else:
-                        cell_format = self.format_number
-                elif isinstance(value, datetime):
-                    cell_format = self.format_date
-                else:
-                    cell_format = self.format_normal
-
-                worksheet.write(start_row + 1 + row_num, col_num, value, cell_format)
+        # Записать заголовки и данные; последняя колонка - рекомендации, числа в ней выделяются
+        last_column = df_results.columns[-1] if len(df_results.columns) else None
+        highlight = {}
+        if last_column is not None and pd.api.types.is_numeric_dtype(df_results[last_column]):
+            highlight[last_column] = self.format_highlight
+        self._write_table(worksheet, df_results, start_row, column_formats=highlight)
 
         # Настройка ширины колонок
         for col_num in range(len(df_results.columns)):
@@ -220,6 +213,17 @@ class ExcelExporter:
         # Заморозить первую строку таблицы
         worksheet.freeze_panes(start_row + 1, 0)
 
+    def _write_table(self, worksheet, df: pd.DataFrame, start_row: int, column_formats: Optional[dict] = None):
+        """Записать заголовки и данные таблицы в фирменных форматах (см. excel_writer.write_table)"""
+        write_table(
+            worksheet, df, start_row=start_row,
+            header_format=self.format_header,
+            number_format=self.format_number,
+            date_format=self.format_date,
+            text_format=self.format_normal,
+            column_formats=column_formats
+        )
+
     def add_simple_data_sheet(self, df: pd.DataFrame, sheet_name: str):
         """
         Добавить простую вкладку с таблицей данных (без текстовых пояснений).
@@ -238,30 +242,12 @@ class ExcelExporter:
         # Таблица с данными начинается с 5 строки
         start_row = 4
 
-        # Записать заголовки колонок
-        for col_num, column in enumerate(df.columns):
-            worksheet.write(start_row, col_num, str(column), self.format_header)
-            # Автоматическая ширина колонок
-            max_length = max(
-                len(str(column)),
-                df[column].astype(str).str.len().max() if len(df) > 0 else 10
-            )
-            worksheet.set_column(col_num, col_num, min(max_length + 2, 40))
-
-        # Записать данные
-        for row_num, row_data in enumerate(df.values):
-            for col_num, value in enumerate(row_data):
-                # Определить формат ячейки
-                if pd.isna(value):
-                    cell_format = self.format_normal
-                elif isinstance(value, (int, float)):
-                    cell_format = self.format_number
-                elif isinstance(value, datetime):
-                    cell_format = self.format_date
-                else:
-                    cell_format = self.format_normal
-
-                worksheet.write(start_row + 1 + row_num, col_num, value, cell_format)
+        # Автоматическая ширина колонок (по выборке строк)
+        for col_num, width in enumerate(estimate_column_widths(df)):
+            worksheet.set_column(col_num, col_num, width)
+
+        # Записать заголовки колонок и данные
+        self._write_table(worksheet, df, start_row)
 
         # Заморозить первую строку таблицы и первые 2 колонки (обычно Дата и Материал)
         worksheet.freeze_panes(start_row + 1, 2)
@@ -641,6 +627,61 @@ class ExcelExporter:
         # Настройка ширины колонок
         worksheet.set_column(0, 0, 100)
 
+    def add_index_sheet(self, entries: List[dict], split_by: Optional[str] = None,
+                        explanations: Optional[dict] = None):
+        """
+        Добавить вкладку-оглавление: где лежит каждая часть каждой таблицы.
+
+        Args:
+            entries: Части таблиц - словари с ключами table, part, parts, file, sheet,
+                rows, first, last (file=None - часть в этой же книге)
+            split_by: Колонка, по которой делились таблицы (для подписи диапазона)
+            explanations: Пояснения к таблицам {таблица: текст}, если таблица
+                не поместилась на вкладку с пояснениями
+        """
+        worksheet = self.workbook.add_worksheet(INDEX_SHEET_NAME)
+
+        worksheet.write('A1', 'ОГЛАВЛЕНИЕ', self.format_title)
+        worksheet.write('A2', f'Дата формирования: {datetime.now().strftime("%d.%m.%Y %H:%M")}', self.format_normal)
+        worksheet.write('A3', f'Лист Excel вмещает не более {EXCEL_MAX_ROWS:,} строк, '
+                              f'поэтому большие таблицы разделены на части'.replace(',', ' '), self.format_normal)
+
+        group_label = split_by or 'Группа'
+        headers = ['Таблица', 'Часть', 'Файл', 'Вкладка', 'Строк', f'{group_label} (с)', f'{group_label} (по)']
+        start_row = 4
+        for col_num, header in enumerate(headers):
+            worksheet.write_string(start_row, col_num, header, self.format_header)
+
+        row = start_row + 1
+        for entry in entries:
+            worksheet.write_string(row, 0, entry['table'], self.format_normal)
+            worksheet.write_string(row, 1, f"{entry['part']} из {entry['parts']}", self.format_normal)
+            if entry['file']:
+                worksheet.write_url(row, 2, f"external:{entry['file']}#'{entry['sheet']}'!A1",
+                                    string=entry['file'])
+            else:
+                worksheet.write_url(row, 2, f"internal:'{entry['sheet']}'!A1", string='(эта книга)')
+            worksheet.write_string(row, 3, entry['sheet'], self.format_normal)
+            worksheet.write_number(row, 4, entry['rows'], self.format_number)
+            for col_num, key in ((5, 'first'), (6, 'last')):
+                value = entry.get(key)
+                worksheet.write_string(row, col_num, '' if value is None or pd.isna(value) else str(value),
+                                       self.format_normal)
+            row += 1
+
+        for table, explanation in (explanations or {}).items():
+            row += 1
+            worksheet.write(row, 0, f'ОБЪЯСНЕНИЕ РАСЧЕТОВ ({table}):', self.format_subtitle)
+            row += 1
+            for line in explanation.split('\n'):
+                if line.strip():
+                    worksheet.write(row, 0, line, self.format_normal)
+                    row += 1
+
+        for col_num, width in enumerate([22, 10, 40, 30, 12, 20, 20]):
+            worksheet.set_column(col_num, col_num, width)
+        worksheet.freeze_panes(start_row + 1, 0)
+
     def close(self):
         """Закрыть и сохранить файл"""
         try:
@@ -651,12 +692,123 @@ class ExcelExporter:
             return False
 
 
+def _explanation_rows(explanation: Optional[str]) -> int:
+    """Сколько строк вкладки с пояснениями занято текстом сверх шапки простой вкладки"""
+    if not explanation:
+        return 0
+    return sum(1 for line in explanation.split('\n') if line.strip()) + 4
+
+
+def _shard_file_path(file_path: str, slug: str, part: int) -> str:
+    """Путь к книге с частью таблицы: <имя>_<таблица>_<номер части>.xlsx рядом с основной"""
+    stem, ext = os.path.splitext(file_path)
+    return f"{stem}_{slug}_{part:02d}{ext or '.xlsx'}"
+
+
+def _write_shard(path: str, df: pd.DataFrame, positions, sheet_name: str) -> str:
+    """Записать одну часть таблицы в отдельную книгу (срез создается внутри потока)"""
+    exporter = ExcelExporter(path)
+    exporter.add_simple_data_sheet(df.iloc[positions], sheet_name)
+    if not exporter.close():
+        raise OSError(f"Не удалось сохранить часть отчета: {path}")
+    return path
+
+
+def export_report_files(
+    file_path: str,
+    df_historical: Optional[pd.DataFrame] = None,
+    explanation_historical: Optional[str] = None,
+    df_forecast: Optional[pd.DataFrame] = None,
+    explanation_forecast: Optional[str] = None,
+    max_rows_per_sheet: int = SHEET_ROW_BUDGET,
+    split_by: Optional[str] = None,
+    max_workers: Optional[int] = None
+) -> List[str]:
+    """
+    Экспортировать отчет в Excel с разделением больших таблиц на части.
+
+    Таблицы, которые помещаются на лист, пишутся в основную книгу как раньше.
+    Таблица длиннее max_rows_per_sheet делится plan_shards (по бюджету строк или
+    целыми группами split_by), каждая часть пишется в свою книгу рядом с основной
+    в пуле потоков, а основная книга получает вкладку "Оглавление".
+
+    Args:
+        file_path: Путь к основному файлу
+        df_historical: DataFrame с историческим анализом
+        explanation_historical: Объяснение исторического анализа (None = только таблица)
+        df_forecast: DataFrame с прогнозом
+        explanation_forecast: Объяснение прогноза (None = только таблица)
+        max_rows_per_sheet: Максимум строк данных на одной вкладке
+        split_by: Колонка для деления целыми группами (например, филиал)
+        max_workers: Число потоков записи частей (None = по умолчанию ThreadPoolExecutor)
+
+    Returns:
+        list: Пути всех записанных книг (основная - первая)
+    """
+    tables = [
+        ('Исторический анализ', 'Исторический_анализ', df_historical, explanation_historical),
+        ('Прогноз и закупки', 'Прогноз_закупки', df_forecast, explanation_forecast),
+    ]
+    inline = []
+    sharded = []
+    for title, slug, df, explanation in tables:
+        if df is None:
+            continue
+        if len(df) <= max_rows_per_sheet - _explanation_rows(explanation):
+            inline.append((title, df, explanation))
+        else:
+            sharded.append((title, slug, df, explanation, plan_shards(df, max_rows_per_sheet, split_by)))
+
+    exporter = ExcelExporter(file_path)
+
+    shard_jobs = []
+    if sharded:
+        entries = []
+        for title, df, explanation in inline:
+            sheet = EXPLAINED_SHEET_NAMES[title] if explanation else title
+            entries.append({'table': title, 'part': 1, 'parts': 1, 'file': None, 'sheet': sheet,
+                            'rows': len(df), 'first': None, 'last': None})
+        for title, slug, df, explanation, shards in sharded:
+            for part, shard in enumerate(shards, start=1):
+                path = _shard_file_path(file_path, slug, part)
+                sheet = f'{title} {part}'
+                shard_jobs.append((path, df, shard['positions'], sheet))
+                entries.append({'table': title, 'part': part, 'parts': len(shards),
+                                'file': os.path.basename(path), 'sheet': sheet,
+                                'rows': len(shard['positions']), 'first': shard['first'], 'last': shard['last']})
+        explanations = {title: explanation for title, _, _, explanation, _ in sharded if explanation}
+        exporter.add_index_sheet(entries, split_by, explanations)
+
+    for title, df, explanation in inline:
+        if explanation:
+            # Старый формат с пояснениями
+            if title == 'Исторический анализ':
+                exporter.add_historical_analysis_sheet(df, explanation)
+            else:
+                exporter.add_forecast_analysis_sheet(df, explanation)
+        else:
+            # Только таблица с данными
+            exporter.add_simple_data_sheet(df, title)
+
+    # Части пишутся в отдельные книги параллельно с основной
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_write_shard, *job) for job in shard_jobs]
+        if not exporter.close():
+            raise OSError(f"Не удалось сохранить файл: {file_path}")
+        shard_paths = [future.result() for future in futures]
+
+    return [file_path] + shard_paths
+
+
 def export_full_report(
     file_path: str,
     df_historical: Optional[pd.DataFrame] = None,
     explanation_historical: Optional[str] = None,
     df_forecast: Optional[pd.DataFrame] = None,
-    explanation_forecast: Optional[str] = None
+    explanation_forecast: Optional[str] = None,
+    max_rows_per_sheet: int = SHEET_ROW_BUDGET,
+    split_by: Optional[str] = None,
+    max_workers: Optional[int] = None
 ) -> bool:
     """
     Экспортировать полный отчет в Excel.
@@ -667,32 +819,18 @@ def export_full_report(
         explanation_historical: Объяснение исторического анализа (None = только таблица)
         df_forecast: DataFrame с прогнозом
         explanation_forecast: Объяснение прогноза (None = только таблица)
+        max_rows_per_sheet, split_by, max_workers: Разделение больших таблиц
+            (см. export_report_files)
 
     Returns:
         bool: True если успешно, False если ошибка
     """
     try:
-        exporter = ExcelExporter(file_path)
-
-        # Добавить вкладки с таблицами (без текстовых пояснений)
-        if df_historical is not None:
-            if explanation_historical:
-                # Старый формат с пояснениями
-                exporter.add_historical_analysis_sheet(df_historical, explanation_historical)
-            else:
-                # Только таблица с данными
-                exporter.add_simple_data_sheet(df_historical, "Исторический анализ")
-
-        if df_forecast is not None:
-            if explanation_forecast:
-                # Старый формат с пояснениями
-                exporter.add_forecast_analysis_sheet(df_forecast, explanation_forecast)
-            else:
-                # Только таблица с данными
-                exporter.add_simple_data_sheet(df_forecast, "Прогноз и закупки")
-
-        # Сохранить файл
-        return exporter.close()
+        export_report_files(
+            file_path, df_historical, explanation_historical, df_forecast, explanation_forecast,
+            max_rows_per_sheet=max_rows_per_sheet, split_by=split_by, max_workers=max_workers
+        )
+        return True
 
     except Exception as e:
         print(f"Ошибка при экспорте: {e}")
@@ -1,13 +1,16 @@
 """
 Модуль валидации входных файлов для desktop приложения.
 
-Проверяет корректность структуры Excel файлов и выявляет
+Проверяет корректность структуры входных файлов (Excel, Parquet,
+Feather/Arrow, CSV) и выявляет
 отсутствующие колонки или некорректные данные.
 """
 
 import pandas as pd
 from typing import Tuple, Dict, List
 
+from src.utils.data_loading import get_dataset
+
 
 class ValidationResult:
     """Результат валидации файла"""
@@ -37,7 +40,7 @@ class ValidationResult:
 
 def validate_excel_file(file_path: str) -> ValidationResult:
     """
-    Базовая валидация Excel файла.
+    Базовая валидация входного файла (Excel, Parquet, Feather/Arrow, CSV).
 
     Args:
         file_path: Путь к файлу
@@ -50,7 +53,7 @@ def validate_excel_file(file_path: str) -> ValidationResult:
 
     try:
         # Попытка прочитать файл
-        df = pd.read_excel(file_path)
+        df = get_dataset(file_path).frame(categorical=False, copy=False)
 
         # Проверка на пустоту
         if df.empty:
@@ -106,7 +109,7 @@ def validate_historical_data(file_path: str) -> ValidationResult:
     warnings = []
 
     try:
-        df = pd.read_excel(file_path)
+        df = get_dataset(file_path).frame(categorical=False, copy=False)
         columns = [str(col).strip().lower() for col in df.columns]
 
         # Ожидаемые типы колонок
@@ -207,7 +210,7 @@ def validate_forecast_data(file_path: str) -> ValidationResult:
     warnings = []
 
     try:
-        df = pd.read_excel(file_path)
+        df = get_dataset(file_path).frame(categorical=False, copy=False)
         columns = [str(col).strip().lower() for col in df.columns]
 
         # Ожидаемые типы колонок
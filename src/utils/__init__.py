@@ -1,8 +1,9 @@
 """Utility modules"""
-from .data_validation import normalize_consumption, detect_consumption_convention
+from .data_validation import normalize_consumption, normalized_consumption_column, detect_consumption_convention
 
 # to_excel и to_csv не экспортируются по умолчанию, так как они могут использоваться отдельно
 __all__ = [
     'normalize_consumption',
+    'normalized_consumption_column',
     'detect_consumption_convention',
 ]
@@ -0,0 +1,390 @@
+"""
+Загрузка входных таблиц: Excel, Parquet, Feather/Arrow и CSV.
+
+Excel читается медленно и не подходит для выгрузок ERP на миллионы строк,
+поэтому поддерживаются колоночные форматы (Parquet, Feather/Arrow IPC) и CSV
+с явными типами колонок. Для всех форматов:
+- сначала читается только заголовок, колонки определяются через
+  auto_detect_columns (src.utils.utils);
+- при columns='auto' загружаются только найденные колонки (проекция);
+- колонки материала и филиала приводятся к категориальному типу.
+
+get_dataset кэширует прочитанный файл по пути и времени изменения, чтобы
+валидация и анализ не разбирали один и тот же файл несколько раз; анализ
+забирает таблицу из кэша (LoadedDataset.take), не копируя ее.
+
+Для Parquet и Feather нужен pyarrow.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+from src.utils.utils import auto_detect_columns
+
+
+# Расширение файла -> формат
+FILE_FORMATS = {
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+    '.csv': 'csv',
+}
+
+# Типы для st.file_uploader и фильтр для диалогов выбора файла
+UPLOAD_TYPES = [extension.lstrip('.') for extension in FILE_FORMATS]
+FILE_DIALOG_FILTER = "Данные (*.xlsx *.xls *.parquet *.pq *.feather *.arrow *.csv);;Excel Files (*.xlsx *.xls)"
+
+# Роли колонок (ключи auto_detect_columns) и типы для CSV
+CATEGORICAL_ROLES = ('material', 'branch')
+NUMERIC_ROLES = ('start_quantity', 'end_quantity', 'consumption', 'arrival', 'end_cost', 'planned_demand')
+DATE_ROLES = ('date',)
+
+# Без этих ролей проекция не выполняется: для ненайденных колонок анализ берет колонку по позиции
+REQUIRED_ROLES = ('date', 'material', 'start_quantity', 'end_quantity')
+
+
+def detect_file_format(source):
+    """
+    Формат файла по расширению ('excel', 'parquet', 'feather', 'csv').
+
+    source - путь или файловый объект с атрибутом name (например, загрузка Streamlit).
+    """
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+    extension = os.path.splitext(str(name))[1].lower()
+    if extension not in FILE_FORMATS:
+        raise ValueError(
+            f"Неподдерживаемый формат файла: '{extension}'. "
+            f"Поддерживаются: {', '.join(sorted(FILE_FORMATS))}"
+        )
+    return FILE_FORMATS[extension]
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def read_header(source):
+    """Список колонок файла без чтения данных"""
+    file_format = detect_file_format(source)
+    try:
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            return list(pq.read_schema(source).names)
+        if file_format == 'feather':
+            import pyarrow.ipc as ipc
+            try:
+                return list(ipc.open_file(source).schema.names)
+            except Exception:
+                _rewind(source)
+                return list(ipc.open_stream(source).schema.names)
+        if file_format == 'csv':
+            return list(pd.read_csv(source, nrows=0).columns)
+        return list(pd.read_excel(source, nrows=0).columns)
+    finally:
+        _rewind(source)
+
+
+def detect_file_columns(source):
+    """auto_detect_columns по заголовку файла (без чтения данных)"""
+    return auto_detect_columns(pd.DataFrame(columns=read_header(source)))
+
+
+def _resolve_columns(columns, detected, header):
+    """Список колонок для проекции; None - все колонки"""
+    if columns is None:
+        return None
+    if isinstance(columns, str) and columns == 'auto':
+        if not all(role in detected for role in REQUIRED_ROLES):
+            return None
+        selected = set(detected.values())
+        # Сохраняем порядок колонок файла
+        return [col for col in header if col in selected]
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise KeyError(f"Колонки не найдены в файле: {missing}")
+    return [col for col in header if col in set(columns)]
+
+
+def _csv_dtypes(detected, columns):
+    """Явные типы CSV по ролям колонок"""
+    dtypes = {}
+    parse_dates = []
+    for role, col in detected.items():
+        if columns is not None and col not in columns:
+            continue
+        if role in CATEGORICAL_ROLES:
+            dtypes[col] = 'category'
+        elif role in NUMERIC_ROLES:
+            dtypes[col] = 'float64'
+        elif role in DATE_ROLES:
+            parse_dates.append(col)
+    return dtypes, parse_dates
+
+
+def _to_sorted_categorical(values):
+    """
+    Категориальная колонка с отсортированными категориями: группировка по ней
+    дает тот же порядок групп, что и по исходным строкам.
+    """
+    if not isinstance(values.dtype, CategoricalDtype):
+        return values.astype('category')
+    try:
+        return values.cat.reorder_categories(sorted(values.cat.categories))
+    except TypeError:
+        # Несравнимые типы категорий - оставляем как есть
+        return values
+
+
+def load_table(source, columns=None, categorical=True, dtypes=None):
+    """
+    Загружает таблицу из Excel, Parquet, Feather/Arrow или CSV.
+
+    Parameters:
+    -----------
+    source : str, Path or file-like
+        Путь к файлу или файловый объект с атрибутом name
+    columns : list, 'auto' or None
+        Проекция: список колонок, 'auto' - только колонки, найденные
+        auto_detect_columns (если найдены все REQUIRED_ROLES), None - все колонки
+    categorical : bool
+        Привести колонки материала и филиала к категориальному типу
+    dtypes : dict, optional
+        Явные типы колонок CSV (дополняют типы по ролям)
+
+    Returns:
+    --------
+    pd.DataFrame
+    """
+    file_format = detect_file_format(source)
+    header = read_header(source)
+    detected = auto_detect_columns(pd.DataFrame(columns=header))
+    usecols = _resolve_columns(columns, detected, header)
+
+    if file_format == 'parquet':
+        df = pd.read_parquet(source, columns=usecols)
+    elif file_format == 'feather':
+        df = pd.read_feather(source, columns=usecols)
+    elif file_format == 'csv':
+        csv_dtypes, parse_dates = _csv_dtypes(detected, usecols)
+        if not categorical:
+            csv_dtypes = {col: dtype for col, dtype in csv_dtypes.items() if dtype != 'category'}
+        csv_dtypes.update(dtypes or {})
+        try:
+            df = pd.read_csv(source, usecols=usecols, dtype=csv_dtypes, parse_dates=parse_dates)
+        except ValueError:
+            # Колонка, найденная по ключевому слову, оказалась нечисловой - читаем без числовых типов
+            _rewind(source)
+            csv_dtypes = {col: dtype for col, dtype in csv_dtypes.items() if dtype != 'float64'}
+            csv_dtypes.update(dtypes or {})
+            df = pd.read_csv(source, usecols=usecols, dtype=csv_dtypes, parse_dates=parse_dates)
+    else:
+        df = pd.read_excel(source, usecols=usecols)
+
+    if categorical:
+        for role in CATEGORICAL_ROLES:
+            col = detected.get(role)
+            if col is not None and col in df.columns:
+                df[col] = _to_sorted_categorical(df[col])
+
+    return df
+
+
+def iter_table_chunks(source, columns=None, chunk_rows=500_000):
+    """
+    Читает файл по частям, не загружая его целиком.
+
+    Parquet читается пачками из row groups, Feather/Arrow - record batches,
+    CSV - блоками по chunk_rows строк (с явными типами по ролям колонок).
+    Категориальные типы не применяются: категории разных частей не совпадают.
+
+    Parameters:
+    -----------
+    source : str, Path or file-like
+        Путь к файлу или файловый объект с атрибутом name
+    columns : list, 'auto' or None
+        Проекция колонок (см. load_table)
+    chunk_rows : int
+        Примерное число строк в части
+
+    Yields:
+    -------
+    pd.DataFrame: очередная часть таблицы
+    """
+    file_format = detect_file_format(source)
+    header = read_header(source)
+    detected = auto_detect_columns(pd.DataFrame(columns=header))
+    usecols = _resolve_columns(columns, detected, header)
+
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=usecols):
+            yield batch.to_pandas()
+    elif file_format == 'feather':
+        import pyarrow.ipc as ipc
+        reader = ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield (batch.select(usecols) if usecols is not None else batch).to_pandas()
+    elif file_format == 'csv':
+        csv_dtypes, parse_dates = _csv_dtypes(detected, usecols)
+        csv_dtypes = {col: dtype for col, dtype in csv_dtypes.items() if dtype != 'category'}
+        yield from pd.read_csv(source, usecols=usecols, dtype=csv_dtypes, parse_dates=parse_dates,
+                               chunksize=chunk_rows)
+    else:
+        raise ValueError("Потоковое чтение Excel не поддерживается - используйте Parquet, Feather или CSV")
+
+
+# ============================================================================
+# КЭШ ЗАГРУЖЕННЫХ ФАЙЛОВ
+# ============================================================================
+
+# Сколько последних файлов держать в памяти (исторический + прогнозный); анализ
+# забирает свои файлы из кэша (LoadedDataset.take), здесь остаются только проверенные файлы
+MAX_CACHED_DATASETS = 2
+
+_dataset_cache = OrderedDict()
+_dataset_cache_lock = threading.Lock()
+
+
+def _file_signature(path):
+    """(mtime, size) файла - при изменении файла кэш считается устаревшим"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LoadedDataset:
+    """
+    Файл, прочитанный один раз и общий для валидации и анализа.
+
+    Хранит заголовок, результат auto_detect_columns и одну загруженную
+    таблицу. Проекции и вариант с другим типом колонок материала/филиала
+    строятся из нее без повторного чтения файла; категориальный вариант
+    заменяет исходную таблицу (он компактнее), а не хранится рядом с ней.
+
+    Parameters:
+    -----------
+    path : str or Path
+        Путь к файлу
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(str(path))
+        self.signature = _file_signature(self.path)
+        self.header = read_header(self.path)
+        self.detected = auto_detect_columns(pd.DataFrame(columns=self.header))
+        self._frame = None
+        self._frame_columns = None
+        self._lock = threading.Lock()
+
+    def is_current(self):
+        """Файл не изменился с момента загрузки"""
+        try:
+            return _file_signature(self.path) == self.signature
+        except OSError:
+            return False
+
+    def frame(self, columns=None, categorical=True, copy=True):
+        """
+        Таблица файла (см. load_table).
+
+        copy=False возвращает таблицу без копирования - только для чтения
+        (валидация); анализ изменяет таблицу, поэтому по умолчанию копия
+        (или take, если файл больше не нужен в кэше).
+        """
+        usecols = _resolve_columns(columns, self.detected, self.header)
+        with self._lock:
+            df = self._view(usecols, categorical)
+        return df.copy() if copy else df
+
+    def take(self, columns=None, categorical=True):
+        """
+        Таблица для анализа без копирования: набор убирается из кэша get_dataset,
+        и память освобождается, как только анализ перестает ссылаться на таблицу.
+        """
+        usecols = _resolve_columns(columns, self.detected, self.header)
+        with self._lock:
+            df = self._view(usecols, categorical)
+            self._frame = None
+            self._frame_columns = None
+        release_dataset(self.path)
+        return df
+
+    def _view(self, usecols, categorical):
+        """Таблица нужного вида из загруженной (при нехватке колонок файл читается заново)"""
+        loaded = self._frame_columns
+        if self._frame is None or (loaded is not None and (usecols is None or not set(usecols) <= set(loaded))):
+            self._frame = load_table(self.path, columns=usecols, categorical=categorical)
+            self._frame_columns = usecols
+
+        if categorical and not self._is_categorical(self._frame):
+            # Категориальный вариант заменяет исходную таблицу - в памяти остается одна
+            self._frame = self._convert_categorical(self._frame.copy(deep=False), True)
+
+        df = self._frame
+        if usecols is not None and list(df.columns) != list(usecols):
+            df = df[usecols]
+        if not categorical and self._is_categorical(df):
+            df = self._convert_categorical(df.copy(deep=False), False)
+        return df
+
+    def _is_categorical(self, df):
+        return any(
+            isinstance(df[col].dtype, CategoricalDtype)
+            for col in (self.detected.get(role) for role in CATEGORICAL_ROLES)
+            if col is not None and col in df.columns
+        )
+
+    def _convert_categorical(self, df, categorical):
+        for role in CATEGORICAL_ROLES:
+            col = self.detected.get(role)
+            if col is None or col not in df.columns:
+                continue
+            is_categorical = isinstance(df[col].dtype, CategoricalDtype)
+            if categorical and not is_categorical:
+                df[col] = _to_sorted_categorical(df[col])
+            elif not categorical and is_categorical:
+                df[col] = df[col].astype(object)
+        return df
+
+
+def get_dataset(path):
+    """
+    LoadedDataset для файла из кэша по пути и времени изменения.
+
+    Повторный вызов для неизмененного файла не читает его заново.
+    """
+    key = os.path.abspath(str(path))
+    with _dataset_cache_lock:
+        dataset = _dataset_cache.get(key)
+        if dataset is not None and dataset.is_current():
+            _dataset_cache.move_to_end(key)
+            return dataset
+
+    dataset = LoadedDataset(key)
+    with _dataset_cache_lock:
+        _dataset_cache[key] = dataset
+        _dataset_cache.move_to_end(key)
+        while len(_dataset_cache) > MAX_CACHED_DATASETS:
+            _dataset_cache.popitem(last=False)
+    return dataset
+
+
+def release_dataset(path):
+    """Убирает файл из кэша get_dataset"""
+    with _dataset_cache_lock:
+        _dataset_cache.pop(os.path.abspath(str(path)), None)
+
+
+def clear_dataset_cache():
+    """Освобождает память, занятую загруженными файлами"""
+    with _dataset_cache_lock:
+        _dataset_cache.clear()
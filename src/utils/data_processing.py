@@ -1,24 +1,11 @@
 import pandas as pd
-import xlsxwriter
 from io import BytesIO
 
+from src.utils.excel_writer import dataframe_to_xlsx
+
 def to_excel(df):
+    """DataFrame -> xlsx в BytesIO (построчная запись в режиме constant_memory)"""
     output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet()
-
-    # Записываем заголовки
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(0, col_num, value)
-
-    # Записываем данные
-    for row_num, row in enumerate(df.values):
-        for col_num, value in enumerate(row):
-            if isinstance(value, str):
-                worksheet.write(row_num + 1, col_num, value)
-            else:
-                worksheet.write(row_num + 1, col_num, value)
-
-    workbook.close()
+    dataframe_to_xlsx(output, df)
     output.seek(0)
-    return output
\ No newline at end of file
+    return output
@@ -121,12 +121,14 @@ def detect_consumption_convention(df, consumption_column, start_column, end_colu
         result['recommendation'] = "Колонка списания не найдена"
         return result
 
-    consumption = df[consumption_column]
+    consumption = df[consumption_column].to_numpy(dtype=np.float64, na_value=np.nan)
 
-    # Подсчет знаков
-    result['negative_count'] = (consumption < 0).sum()
-    result['positive_count'] = (consumption > 0).sum()
-    result['zero_count'] = (consumption == 0).sum()
+    # Подсчет знаков за один проход: bincount по знаку (-1, 0, 1), пропуски не считаются
+    signs = np.sign(consumption[~np.isnan(consumption)]).astype(np.int64) + 1
+    negative_count, zero_count, positive_count = np.bincount(signs, minlength=3)
+    result['negative_count'] = negative_count
+    result['positive_count'] = positive_count
+    result['zero_count'] = zero_count
 
     total = len(consumption)
     negative_pct = result['negative_count'] / total * 100 if total > 0 else 0
@@ -134,17 +136,18 @@ def detect_consumption_convention(df, consumption_column, start_column, end_colu
 
     # Проверка баланса если есть все необходимые колонки
     if arrival_column and arrival_column in df.columns:
-        # Баланс: начало + приход - списание = конец
+        # Баланс: начало + приход - списание = конец.
+        # Общая часть обеих проверок: начало + приход - конец = ±списание
+        def values(column):
+            return df[column].to_numpy(dtype=np.float64, na_value=np.nan)
 
-        # Тест 1: списание как положительное число
-        calculated_end_pos = df[start_column] + df[arrival_column] - df[consumption_column]
-        balance_pos = np.abs(calculated_end_pos - df[end_column]) < 0.01
-        result['balance_check_positive'] = balance_pos.sum()
+        residual = values(start_column) + values(arrival_column) - values(end_column)
 
-        # Тест 2: списание как отрицательное число (нужно ПРИБАВИТЬ)
-        calculated_end_neg = df[start_column] + df[arrival_column] + df[consumption_column]  # + потому что consumption уже отрицательное
-        balance_neg = np.abs(calculated_end_neg - df[end_column]) < 0.01
-        result['balance_check_negative'] = balance_neg.sum()
+        with np.errstate(invalid='ignore'):
+            # Тест 1: списание как положительное число
+            result['balance_check_positive'] = np.count_nonzero(np.abs(residual - consumption) < 0.01)
+            # Тест 2: списание как отрицательное число (нужно ПРИБАВИТЬ)
+            result['balance_check_negative'] = np.count_nonzero(np.abs(residual + consumption) < 0.01)
 
         # Определяем конвенцию по балансу
         if result['balance_check_positive'] > result['balance_check_negative']:
@@ -187,7 +190,8 @@ def detect_consumption_convention(df, consumption_column, start_column, end_colu
     return result
 
 
-def normalize_consumption(df, consumption_column, convention='AUTO', start_column=None, end_column=None, arrival_column=None):
+def normalize_consumption(df, consumption_column, convention='AUTO', start_column=None, end_column=None,
+                          arrival_column=None, inplace=False):
     """
     Нормализует колонку списания к единой конвенции:
     - ВСЕГДА возвращает ПОЛОЖИТЕЛЬНЫЕ значения (расход = положительное число)
@@ -199,57 +203,73 @@ def normalize_consumption(df, consumption_column, convention='AUTO', start_colum
         'POSITIVE' - данные уже в правильном формате
         'NEGATIVE' - данные в отрицательном формате, нужно инвертировать
         'ABS' - просто взять модуль всех значений
+    inplace : bool
+        True - заменить колонку в df без копирования таблицы (df и возвращается);
+        False - вернуть копию df (по умолчанию)
     """
+    normalized, detection = normalized_consumption_column(
+        df, consumption_column, convention, start_column, end_column, arrival_column
+    )
 
+    df_normalized = df if inplace else df.copy()
+    df_normalized[consumption_column] = normalized
+    return df_normalized, detection
+
+
+def normalized_consumption_column(df, consumption_column, convention='AUTO', start_column=None, end_column=None,
+                                  arrival_column=None):
+    """
+    Нормализованная колонка списания без копирования таблицы (см. normalize_consumption).
+
+    Returns:
+    --------
+    tuple: (pd.Series с положительным списанием, detection dict)
+    """
     if consumption_column not in df.columns:
         raise ValueError(f"Колонка '{consumption_column}' не найдена в данных")
 
-    df_normalized = df.copy()
-
     if convention == 'AUTO':
         # Автоматическое определение
         detection = detect_consumption_convention(df, consumption_column, start_column, end_column, arrival_column)
 
-        if detection['convention'] in ['NEGATIVE', 'MOSTLY_NEGATIVE']:
-            # Инвертируем отрицательные значения
-            df_normalized[consumption_column] = df_normalized[consumption_column].abs()
-            return df_normalized, detection
-        elif detection['convention'] in ['POSITIVE', 'MOSTLY_POSITIVE']:
-            # Уже в правильном формате, но применим abs для безопасности
-            df_normalized[consumption_column] = df_normalized[consumption_column].abs()
-            return df_normalized, detection
-        elif detection['convention'] == 'MIXED':
+        if detection['convention'] == 'MIXED':
             # Смешанные данные - берем модуль
-            df_normalized[consumption_column] = df_normalized[consumption_column].abs()
             detection['recommendation'] += " → Применен модуль ко всем значениям"
-            return df_normalized, detection
-        else:
+        elif detection['convention'] not in ['NEGATIVE', 'MOSTLY_NEGATIVE', 'POSITIVE', 'MOSTLY_POSITIVE']:
             # Не удалось определить - берем модуль
-            df_normalized[consumption_column] = df_normalized[consumption_column].abs()
             detection['recommendation'] = "Конвенция неясна → Применен модуль"
-            return df_normalized, detection
 
     elif convention == 'NEGATIVE':
         # Принудительная инверсия
-        df_normalized[consumption_column] = df_normalized[consumption_column].abs()
         detection = {'convention': 'NEGATIVE', 'recommendation': 'Принудительная инверсия (abs)', 'confidence': 100.0}
-        return df_normalized, detection
 
     elif convention == 'POSITIVE':
         # Уже положительные, но на всякий случай применим abs к отрицательным
-        df_normalized[consumption_column] = df_normalized[consumption_column].abs()
         detection = {'convention': 'POSITIVE', 'recommendation': 'Применен abs для безопасности', 'confidence': 100.0}
-        return df_normalized, detection
 
     elif convention == 'ABS':
         # Просто модуль
-        df_normalized[consumption_column] = df_normalized[consumption_column].abs()
         detection = {'convention': 'ABS', 'recommendation': 'Применен модуль ко всем значениям', 'confidence': 100.0}
-        return df_normalized, detection
 
     else:
         raise ValueError(f"Неизвестная конвенция: {convention}")
 
+    # При любой конвенции результат - модуль: отрицательное списание инвертируется,
+    # положительное не меняется
+    return df[consumption_column].abs(), detection
+
+
+def explicit_convention(detection):
+    """
+    Явная конвенция normalize_consumption по результату определения ('AUTO'):
+    передается в следующие вызовы, чтобы части одних данных нормализовались одинаково.
+    """
+    if detection['convention'] in ('NEGATIVE', 'MOSTLY_NEGATIVE'):
+        return 'NEGATIVE'
+    if detection['convention'] in ('POSITIVE', 'MOSTLY_POSITIVE'):
+        return 'POSITIVE'
+    return 'ABS'
+
 
 def validate_balance(df, date_column, material_column, branch_column,
                      start_column, end_column, arrival_column, consumption_column):
@@ -0,0 +1,265 @@
+"""
+Быстрая запись DataFrame в лист xlsxwriter.
+
+Вместо проверки типа каждой ячейки (isinstance/pd.isna в двойном цикле)
+тип, формат и пропуски определяются один раз на колонку векторно, значения
+переводятся в списки Python, а в цикле по строкам вызывается заранее
+выбранный метод листа (write_number / write_string / write_datetime ...).
+
+Строки пишутся строго по порядку, поэтому запись совместима с режимом
+xlsxwriter constant_memory: строка сбрасывается на диск сразу после записи,
+и память не растет с числом строк.
+
+Ширина колонок оценивается по выборке строк (estimate_column_widths),
+а не по строковому представлению всей колонки.
+
+Таблицы длиннее листа Excel (EXCEL_MAX_ROWS) делятся на части по бюджету
+строк, при необходимости целыми группами (например, филиалами) - plan_shards.
+"""
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from datetime import datetime
+from pandas.api.types import (
+    is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype, is_string_dtype, CategoricalDtype
+)
+
+
+# Опции Workbook для больших выгрузок: построчный сброс на диск
+CONSTANT_MEMORY_OPTIONS = {'constant_memory': True}
+
+# Сколько строк просматривать при оценке ширины колонок
+WIDTH_SAMPLE_ROWS = 1000
+
+# Предел строк листа xlsx (включая заголовки)
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _column_kind(series):
+    """Тип колонки: 'number', 'bool', 'datetime', 'string' или 'mixed'"""
+    dtype = series.dtype
+    if isinstance(dtype, CategoricalDtype):
+        return _column_kind(pd.Series(dtype.categories)) if len(dtype.categories) else 'string'
+    if is_bool_dtype(dtype):
+        return 'bool'
+    if is_numeric_dtype(dtype):
+        return 'number'
+    if is_datetime64_any_dtype(dtype):
+        return 'datetime'
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred in ('string', 'empty') or (is_string_dtype(dtype) and inferred != 'mixed'):
+        return 'string'
+    return 'mixed'
+
+
+def _sample_positions(n_rows, sample_rows):
+    """Равномерная выборка позиций строк (включая первую и последнюю)"""
+    if n_rows <= sample_rows:
+        return np.arange(n_rows)
+    return np.unique(np.linspace(0, n_rows - 1, sample_rows).astype(np.int64))
+
+
+def estimate_column_widths(df, sample_rows=WIDTH_SAMPLE_ROWS, padding=2, max_width=40):
+    """
+    Ширина колонок по заголовку и выборке значений.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Таблица
+    sample_rows : int
+        Сколько строк просматривать (равномерно по таблице)
+    padding : int
+        Добавка к длине самого длинного значения
+    max_width : int
+        Максимальная ширина
+
+    Returns:
+    --------
+    list of int: ширина каждой колонки
+    """
+    sample = df.iloc[_sample_positions(len(df), sample_rows)]
+    widths = []
+    for position, column in enumerate(df.columns):
+        values = sample.iloc[:, position]
+        longest = values.astype(str).str.len().max() if len(values) else 10
+        widths.append(int(min(max(len(str(column)), longest) + padding, max_width)))
+    return widths
+
+
+def _mixed_writer(worksheet, number_format, date_format, text_format):
+    """Запись ячейки колонки смешанного типа (формат выбирается по значению)"""
+    def write(row, col, value, _):
+        if isinstance(value, (int, float)):
+            return worksheet.write(row, col, value, number_format)
+        if isinstance(value, datetime):
+            return worksheet.write(row, col, value, date_format)
+        return worksheet.write(row, col, value, text_format)
+    return write
+
+
+def _prepare_column(worksheet, series, cell_format, number_format, date_format, text_format):
+    """
+    (значения, маска пропусков, метод записи, формат) для одной колонки.
+
+    cell_format - явный формат колонки (иначе - по типу колонки).
+    """
+    kind = _column_kind(series)
+    if isinstance(series.dtype, CategoricalDtype):
+        series = series.astype(object)
+    missing = series.isna().to_numpy()
+
+    if kind == 'number':
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        # NaN/inf не поддерживаются форматом xlsx - пишем пустую ячейку
+        missing = missing | ~np.isfinite(values)
+        return values.tolist(), missing.tolist(), worksheet.write_number, cell_format or number_format
+    if kind == 'bool':
+        return series.tolist(), missing.tolist(), worksheet.write_boolean, cell_format or number_format
+    if kind == 'datetime':
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_localize(None)
+        values = [None if is_missing else value.to_pydatetime()
+                  for value, is_missing in zip(series.tolist(), missing.tolist())]
+        return values, missing.tolist(), worksheet.write_datetime, cell_format or date_format
+    if kind == 'string':
+        return series.tolist(), missing.tolist(), worksheet.write_string, cell_format or text_format
+
+    write = _mixed_writer(worksheet, cell_format or number_format, cell_format or date_format,
+                          cell_format or text_format)
+    return series.tolist(), missing.tolist(), write, None
+
+
+def write_table(worksheet, df, start_row=0, start_col=0, header_format=None, number_format=None,
+                date_format=None, text_format=None, column_formats=None, write_header=True):
+    """
+    Записывает DataFrame в лист построчно с подготовкой по колонкам.
+
+    Parameters:
+    -----------
+    worksheet : xlsxwriter.worksheet.Worksheet
+        Лист (может быть в режиме constant_memory)
+    df : pd.DataFrame
+        Таблица
+    start_row, start_col : int
+        Левый верхний угол таблицы (строка заголовка)
+    header_format, number_format, date_format, text_format : xlsxwriter.format.Format, optional
+        Форматы заголовка, чисел, дат и текста/пропусков
+    column_formats : dict, optional
+        Явный формат для отдельных колонок {имя колонки: формат}
+    write_header : bool
+        Записать строку заголовков
+
+    Returns:
+    --------
+    int: номер последней записанной строки
+    """
+    column_formats = column_formats or {}
+    row = start_row
+    if write_header:
+        for offset, column in enumerate(df.columns):
+            worksheet.write_string(row, start_col + offset, str(column), header_format)
+        row += 1
+
+    columns = [
+        _prepare_column(worksheet, df.iloc[:, position], column_formats.get(column),
+                        number_format, date_format, text_format)
+        for position, column in enumerate(df.columns)
+    ]
+    write_blank = worksheet.write_blank
+    n_rows = len(df)
+
+    for i in range(n_rows):
+        col = start_col
+        for values, missing, write, cell_format in columns:
+            if missing[i]:
+                if text_format is not None:
+                    write_blank(row, col, None, text_format)
+            else:
+                write(row, col, values[i], cell_format)
+            col += 1
+        row += 1
+
+    return row - 1
+
+
+def dataframe_to_xlsx(output, df, sheet_name=None, constant_memory=True):
+    """
+    DataFrame -> xlsx-файл с одним листом (заголовок + данные, без оформления).
+
+    output - путь или файловый объект (например, BytesIO).
+    """
+    workbook = xlsxwriter.Workbook(output, CONSTANT_MEMORY_OPTIONS if constant_memory else {})
+    worksheet = workbook.add_worksheet(sheet_name)
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    write_table(worksheet, df, date_format=date_format)
+    workbook.close()
+
+
+def plan_shards(df, max_rows, split_by=None):
+    """
+    Разбиение таблицы на части не длиннее max_rows строк.
+
+    Без split_by таблица режется по порядку строк. С split_by строки
+    группируются по значению колонки (например, филиалу), и группы целиком
+    укладываются в части по порядку значений; группа длиннее max_rows
+    режется на несколько частей только из этой группы.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Таблица
+    max_rows : int
+        Максимум строк данных в одной части
+    split_by : str, optional
+        Колонка группировки (игнорируется, если ее нет в таблице)
+
+    Returns:
+    --------
+    list of dict: для каждой части
+        'positions' - позиции строк (np.ndarray для df.iloc),
+        'first', 'last' - первое и последнее значение split_by в части (или None)
+    """
+    if max_rows < 1:
+        raise ValueError(f"max_rows должен быть положительным: {max_rows}")
+    n_rows = len(df)
+
+    if split_by is None or split_by not in df.columns or n_rows == 0:
+        starts = range(0, n_rows, max_rows) if n_rows else [0]
+        return [{'positions': np.arange(start, min(start + max_rows, n_rows)), 'first': None, 'last': None}
+                for start in starts]
+
+    codes, uniques = pd.factorize(df[split_by], sort=True, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_codes)) + 1))
+    ends = np.append(starts[1:], n_rows)
+
+    shards = []
+    shard_start = shard_rows = 0
+    first_code = last_code = None
+
+    def flush():
+        shards.append({'positions': order[shard_start:shard_start + shard_rows],
+                       'first': uniques[first_code], 'last': uniques[last_code]})
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        code = sorted_codes[start]
+        size = end - start
+        if shard_rows and shard_rows + size > max_rows:
+            flush()
+            shard_rows = 0
+        if size > max_rows:
+            # Группа больше части - режется на куски только из этой группы
+            for chunk_start in range(start, end, max_rows):
+                shards.append({'positions': order[chunk_start:min(chunk_start + max_rows, end)],
+                               'first': uniques[code], 'last': uniques[code]})
+            continue
+        if not shard_rows:
+            shard_start, first_code = start, code
+        shard_rows += size
+        last_code = code
+
+    if shard_rows:
+        flush()
+    return shards
@@ -0,0 +1,380 @@
+"""
+Локальное хранилище истории запасов (SQLite).
+
+Вместо повторного разбора многолетних Excel-файлов при каждом запуске
+история один раз загружается в файл базы, а затем:
+- дополняется только новыми периодами: водяной знак - последняя дата
+  каждой группы материал/филиал, новые группы загружаются целиком (так
+  файлы разных филиалов за одни и те же месяцы не отсекают друг друга);
+- читается срезами по группам материал/филиал и диапазону дат через индекс
+  (material, branch, date);
+- читается частями, упорядоченными по материалу, филиалу и дате, - в таком
+  виде ее принимает analyze_historical_data_stream (объект хранилища можно
+  передать как source напрямую).
+
+Схема таблицы - migrations/001_create_historical_data_table.sql; скрипты
+миграций идемпотентны и выполняются при каждом открытии хранилища.
+Колонки названы по ролям auto_detect_columns ('date', 'material', 'branch',
+'start_quantity', ...); материал и филиал хранятся как текст. Файлы без
+колонки филиала (один филиал) хранятся с филиалом NO_BRANCH.
+
+Пример:
+    with HistoryStore('history.sqlite') as store:
+        store.load_file('history_2019_2024.parquet')       # первая загрузка
+        store.load_file('history_2025_01.xlsx')            # только новые даты групп
+        df = store.read_groups([('MAT-001', 'Филиал 1')])  # срез по группе
+        for results in analyze_historical_data_stream(store, 'date', 'branch', 'material', ...):
+            ...
+"""
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from src.utils.utils import auto_detect_columns
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent.parent / 'migrations'
+
+TABLE = 'historical_data'
+KEY_ROLES = ('material', 'branch', 'date')
+# Без этих ролей файл не загружается; без филиала - все строки получают NO_BRANCH
+REQUIRED_ROLES = ('material', 'date')
+NO_BRANCH = ''
+VALUE_ROLES = ('start_quantity', 'arrival', 'consumption', 'end_quantity', 'end_cost', 'planned_demand')
+STORE_COLUMNS = KEY_ROLES + VALUE_ROLES
+
+# Индексы таблицы (пересоздаются миграцией после массовой загрузки в пустую таблицу)
+TABLE_INDEXES = ('idx_historical_data_group_date', 'idx_historical_data_date')
+
+# Загрузка в пустую таблицу от этого числа строк идет без индексов
+BULK_LOAD_ROWS = 100_000
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def _format_date(value):
+    return pd.Timestamp(value).strftime(DATE_FORMAT)
+
+
+def _column_values(series):
+    """Значения колонки для sqlite3: числа - float, пропуски - None"""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+class HistoryStore:
+    """
+    Файл SQLite с историей запасов.
+
+    Parameters:
+    -----------
+    path : str or Path
+        Файл базы (создается при необходимости; ':memory:' - в памяти)
+    migrations_dir : str or Path
+        Каталог SQL-скриптов схемы
+    """
+
+    def __init__(self, path, migrations_dir=MIGRATIONS_DIR):
+        self.path = str(path)
+        self.migrations_dir = Path(migrations_dir)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._apply_migrations()
+
+    def _apply_migrations(self):
+        for script in sorted(self.migrations_dir.glob('*.sql')):
+            self.connection.executescript(script.read_text(encoding='utf-8'))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        """Части истории по материалу, филиалу и дате (см. iter_chunks)"""
+        return self.iter_chunks()
+
+    # ------------------------------------------------------------------
+    # Загрузка
+    # ------------------------------------------------------------------
+
+    def row_count(self):
+        return self.connection.execute(f'SELECT COUNT(*) FROM {TABLE}').fetchone()[0]
+
+    def watermark(self):
+        """Последняя дата в базе (pd.Timestamp) или None для пустой базы"""
+        value = self.connection.execute(f'SELECT MAX(date) FROM {TABLE}').fetchone()[0]
+        return None if value is None else pd.Timestamp(value)
+
+    def group_watermarks(self):
+        """Последняя дата каждой группы: pd.Series с индексом (material, branch)"""
+        rows = self.connection.execute(
+            f'SELECT material, branch, MAX(date) FROM {TABLE} GROUP BY material, branch'
+        ).fetchall()
+        index = pd.MultiIndex.from_tuples([row[:2] for row in rows], names=['material', 'branch'])
+        return pd.Series(pd.to_datetime([row[2] for row in rows], format=DATE_FORMAT), index=index)
+
+    def _store_frame(self, df, columns):
+        """
+        Таблица с колонками по ролям; строки без материала, филиала или даты отбрасываются.
+
+        Без колонки филиала (файл одного филиала) все строки получают филиал NO_BRANCH.
+        """
+        columns = dict(columns or auto_detect_columns(df))
+        missing = [role for role in REQUIRED_ROLES if role not in columns]
+        if missing:
+            raise KeyError(f"Не найдены колонки ролей {missing} (задайте columns={{роль: колонка}})")
+
+        frame = pd.DataFrame({role: df[col] for role, col in columns.items() if role in STORE_COLUMNS})
+        if 'branch' not in frame.columns:
+            frame['branch'] = NO_BRANCH
+        frame['date'] = pd.to_datetime(frame['date'], errors='coerce')
+        valid = frame[list(KEY_ROLES)].notna().all(axis=1)
+        return frame[valid], int((~valid).sum())
+
+    def _insert(self, frame, load_id):
+        """Вставка строк одной транзакцией"""
+        roles = [role for role in STORE_COLUMNS if role in frame.columns]
+        values = [
+            frame['material'].astype(str).tolist(),
+            frame['branch'].astype(str).tolist(),
+            frame['date'].dt.strftime(DATE_FORMAT).tolist(),
+        ]
+        values += [_column_values(pd.to_numeric(frame[role], errors='coerce')) for role in roles[3:]]
+        values.append([load_id] * len(frame))
+
+        placeholders = ', '.join('?' * (len(roles) + 1))
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO {TABLE} ({', '.join(roles)}, load_id) VALUES ({placeholders})", zip(*values)
+            )
+
+    def _load(self, frames, source, after):
+        """
+        Загрузка последовательности таблиц (frame, отброшено) в рамках одной записи журнала.
+
+        after - водяные знаки групп (group_watermarks): строки с датой не позже
+        последней даты своей группы пропускаются, строки новых групп загружаются.
+        """
+        with self.connection:
+            load_id = self.connection.execute(
+                "INSERT INTO history_loads (loaded_at, source, rows) VALUES (?, ?, 0)",
+                (datetime.now().isoformat(timespec='seconds'), None if source is None else str(source))
+            ).lastrowid
+
+        stats = {'rows': 0, 'skipped_old': 0, 'skipped_invalid': 0, 'min_date': None, 'max_date': None}
+        bulk = self.row_count() == 0
+        indexes_dropped = False
+        try:
+            for frame, skipped_invalid in frames:
+                stats['skipped_invalid'] += skipped_invalid
+                if after is not None:
+                    new = self._after_watermark(frame, after)
+                    stats['skipped_old'] += int((~new).sum())
+                    frame = frame[new]
+                if frame.empty:
+                    continue
+                if bulk and not indexes_dropped and len(frame) >= BULK_LOAD_ROWS:
+                    # Пустая таблица: индексы строятся один раз после вставки
+                    for index in TABLE_INDEXES:
+                        self.connection.execute(f'DROP INDEX IF EXISTS {index}')
+                    indexes_dropped = True
+                self._insert(frame, load_id)
+                stats['rows'] += len(frame)
+                for key, value in (('min_date', frame['date'].min()), ('max_date', frame['date'].max())):
+                    current = stats[key]
+                    if current is None or (value < current if key == 'min_date' else value > current):
+                        stats[key] = value
+        finally:
+            if indexes_dropped:
+                self._apply_migrations()
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE history_loads SET rows = ?, min_date = ?, max_date = ? WHERE id = ?",
+                (stats['rows'],
+                 None if stats['min_date'] is None else _format_date(stats['min_date']),
+                 None if stats['max_date'] is None else _format_date(stats['max_date']),
+                 load_id)
+            )
+        stats['watermark'] = self.watermark()
+        return stats
+
+    @staticmethod
+    def _after_watermark(frame, watermarks):
+        """Маска строк позже водяного знака своей группы (строки новых групп - всегда)"""
+        keys = pd.MultiIndex.from_arrays([frame['material'].astype(str), frame['branch'].astype(str)])
+        limits = watermarks.reindex(keys).to_numpy()
+        return pd.isna(limits) | (frame['date'].to_numpy() > limits)
+
+    def load_frame(self, df, columns=None, only_new=False, source=None):
+        """
+        Загружает таблицу истории.
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            История (колонки в формате шаблона)
+        columns : dict, optional
+            {роль: колонка df}; по умолчанию - auto_detect_columns
+        only_new : bool
+            Загрузить только строки с датой позже последней даты своей группы
+            (новые группы - целиком)
+        source : str, optional
+            Источник для журнала загрузок
+
+        Returns:
+        --------
+        dict: rows - вставлено, skipped_old - пропущено по водяному знаку,
+              skipped_invalid - без материала/филиала/даты, min_date/max_date, watermark
+        """
+        after = self.group_watermarks() if only_new else None
+        return self._load([self._store_frame(df, columns)], source, after)
+
+    def append_new(self, df, columns=None, source=None):
+        """Дозагрузка: только строки с датой позже последней даты своей группы"""
+        return self.load_frame(df, columns, only_new=True, source=source)
+
+    def load_file(self, source, only_new=True, chunk_rows=500_000):
+        """
+        Загружает файл истории (Excel, Parquet, Feather/Arrow, CSV).
+
+        Колоночные форматы и CSV читаются частями (iter_table_chunks), Excel - целиком.
+        Водяные знаки групп фиксируются до загрузки, поэтому части одного файла
+        не отсекают друг друга.
+        """
+        from src.utils.data_loading import detect_file_columns, detect_file_format, iter_table_chunks, load_table
+
+        columns = detect_file_columns(source)
+        after = self.group_watermarks() if only_new else None
+        if detect_file_format(source) == 'excel':
+            chunks = [load_table(source, columns='auto', categorical=False)]
+        else:
+            chunks = iter_table_chunks(source, columns='auto', chunk_rows=chunk_rows)
+        frames = (self._store_frame(chunk, columns) for chunk in chunks)
+        return self._load(frames, getattr(source, 'name', source), after)
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def _where(self, start_date=None, end_date=None, after=None):
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append('h.date >= ?')
+            params.append(_format_date(start_date))
+        if end_date is not None:
+            conditions.append('h.date <= ?')
+            params.append(_format_date(end_date))
+        if after is not None:
+            conditions.append('h.date > ?')
+            params.append(_format_date(after))
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    @staticmethod
+    def _to_frame(rows, roles, categorical=False):
+        frame = pd.DataFrame.from_records(rows, columns=list(roles))
+        frame['date'] = pd.to_datetime(frame['date'], format=DATE_FORMAT)
+        for role in roles:
+            if role in VALUE_ROLES:
+                frame[role] = pd.to_numeric(frame[role]).astype('float64')
+        if categorical:
+            for role in ('material', 'branch'):
+                frame[role] = frame[role].astype('category')
+        return frame
+
+    def _select(self, roles):
+        roles = list(roles or STORE_COLUMNS)
+        unknown = [role for role in roles if role not in STORE_COLUMNS]
+        if unknown:
+            raise KeyError(f"Неизвестные колонки хранилища: {unknown}. Доступны: {', '.join(STORE_COLUMNS)}")
+        # Ключи группы и дата нужны всегда
+        return list(KEY_ROLES) + [role for role in roles if role not in KEY_ROLES]
+
+    def groups(self):
+        """Группы материал/филиал: число строк, первая и последняя дата"""
+        frame = pd.read_sql_query(
+            f"SELECT material, branch, COUNT(*) AS rows, MIN(date) AS first_date, MAX(date) AS last_date "
+            f"FROM {TABLE} GROUP BY material, branch ORDER BY material, branch",
+            self.connection
+        )
+        for column in ('first_date', 'last_date'):
+            frame[column] = pd.to_datetime(frame[column], format=DATE_FORMAT)
+        return frame
+
+    def read_groups(self, keys=None, columns=None, start_date=None, end_date=None, after=None, categorical=True):
+        """
+        Строки выбранных групп, упорядоченные по материалу, филиалу и дате.
+
+        Parameters:
+        -----------
+        keys : list of tuple, optional
+            Группы (материал, филиал); None - все группы
+        columns : list, optional
+            Роли колонок (по умолчанию все STORE_COLUMNS; ключи и дата - всегда)
+        start_date, end_date : date-like, optional
+            Диапазон дат включительно
+        after : date-like, optional
+            Только строки позже этой даты (например, прошлого водяного знака)
+        categorical : bool
+            Привести материал и филиал к категориальному типу
+
+        Returns:
+        --------
+        pd.DataFrame: колонки по ролям, 'date' - datetime64
+        """
+        roles = self._select(columns)
+        where, params = self._where(start_date, end_date, after)
+        select = ', '.join(f'h.{role}' for role in roles)
+        order = ' ORDER BY h.material, h.branch, h.date, h.id'
+
+        if keys is None:
+            rows = self.connection.execute(f'SELECT {select} FROM {TABLE} h{where}{order}', params).fetchall()
+        else:
+            # Ключи - во временной таблице: поиск каждой группы идет по индексу
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS wanted_groups (material TEXT, branch TEXT)')
+            self.connection.execute('DELETE FROM wanted_groups')
+            self.connection.executemany('INSERT INTO wanted_groups VALUES (?, ?)',
+                                        [(str(material), str(branch)) for material, branch in keys])
+            rows = self.connection.execute(
+                f'SELECT {select} FROM wanted_groups w CROSS JOIN {TABLE} h '
+                f'ON h.material = w.material AND h.branch = w.branch{where}{order}', params
+            ).fetchall()
+        return self._to_frame(rows, roles, categorical)
+
+    def read_group(self, material, branch, columns=None, start_date=None, end_date=None):
+        """Строки одной группы по дате"""
+        return self.read_groups([(material, branch)], columns, start_date, end_date, categorical=False)
+
+    def iter_chunks(self, chunk_rows=500_000, columns=None, start_date=None, end_date=None, after=None):
+        """
+        История частями по chunk_rows строк в порядке материал, филиал, дата.
+
+        Группа может продолжаться в следующей части (analyze_historical_data_stream
+        переносит такую группу сам). Материал и филиал - строки (категории частей
+        не совпадали бы).
+
+        Yields:
+        -------
+        pd.DataFrame: очередная часть
+        """
+        roles = self._select(columns)
+        where, params = self._where(start_date, end_date, after)
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(f'h.{role}' for role in roles)} FROM {TABLE} h{where} "
+            f"ORDER BY h.material, h.branch, h.date, h.id", params
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield self._to_frame(rows, roles)
+        finally:
+            cursor.close()
@@ -0,0 +1,197 @@
+"""
+Профилирование этапов анализа: длительность, строки в секунду, память, счетчики.
+
+RunProfile собирает:
+- этапы (stage) - длительность, число строк, строк/с, RSS процесса до и после,
+  статус (ok/error);
+- счетчики (count) - например, число рядов по моделям и число fallback;
+- сведения о запуске (info) - файл, конфигурация.
+
+Результат - словарь для машинной обработки (to_dict / save в JSON) и
+строки для отображения (summary_rows).
+
+Пример:
+    profile = RunProfile('analysis')
+    with profile.stage('historical', rows=len(df)) as stage:
+        result = analyze(df)
+        stage.rows_out = len(result)
+    profile.count('fits:holt_winters', 120)
+    profile.save('run_report.json')
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def current_rss_mb():
+    """Текущий RSS процесса в МБ (Linux - /proc, иначе пиковый RSS или None)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (только Unix)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+class StageSpan:
+    """
+    Один этап запуска.
+
+    rows - входные строки этапа (для строк/с), rows_out - строки результата;
+    оба можно задать внутри блока with, когда они станут известны.
+    """
+
+    def __init__(self, name, rows=None, started_at=0.0):
+        self.name = name
+        self.rows = rows
+        self.rows_out = None
+        self.started_at = started_at
+        self.duration_s = None
+        self.rss_before_mb = None
+        self.rss_after_mb = None
+        self.status = 'running'
+        self.error = None
+
+    @property
+    def rows_per_s(self):
+        if not self.rows or not self.duration_s:
+            return None
+        return self.rows / self.duration_s
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'status': self.status,
+            'started_at_s': self.started_at,
+            'duration_s': self.duration_s,
+            'rows': self.rows,
+            'rows_out': self.rows_out,
+            'rows_per_s': self.rows_per_s,
+            'rss_before_mb': self.rss_before_mb,
+            'rss_after_mb': self.rss_after_mb,
+            'error': self.error,
+        }
+
+
+class RunProfile:
+    """
+    Профиль одного запуска анализа.
+
+    Parameters:
+    -----------
+    name : str
+        Имя запуска (попадает в отчет)
+    logger : logging.Logger, optional
+        Если задан, длительность каждого этапа пишется в лог
+    """
+
+    def __init__(self, name='analysis', logger=None):
+        self.name = name
+        self.logger = logger
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.counters = {}
+        self.info = {}
+        self._started = time.perf_counter()
+        self._finished = None
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Замеряет блок кода как этап; исключение отмечает этап как error и пробрасывается"""
+        span = StageSpan(name, rows, started_at=time.perf_counter() - self._started)
+        span.rss_before_mb = current_rss_mb()
+        self.stages.append(span)
+        started = time.perf_counter()
+        try:
+            yield span
+            span.status = 'ok'
+        except BaseException as e:
+            span.status = 'error'
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - started
+            span.rss_after_mb = current_rss_mb()
+            if self.logger is not None:
+                rate = f", {span.rows_per_s:,.0f} строк/с" if span.rows_per_s else ''
+                self.logger.info(f"[ПРОФИЛЬ] {name}: {span.duration_s:.3f} с{rate} ({span.status})")
+
+    def count(self, counter, n=1):
+        """Увеличивает счетчик"""
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def update_counters(self, counts, prefix=''):
+        """Добавляет словарь счетчиков (например, рядов по моделям)"""
+        for counter, n in counts.items():
+            self.count(f'{prefix}{counter}', n)
+
+    def set_info(self, key, value):
+        self.info[key] = value
+
+    def finish(self):
+        """Фиксирует общую длительность запуска"""
+        self._finished = time.perf_counter()
+
+    @property
+    def total_s(self):
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    def stage_durations(self):
+        """{этап: суммарная длительность} (этапы с одинаковым именем складываются)"""
+        durations = {}
+        for span in self.stages:
+            durations[span.name] = durations.get(span.name, 0.0) + (span.duration_s or 0.0)
+        return durations
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'created_at': self.created_at,
+            'total_s': self.total_s,
+            'peak_rss_mb': peak_rss_mb(),
+            'info': self.info,
+            'stages': [span.to_dict() for span in self.stages],
+            'counters': dict(self.counters),
+        }
+
+    def save(self, path):
+        """Сохраняет отчет о запуске в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+
+    def summary_rows(self):
+        """
+        Строки для отображения: (этап, длительность, доля запуска, строк/с, прирост RSS).
+
+        Returns:
+        --------
+        list of tuple: значения уже отформатированы строками
+        """
+        total = self.total_s or 1.0
+        rows = []
+        for span in self.stages:
+            duration = span.duration_s or 0.0
+            rate = f'{span.rows_per_s:,.0f}'.replace(',', ' ') if span.rows_per_s else '—'
+            if span.rss_before_mb is not None and span.rss_after_mb is not None:
+                memory = f'{span.rss_after_mb - span.rss_before_mb:+.1f} МБ'
+            else:
+                memory = '—'
+            name = span.name if span.status == 'ok' else f'{span.name} ({span.status})'
+            rows.append((name, f'{duration:.2f} с', f'{duration / total:.0%}', rate, memory))
+        return rows
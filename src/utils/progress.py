@@ -0,0 +1,140 @@
+"""
+Отмена и подробный прогресс долгих этапов анализа.
+
+CancellationToken - флаг отмены, который проверяют циклы по группам
+(analyze_historical_data, auto_forecast_demand, forecast_start_balance).
+После отмены этап прерывается исключением AnalysisCancelled; собственные
+пулы процессов при этом останавливаются, не дожидаясь незавершенных пачек.
+
+ProgressTracker считает обработанные группы этапа и вызывает callback
+не чаще min_interval_s с долей выполнения, скоростью и оценкой
+оставшегося времени (ETA).
+
+Пример:
+    token = CancellationToken()
+    tracker = ProgressTracker('forecast', total=len(series), callback=print, cancel_token=token)
+    for values in series:
+        tracker.check()
+        ...
+        tracker.advance()
+    tracker.finish()
+"""
+import threading
+import time
+
+
+class AnalysisCancelled(Exception):
+    """Анализ отменен пользователем"""
+
+
+class CancellationToken:
+    """Потокобезопасный флаг отмены"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise AnalysisCancelled("Анализ отменен")
+
+
+def check_cancelled(cancel_token):
+    """raise_if_cancelled для необязательного токена"""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+def format_duration(seconds):
+    """Длительность для сообщений: '45 с', '3 мин 05 с', '1 ч 02 мин'"""
+    if seconds is None:
+        return '—'
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds} с'
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f'{minutes} мин {seconds:02d} с'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours} ч {minutes:02d} мин'
+
+
+class ProgressTracker:
+    """
+    Прогресс этапа по группам (рядам) с оценкой скорости и ETA.
+
+    Parameters:
+    -----------
+    stage : str
+        Имя этапа (передается в callback)
+    total : int
+        Всего групп
+    callback : callable, optional
+        callback(info) - info: dict с ключами stage, done, total, fraction,
+        rate_per_s, elapsed_s, eta_s
+    cancel_token : CancellationToken, optional
+        Токен отмены (проверяется в check и advance)
+    min_interval_s : float
+        Минимальный интервал между вызовами callback (последний вызов - всегда)
+    """
+
+    def __init__(self, stage, total, callback=None, cancel_token=None, min_interval_s=0.2, clock=time.perf_counter):
+        self.stage = stage
+        self.total = int(total)
+        self.callback = callback
+        self.cancel_token = cancel_token
+        self.min_interval_s = min_interval_s
+        self._clock = clock
+        self.done = 0
+        self.started_at = clock()
+        self._last_emit = None
+
+    def check(self):
+        check_cancelled(self.cancel_token)
+
+    def snapshot(self):
+        elapsed = self._clock() - self.started_at
+        rate = self.done / elapsed if elapsed > 0 and self.done else None
+        remaining = max(self.total - self.done, 0)
+        return {
+            'stage': self.stage,
+            'done': self.done,
+            'total': self.total,
+            'fraction': self.done / self.total if self.total else 1.0,
+            'rate_per_s': rate,
+            'elapsed_s': elapsed,
+            'eta_s': remaining / rate if rate else (0.0 if not remaining else None),
+        }
+
+    def _emit(self, force=False):
+        if self.callback is None:
+            return
+        now = self._clock()
+        if not force and self._last_emit is not None and now - self._last_emit < self.min_interval_s:
+            return
+        self._last_emit = now
+        self.callback(self.snapshot())
+
+    def advance(self, n=1):
+        """Отмечает n обработанных групп и проверяет отмену"""
+        self.done = min(self.done + n, self.total)
+        self._emit(force=self.done >= self.total)
+        self.check()
+
+    def start(self):
+        """Первый вызов callback (0 из total) и проверка отмены"""
+        self._emit(force=True)
+        self.check()
+
+    def finish(self):
+        """Этап завершен: все группы обработаны"""
+        if self.done < self.total:
+            self.done = self.total
+            self._emit(force=True)
+
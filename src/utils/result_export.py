@@ -0,0 +1,111 @@
+"""
+Выгрузка таблиц результатов для последующей обработки: Parquet и сжатый CSV.
+
+Excel-отчет оформлен для чтения человеком; для BI и скриптов те же
+результаты сохраняются рядом с отчетом в колоночном виде с сохранением
+типов: числа остаются числами, даты - датами, категориальные колонки -
+категориями (в Parquet).
+
+Колонки object смешанного типа (например, числа и 'Н/Д') приводятся
+к числам, если все непустые значения - числа, иначе к строкам: Parquet
+требует один тип на колонку.
+
+Для Parquet нужен pyarrow.
+"""
+import os
+
+import pandas as pd
+from pandas.api.types import is_object_dtype
+
+
+# Формат -> расширение файла
+DATA_EXPORT_FORMATS = {
+    'parquet': '.parquet',
+    'csv': '.csv.gz',
+}
+
+
+def prepare_export_frame(df):
+    """
+    Таблица с одним типом значений в каждой колонке.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Таблица результатов
+
+    Returns:
+    --------
+    pd.DataFrame: df без изменений или поверхностная копия с приведенными колонками
+    """
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if not is_object_dtype(series.dtype):
+            continue
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        if inferred in ('string', 'empty', 'boolean', 'datetime', 'date'):
+            continue
+        numbers = pd.to_numeric(series, errors='coerce')
+        if numbers.notna().sum() == series.notna().sum():
+            converted[column] = numbers
+        else:
+            converted[column] = series.astype('string')
+    if not converted:
+        return df
+    result = df.copy(deep=False)
+    for column, values in converted.items():
+        result[column] = values
+    return result
+
+
+def write_result_table(df, path, file_format):
+    """
+    Записывает таблицу в Parquet ('parquet') или CSV со сжатием gzip ('csv').
+
+    CSV пишется в UTF-8, с точкой как десятичным разделителем и датами
+    в формате ISO, чтобы читаться без настройки локали.
+    """
+    df = prepare_export_frame(df)
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    elif file_format == 'csv':
+        df.to_csv(path, index=False, encoding='utf-8', compression='gzip', date_format='%Y-%m-%d')
+    else:
+        raise ValueError(
+            f"Неизвестный формат выгрузки: {file_format}. Доступны: {', '.join(DATA_EXPORT_FORMATS)}"
+        )
+    return path
+
+
+def export_result_tables(output_dir, base_name, tables, formats=tuple(DATA_EXPORT_FORMATS)):
+    """
+    Сохраняет таблицы результатов в выбранных форматах.
+
+    Parameters:
+    -----------
+    output_dir : str or Path
+        Каталог для файлов
+    base_name : str
+        Префикс имени файлов (обычно имя Excel-отчета без расширения)
+    tables : dict
+        {суффикс имени файла: DataFrame}; None пропускается
+    formats : iterable
+        Форматы из DATA_EXPORT_FORMATS
+
+    Returns:
+    --------
+    list: пути записанных файлов (<base_name>_<суффикс><расширение>)
+    """
+    unknown = [file_format for file_format in formats if file_format not in DATA_EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Неизвестные форматы выгрузки: {unknown}. Доступны: {', '.join(DATA_EXPORT_FORMATS)}")
+
+    paths = []
+    for suffix, df in tables.items():
+        if df is None:
+            continue
+        for file_format in formats:
+            path = os.path.join(output_dir, f"{base_name}_{suffix}{DATA_EXPORT_FORMATS[file_format]}")
+            paths.append(write_result_table(df, path, file_format))
+    return paths
@@ -80,10 +80,12 @@ def to_csv(df):
     return df.to_csv(index=False, encoding='utf-16').encode('utf-16')
 
 def load_data(file_uploader, key):
-    uploaded_file = file_uploader(f"Выберите Excel файл с {key} данными", type=["xlsx"], key=f"{key}_uploader")
+    from src.utils.data_loading import load_table, UPLOAD_TYPES
+
+    uploaded_file = file_uploader(f"Выберите файл с {key} данными", type=UPLOAD_TYPES, key=f"{key}_uploader")
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file)
+            df = load_table(uploaded_file)
             st.session_state[f"{key}_df"] = df
             st.success(f"{key.capitalize()} данные успешно загружены!")
             return df
@@ -8,7 +8,6 @@ from src.utils import visualization as vis
 #import inventory_analysis as ia
 import io
 from io import BytesIO
-import xlsxwriter  # Добавьте эту строку
 
 import sys
 from pathlib import Path
@@ -19,6 +18,8 @@ sys.path.insert(0, str(root_dir))
 from src.analysis import historical_analysis as ha
 from src.analysis import forecast_analysis as fa
 from src.utils import utils
+from src.utils.data_loading import load_table, UPLOAD_TYPES
+from src.utils.excel_writer import dataframe_to_xlsx
 from src.web.logging_config import setup_logger, log_user_action, create_private_download_button
 
 # Инициализация логирования
@@ -31,19 +32,7 @@ st.set_page_config(page_title="Анализ и прогнозирование у
 @st.cache_data
 def to_excel(df):
     output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet()
-
-    # Записываем заголовки
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(0, col_num, value)
-
-    # Записываем данные
-    for row_num, row in enumerate(df.values):
-        for col_num, value in enumerate(row):
-            worksheet.write(row_num + 1, col_num, value.encode('utf-8').decode('utf-8') if isinstance(value, str) else value)
-
-    workbook.close()
+    dataframe_to_xlsx(output, df)
     processed_data = output.getvalue()
     return processed_data
 
@@ -58,17 +47,17 @@ def main():
 
     # Загрузка исторических данных
     st.header("Загрузка исторических данных")
-    historical_file = st.file_uploader("Выберите Excel файл с историческими данными", type=["xlsx"], key="historical_uploader")
+    historical_file = st.file_uploader("Выберите файл с историческими данными (Excel, Parquet, Feather, CSV)", type=UPLOAD_TYPES, key="historical_uploader")
 
     if historical_file is not None and st.session_state.get("historical_df") is None:
-        st.session_state.historical_df = pd.read_excel(historical_file)
+        st.session_state.historical_df = load_table(historical_file)
         log_user_action(
             action="Загрузка исторических данных",
             message=f"Загружен файл {historical_file.name}. Количество строк: {st.session_state.historical_df.shape[0]}."
         )
     
     if historical_file is not None:
-        st.session_state.historical_df = pd.read_excel(historical_file)
+        st.session_state.historical_df = load_table(historical_file)
         st.success("Файл с историческими данными успешно загружен!")
         
     if st.session_state.historical_df is not None:
@@ -235,21 +224,21 @@ def main():
             auto_forecast_enabled = False
 
     forecast_file = st.file_uploader(
-        "Выберите Excel файл с прогнозируемыми данными" if not auto_forecast_enabled else "Или загрузите свой файл с прогнозом (опционально)",
-        type=["xlsx"],
+        "Выберите файл с прогнозируемыми данными (Excel, Parquet, Feather, CSV)" if not auto_forecast_enabled else "Или загрузите свой файл с прогнозом (опционально)",
+        type=UPLOAD_TYPES,
         key="forecast_uploader",
         disabled=auto_forecast_enabled
     )
 
     if forecast_file is not None and st.session_state.get("forecast_df") is None:
-        st.session_state.forecast_df = pd.read_excel(forecast_file)
+        st.session_state.forecast_df = load_table(forecast_file)
         log_user_action(
             action="Загрузка прогнозируемых данных",
             message=f"Загружен файл {forecast_file.name}. Количество строк: {st.session_state.forecast_df.shape[0]}."
         )
         
     if forecast_file is not None:
-        st.session_state.forecast_df = pd.read_excel(forecast_file)
+        st.session_state.forecast_df = load_table(forecast_file)
         st.success("Файл с прогнозируемыми данными успешно загружен!")
 
     if st.session_state.forecast_df is not None:
@@ -335,7 +324,9 @@ def main():
                     
                     # Рекомендации по закупкам с учетом введенного страхового запаса
                     recommendations_df = fa.calculate_purchase_recommendations(
-                        st.session_state.forecast_df, 'Прогноз остатка на конец', forecast_quantity_column, safety_stock_percent
+                        st.session_state.forecast_df, 'Прогноз остатка на конец', forecast_quantity_column, safety_stock_percent,
+                        group_columns=[forecast_material_column, forecast_branch_column],
+                        date_column=forecast_date_column
                     )
                     st.session_state.forecast_df = pd.concat([st.session_state.forecast_df, recommendations_df], axis=1)
                     
@@ -0,0 +1,92 @@
+"""
+Unit тесты для пакетного запуска без интерфейса (src/cli/batch.py)
+"""
+import unittest
+import tempfile
+import shutil
+import json
+import os
+import sys
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis.pipeline import run_analysis
+from src.cli import batch
+
+
+class TestBatchCli(unittest.TestCase):
+    """Тесты пакетного анализа каталога файлов"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp_dir, 'input')
+        self.output_dir = os.path.join(self.tmp_dir, 'output')
+        os.makedirs(self.input_dir)
+        for seed, name in enumerate(['branch_a', 'branch_b']):
+            df = gen.make_historical_data(n_materials=3, n_branches=1, n_periods=24, seed=seed)
+            df.to_parquet(os.path.join(self.input_dir, f'{name}.parquet'), index=False)
+        self.args = [self.input_dir, '--output', self.output_dir, '--forecast-model', 'naive',
+                     '--forecast-periods', '3', '--log-level', 'WARNING']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def read_summary(self):
+        with open(os.path.join(self.output_dir, batch.SUMMARY_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_directory_in_processes(self):
+        """Тест: Файлы каталога обрабатываются в пуле процессов, отчеты записаны"""
+        self.assertEqual(batch.main(self.args + ['--workers', '2', '--data-formats', 'csv']), 0)
+
+        summary = self.read_summary()
+        self.assertEqual([os.path.basename(item['file']) for item in summary['files']],
+                         ['branch_a.parquet', 'branch_b.parquet'])
+        for item in summary['files']:
+            self.assertEqual(item['status'], 'ok')
+            for path in item['outputs']:
+                self.assertTrue(os.path.exists(path), path)
+        outputs = os.listdir(self.output_dir)
+        self.assertIn('branch_a_Анализ_запасов.xlsx', outputs)
+        self.assertIn('branch_b_Анализ_запасов_Отчет_о_запуске.json', outputs)
+        self.assertIn('branch_a_Анализ_запасов_Прогноз_закупки.csv.gz', outputs)
+
+    def test_failed_file_does_not_stop_batch(self):
+        """Тест: Файл без нужных колонок пропускается, остальные обрабатываются, код возврата 1"""
+        pd.DataFrame({'Колонка': [1, 2, 3]}).to_csv(os.path.join(self.input_dir, 'broken.csv'), index=False)
+        self.assertEqual(batch.main(self.args + ['--workers', '1']), 1)
+
+        statuses = {os.path.basename(item['file']): item['status'] for item in self.read_summary()['files']}
+        self.assertEqual(statuses['branch_a.parquet'], 'ok')
+        self.assertEqual(statuses['branch_b.parquet'], 'ok')
+        self.assertNotEqual(statuses['broken.csv'], 'ok')
+
+    def test_no_input_files(self):
+        """Тест: Пустой каталог - код возврата 2"""
+        empty_dir = os.path.join(self.tmp_dir, 'empty')
+        os.makedirs(empty_dir)
+        self.assertEqual(batch.main([empty_dir, '--output', self.output_dir, '--log-level', 'WARNING']), 2)
+
+    def test_pipeline_results(self):
+        """Тест: run_analysis возвращает таблицы и пояснения, как рабочий поток desktop-приложения"""
+        config = {
+            'historical_file': os.path.join(self.input_dir, 'branch_a.parquet'),
+            'forecast_mode': 'auto',
+            'forecast_model': 'naive',
+            'forecast_periods': 3,
+        }
+        progress = []
+        results = run_analysis(config, progress=lambda percent, message: progress.append(percent))
+        self.assertEqual(progress[-1], 100)
+        self.assertEqual(len(results['historical']), 3)
+        self.assertEqual(len(results['forecast']), 9)
+        self.assertEqual(results['branch_col'], gen.BRANCH_COLUMN)
+        self.assertTrue(results['historical_explanation'])
+        self.assertIn('Рекомендация по закупке', results['forecast'].columns)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
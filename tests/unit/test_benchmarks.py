@@ -0,0 +1,91 @@
+"""
+Unit тесты для бенчмарков (benchmarks/)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from benchmarks import run_benchmarks as rb
+from src.utils.utils import auto_detect_columns
+
+
+class TestDataGenerators(unittest.TestCase):
+    """Тесты синтетических данных"""
+
+    def test_shape_and_balance(self):
+        """Тест: Размер материалы × филиалы × периоды, остатки не отрицательные"""
+        df = gen.make_historical_data(3, 2, 24, seed=1)
+        self.assertEqual(len(df), 3 * 2 * 24)
+        self.assertEqual(df.groupby([gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN]).ngroups, 6)
+        self.assertTrue((df[gen.END_COLUMN] >= 0).all())
+
+        # Начальный остаток периода = конечный остаток предыдущего
+        series = df[(df[gen.MATERIAL_COLUMN] == 'MAT-000001') & (df[gen.BRANCH_COLUMN] == 'Филиал 2')]
+        np.testing.assert_allclose(series[gen.START_COLUMN].to_numpy()[1:], series[gen.END_COLUMN].to_numpy()[:-1])
+
+    def test_deterministic(self):
+        """Тест: Одинаковый seed - одинаковые данные"""
+        pd.testing.assert_frame_equal(gen.make_historical_data(2, 2, 12, seed=5),
+                                      gen.make_historical_data(2, 2, 12, seed=5))
+
+    def test_columns_detected(self):
+        """Тест: Колонки распознаются auto_detect_columns"""
+        historical_df, forecast_df = gen.make_scale('tiny')
+        detected = auto_detect_columns(historical_df)
+        self.assertEqual(detected['end_cost'], gen.COST_COLUMN)
+        self.assertEqual(detected['consumption'], gen.CONSUMPTION_COLUMN)
+        self.assertEqual(auto_detect_columns(forecast_df)['planned_demand'], gen.PLANNED_DEMAND_COLUMN)
+        self.assertEqual(len(forecast_df), 5 * 2 * 12)
+
+        with self.assertRaises(ValueError):
+            gen.make_scale('huge')
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    """Тесты запуска и сравнения результатов"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_run_and_save(self):
+        """Тест: Все этапы замеряются, результат сохраняется в JSON"""
+        report = rb.run_benchmarks('tiny', models=['naive'], repeat=1, log=None)
+        stages = [result['stage'] for result in report['results']]
+        self.assertEqual(stages, ['historical', 'forecast:naive', 'start_balance', 'recommendations', 'export'])
+        for result in report['results']:
+            self.assertGreater(result['median_s'], 0)
+            self.assertIsNotNone(result['peak_memory_mb'])
+
+        path = os.path.join(self.tmp_dir, 'bench.json')
+        rb.save_results(report, path)
+        self.assertEqual(rb.load_results(path)['historical_rows'], report['historical_rows'])
+
+    def test_compare_flags_regression(self):
+        """Тест: Замедление выше порога отмечается как регрессия"""
+        baseline = {'results': [{'stage': 'historical', 'median_s': 1.0}, {'stage': 'export', 'median_s': 2.0}]}
+        current = {'results': [{'stage': 'historical', 'median_s': 1.1}, {'stage': 'export', 'median_s': 3.0},
+                               {'stage': 'start_balance', 'median_s': 0.5}]}
+        comparison = {row['stage']: row for row in rb.compare_results(baseline, current, threshold=0.2)}
+        self.assertFalse(comparison['historical']['regression'])
+        self.assertTrue(comparison['export']['regression'])
+        self.assertNotIn('start_balance', comparison)
+
+    def test_unknown_stage(self):
+        """Тест: Неизвестный этап вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            rb.run_benchmarks('tiny', stages=['unknown'], log=None)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,206 @@
+"""
+Unit тесты для загрузки входных файлов (data_loading.py)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import io
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.utils import data_loading as dl
+from src.analysis.historical_analysis import analyze_historical_data
+
+
+def make_historical_df(n_materials=4, periods=24):
+    """Исторические данные в формате шаблона"""
+    rng = np.random.default_rng(4)
+    rows = []
+    for i in range(n_materials):
+        for branch in ['Филиал 2', 'Филиал 1']:
+            for date in pd.date_range('2023-01-01', periods=periods, freq='MS'):
+                start = float(rng.integers(50, 150))
+                rows.append({
+                    'Дата': date,
+                    'Материал': f'MAT-{i:03d}',
+                    'Филиал': branch,
+                    'Комментарий': 'нет',
+                    'Начальный остаток': start,
+                    'Конечный остаток': start - float(rng.integers(0, 40)),
+                    'Стоимость': float(rng.integers(100, 1000)),
+                })
+    return pd.DataFrame(rows)
+
+
+class TestDataLoading(unittest.TestCase):
+    """Тесты чтения Excel/Parquet/Feather/CSV"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = make_historical_df()
+        self.paths = {
+            'parquet': os.path.join(self.tmp_dir, 'history.parquet'),
+            'feather': os.path.join(self.tmp_dir, 'history.feather'),
+            'csv': os.path.join(self.tmp_dir, 'history.csv'),
+            'excel': os.path.join(self.tmp_dir, 'history.xlsx'),
+        }
+        self.df.to_parquet(self.paths['parquet'])
+        self.df.to_feather(self.paths['feather'])
+        self.df.to_csv(self.paths['csv'], index=False)
+        self.df.to_excel(self.paths['excel'], index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_detect_format(self):
+        """Тест: Формат определяется по расширению, неизвестный - ValueError"""
+        for file_format, path in self.paths.items():
+            self.assertEqual(dl.detect_file_format(path), file_format)
+        self.assertEqual(dl.detect_file_format('data.ARROW'), 'feather')
+        with self.assertRaises(ValueError):
+            dl.detect_file_format('data.json')
+
+    def test_header_and_detection(self):
+        """Тест: Колонки определяются по заголовку без чтения данных"""
+        for path in self.paths.values():
+            self.assertEqual(dl.read_header(path), list(self.df.columns))
+            detected = dl.detect_file_columns(path)
+            self.assertEqual(detected['material'], 'Материал')
+            self.assertEqual(detected['end_quantity'], 'Конечный остаток')
+
+    def test_all_formats_same_values(self):
+        """Тест: Все форматы дают одинаковые данные, материал/филиал - категории"""
+        for file_format, path in self.paths.items():
+            df = dl.load_table(path)
+            self.assertIsInstance(df['Материал'].dtype, pd.CategoricalDtype, file_format)
+            self.assertIsInstance(df['Филиал'].dtype, pd.CategoricalDtype, file_format)
+            self.assertEqual(list(df['Филиал'].cat.categories), ['Филиал 1', 'Филиал 2'])
+            pd.testing.assert_series_equal(df['Материал'].astype(object), self.df['Материал'].astype(object),
+                                           check_dtype=False)
+            np.testing.assert_allclose(df['Конечный остаток'], self.df['Конечный остаток'])
+            self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['Дата']), file_format)
+
+    def test_auto_projection(self):
+        """Тест: columns='auto' загружает только найденные колонки"""
+        for path in self.paths.values():
+            df = dl.load_table(path, columns='auto')
+            self.assertNotIn('Комментарий', df.columns)
+            self.assertIn('Стоимость', df.columns)
+
+        df = dl.load_table(self.paths['parquet'], columns=['Материал', 'Дата'])
+        self.assertEqual(list(df.columns), ['Дата', 'Материал'])
+        with self.assertRaises(KeyError):
+            dl.load_table(self.paths['parquet'], columns=['Нет такой'])
+
+    def test_projection_skipped_without_required_roles(self):
+        """Тест: Без обязательных колонок проекция не выполняется"""
+        path = os.path.join(self.tmp_dir, 'partial.csv')
+        self.df.drop(columns=['Начальный остаток']).to_csv(path, index=False)
+        df = dl.load_table(path, columns='auto')
+        self.assertIn('Комментарий', df.columns)
+
+    def test_file_like_source(self):
+        """Тест: Файловый объект с атрибутом name (загрузка Streamlit)"""
+        with open(self.paths['parquet'], 'rb') as f:
+            buffer = io.BytesIO(f.read())
+        buffer.name = 'upload.parquet'
+        df = dl.load_table(buffer)
+        self.assertEqual(len(df), len(self.df))
+
+    def test_categorical_analysis_matches(self):
+        """Тест: Анализ категориальных данных совпадает с анализом строковых"""
+        loaded = dl.load_table(self.paths['parquet'], columns='auto')
+        args = ('Дата', 'Филиал', 'Материал', 'Начальный остаток', 'Конечный остаток', 'Стоимость', 0.05)
+        expected, _ = analyze_historical_data(self.df.copy(), *args)
+        result, _ = analyze_historical_data(loaded, *args)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_dtype=False, check_categorical=False)
+
+
+class TestDatasetCache(unittest.TestCase):
+    """Файл читается один раз на валидацию и анализ"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'history.csv')
+        make_historical_df(periods=3).to_csv(self.path, index=False)
+        dl.clear_dataset_cache()
+
+        self.reads = []
+        self.original_load_table = dl.load_table
+
+        def counting_load_table(*args, **kwargs):
+            self.reads.append(kwargs.get('columns'))
+            return self.original_load_table(*args, **kwargs)
+
+        dl.load_table = counting_load_table
+
+    def tearDown(self):
+        dl.load_table = self.original_load_table
+        dl.clear_dataset_cache()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_validation_and_analysis_share_read(self):
+        """Тест: Валидация и анализ используют одно чтение файла"""
+        from src.desktop.file_validation import validate_historical_data
+
+        result = validate_historical_data(self.path)
+        self.assertTrue(result.is_valid, result.get_full_message())
+        df = dl.get_dataset(self.path).frame(columns='auto')
+
+        self.assertEqual(len(self.reads), 1)
+        self.assertIsInstance(df['Материал'].dtype, pd.CategoricalDtype)
+        self.assertNotIn('Комментарий', df.columns)
+
+    def test_copy_protects_cache(self):
+        """Тест: Изменение полученной таблицы не портит кэш"""
+        df = dl.get_dataset(self.path).frame()
+        df['Конечный остаток'] = 0
+        again = dl.get_dataset(self.path).frame()
+        self.assertFalse((again['Конечный остаток'] == 0).all())
+        self.assertEqual(len(self.reads), 1)
+
+    def test_categorical_view_replaces_raw_frame(self):
+        """Тест: Категориальная таблица для анализа заменяет таблицу валидации, а не хранится рядом"""
+        dataset = dl.get_dataset(self.path)
+        raw = dataset.frame(categorical=False, copy=False)
+        self.assertNotIsInstance(raw['Материал'].dtype, pd.CategoricalDtype)
+
+        dataset.frame(columns='auto', copy=False)
+        self.assertIsInstance(dataset._frame['Материал'].dtype, pd.CategoricalDtype)
+
+        # Вид для валидации по-прежнему строится без чтения файла
+        again = dataset.frame(categorical=False, copy=False)
+        self.assertNotIsInstance(again['Материал'].dtype, pd.CategoricalDtype)
+        self.assertEqual(len(self.reads), 1)
+
+    def test_take_releases_cache(self):
+        """Тест: take отдает таблицу без повторного чтения и убирает файл из кэша"""
+        from src.desktop.file_validation import validate_historical_data
+
+        validate_historical_data(self.path)
+        df = dl.get_dataset(self.path).take(columns='auto')
+
+        self.assertEqual(len(self.reads), 1)
+        self.assertIsInstance(df['Материал'].dtype, pd.CategoricalDtype)
+        self.assertNotIn(os.path.abspath(self.path), dl._dataset_cache)
+
+    def test_changed_file_is_reread(self):
+        """Тест: Измененный файл читается заново"""
+        first = dl.get_dataset(self.path).frame()
+        make_historical_df(periods=5).to_csv(self.path, index=False)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        second = dl.get_dataset(self.path).frame()
+        self.assertEqual(len(self.reads), 2)
+        self.assertGreater(len(second), len(first))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
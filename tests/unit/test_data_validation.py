@@ -0,0 +1,87 @@
+"""
+Unit тесты для нормализации списания (data_validation.py)
+"""
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.utils import data_validation as dv
+from src.analysis import historical_analysis as ha
+
+
+class TestConsumptionNormalization(unittest.TestCase):
+    """Тесты определения конвенции и нормализации без копирования"""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 200
+        start = rng.integers(100, 200, n).astype(float)
+        arrival = rng.integers(0, 50, n).astype(float)
+        consumption = rng.integers(0, 40, n).astype(float)
+        self.df = pd.DataFrame({
+            'Дата': pd.date_range('2020-01-01', periods=n, freq='D'),
+            'Материал': ['MAT-001'] * n,
+            'Филиал': ['Филиал 1'] * n,
+            'Начало': start,
+            'Приход': arrival,
+            'Списание': -consumption,
+            'Конец': start + arrival - consumption,
+            'Стоимость': start * 10,
+        })
+        self.df.loc[5, 'Списание'] = np.nan
+
+    def test_detection_counts(self):
+        """Тест: Счетчики знаков и баланса совпадают с поэлементным расчетом"""
+        detection = dv.detect_consumption_convention(self.df, 'Списание', 'Начало', 'Конец', 'Приход')
+        consumption = self.df['Списание']
+        self.assertEqual(detection['negative_count'], (consumption < 0).sum())
+        self.assertEqual(detection['positive_count'], (consumption > 0).sum())
+        self.assertEqual(detection['zero_count'], (consumption == 0).sum())
+
+        base = self.df['Начало'] + self.df['Приход']
+        self.assertEqual(detection['balance_check_negative'],
+                         (np.abs(base + consumption - self.df['Конец']) < 0.01).sum())
+        self.assertEqual(detection['balance_check_positive'],
+                         (np.abs(base - consumption - self.df['Конец']) < 0.01).sum())
+        self.assertEqual(detection['convention'], 'NEGATIVE')
+
+    def test_column_api(self):
+        """Тест: normalized_consumption_column возвращает колонку, таблица не меняется"""
+        original = self.df.copy()
+        column, detection = dv.normalized_consumption_column(self.df, 'Списание')
+        pd.testing.assert_series_equal(column, original['Списание'].abs())
+        pd.testing.assert_frame_equal(self.df, original)
+        self.assertIn('recommendation', detection)
+
+    def test_inplace(self):
+        """Тест: inplace=True заменяет колонку в той же таблице"""
+        result, _ = dv.normalize_consumption(self.df, 'Списание', inplace=True)
+        self.assertIs(result, self.df)
+        self.assertTrue((self.df['Списание'].dropna() >= 0).all())
+
+    def test_copy_by_default(self):
+        """Тест: По умолчанию возвращается копия, оригинал не меняется"""
+        result, _ = dv.normalize_consumption(self.df, 'Списание', convention='ABS')
+        self.assertIsNot(result, self.df)
+        self.assertTrue((self.df['Списание'].dropna() <= 0).all())
+
+    def test_unknown_convention(self):
+        """Тест: Неизвестная конвенция вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            dv.normalize_consumption(self.df, 'Списание', convention='UNKNOWN')
+
+    def test_analysis_keeps_input(self):
+        """Тест: Анализ не модифицирует исходную таблицу"""
+        original = self.df.copy()
+        ha.analyze_historical_data(self.df, 'Дата', 'Филиал', 'Материал', 'Начало', 'Конец', 'Стоимость',
+                                   0.05, consumption_column='Списание')
+        pd.testing.assert_frame_equal(self.df, original)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,186 @@
+"""
+Unit тесты для быстрой записи Excel (excel_writer.py)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import numpy as np
+import pandas as pd
+import openpyxl
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.utils import excel_writer as ew
+from src.utils.data_processing import to_excel
+from src.desktop.excel_export_desktop import export_full_report, export_report_files, INDEX_SHEET_NAME
+
+
+def make_results_df(n=50):
+    """Таблица с числами, датами, строками, категориями, булевыми и пропусками"""
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame({
+        'Дата': pd.date_range('2024-01-01', periods=n, freq='MS'),
+        'Материал': pd.Categorical([f'MAT-{i % 7:03d}' for i in range(n)]),
+        'Количество': rng.integers(0, 100, n),
+        'Спрос': rng.normal(50, 10, n),
+        'Избыток': rng.random(n) > 0.5,
+        'Сезонность': ['Н/Д' if i % 3 else f'{i / 10:.2f}' for i in range(n)],
+        'Смешанная': [1.5 if i % 2 else 'текст' for i in range(n)],
+    })
+    df.loc[2, 'Спрос'] = np.nan
+    df.loc[4, 'Спрос'] = np.inf
+    return df
+
+
+class TestExcelWriter(unittest.TestCase):
+    """Тесты записи таблиц"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = make_results_df()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def read_back(self, path_or_buffer, sheet=None, header_row=1):
+        workbook = openpyxl.load_workbook(path_or_buffer, read_only=True)
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = list(worksheet.iter_rows(min_row=header_row, values_only=True))
+        workbook.close()
+        return rows
+
+    def test_column_kinds(self):
+        """Тест: Тип колонки определяется один раз по dtype"""
+        kinds = [ew._column_kind(self.df[col]) for col in self.df.columns]
+        self.assertEqual(kinds, ['datetime', 'string', 'number', 'number', 'bool', 'string', 'mixed'])
+
+    def test_values_roundtrip(self):
+        """Тест: Значения читаются обратно, NaN/inf - пустые ячейки"""
+        buffer = to_excel(self.df)
+        rows = self.read_back(buffer)
+        self.assertEqual(list(rows[0]), list(self.df.columns))
+        self.assertEqual(len(rows), len(self.df) + 1)
+
+        first = rows[1]
+        self.assertEqual(first[0], self.df['Дата'][0].to_pydatetime())
+        self.assertEqual(first[1], 'MAT-000')
+        self.assertEqual(first[2], self.df['Количество'][0])
+        self.assertAlmostEqual(first[3], self.df['Спрос'][0])
+        self.assertEqual(first[4], bool(self.df['Избыток'][0]))
+        self.assertEqual(first[6], 'текст')
+        self.assertEqual(rows[2][6], 1.5)
+        self.assertIsNone(rows[3][3])
+        self.assertIsNone(rows[5][3])
+
+    def test_sampled_widths(self):
+        """Тест: Ширина по выборке совпадает с полной при малой таблице и ограничена сверху"""
+        widths = ew.estimate_column_widths(self.df)
+        expected = [min(max(len(col), self.df[col].astype(str).str.len().max()) + 2, 40) for col in self.df.columns]
+        self.assertEqual(widths, expected)
+
+        long_df = pd.DataFrame({'Текст': ['x' * 100] * 5000})
+        self.assertEqual(ew.estimate_column_widths(long_df, sample_rows=10), [40])
+        self.assertEqual(len(ew._sample_positions(5000, 10)), 10)
+
+    def test_export_full_report(self):
+        """Тест: Полный отчет пишется в режиме constant_memory, с заголовком на 5 строке"""
+        path = os.path.join(self.tmp_dir, 'report.xlsx')
+        self.assertTrue(export_full_report(path, self.df, None, self.df, None))
+        rows = self.read_back(path, 'Прогноз и закупки', header_row=5)
+        self.assertEqual(list(rows[0]), list(self.df.columns))
+        self.assertEqual(len(rows), len(self.df) + 1)
+        self.assertEqual(rows[1][1], 'MAT-000')
+
+    def test_explained_sheets(self):
+        """Тест: Вкладки с пояснениями используют ту же запись таблиц"""
+        path = os.path.join(self.tmp_dir, 'explained.xlsx')
+        self.assertTrue(export_full_report(path, self.df, "Строка 1\nСтрока 2", self.df, "Пояснение"))
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['1. Исторический анализ', '2. Прогноз и закупки'])
+        workbook.close()
+
+    def test_empty_frame(self):
+        """Тест: Пустая таблица - только заголовок"""
+        rows = self.read_back(to_excel(self.df.iloc[:0]))
+        self.assertEqual(len(rows), 1)
+
+
+class TestSharding(unittest.TestCase):
+    """Тесты разделения больших таблиц на части"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        sizes = {'Филиал Б': 5, 'Филиал А': 4, 'Филиал В': 12, 'Филиал Г': 3}
+        branches = [branch for branch, size in sizes.items() for _ in range(size)]
+        self.df = pd.DataFrame({
+            'Филиал': branches,
+            'Материал': [f'MAT-{i:03d}' for i in range(len(branches))],
+            'Спрос': np.arange(len(branches), dtype=float),
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_plan_by_rows(self):
+        """Тест: Без группировки части идут по порядку и не длиннее бюджета"""
+        shards = ew.plan_shards(self.df, 10)
+        self.assertEqual([len(s['positions']) for s in shards], [10, 10, 4])
+        np.testing.assert_array_equal(np.concatenate([s['positions'] for s in shards]), np.arange(len(self.df)))
+
+    def test_plan_by_branch(self):
+        """Тест: Филиалы не разрезаются, кроме филиала длиннее бюджета"""
+        shards = ew.plan_shards(self.df, 10, split_by='Филиал')
+        ranges = [(s['first'], s['last'], len(s['positions'])) for s in shards]
+        self.assertEqual(ranges, [
+            ('Филиал А', 'Филиал Б', 9),
+            ('Филиал В', 'Филиал В', 10),
+            ('Филиал В', 'Филиал В', 2),
+            ('Филиал Г', 'Филиал Г', 3),
+        ])
+        for shard in shards:
+            self.assertLessEqual(len(shard['positions']), 10)
+        self.assertEqual(sorted(np.concatenate([s['positions'] for s in shards]).tolist()), list(range(len(self.df))))
+
+    def test_sharded_export(self):
+        """Тест: Большая таблица пишется частями в отдельные книги с оглавлением"""
+        path = os.path.join(self.tmp_dir, 'report.xlsx')
+        small = self.df.head(3)
+        files = export_report_files(path, small, None, self.df, None,
+                                    max_rows_per_sheet=10, split_by='Филиал', max_workers=2)
+
+        self.assertEqual(len(files), 5)
+        self.assertEqual(files[0], path)
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        self.assertEqual(workbook.sheetnames, [INDEX_SHEET_NAME, 'Исторический анализ'])
+        index = list(workbook[INDEX_SHEET_NAME].iter_rows(min_row=6, values_only=True))
+        workbook.close()
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index[0][2], '(эта книга)')
+        self.assertEqual([row[4] for row in index[1:]], [9, 10, 2, 3])
+
+        total = 0
+        for shard_path, entry in zip(files[1:], index[1:]):
+            self.assertEqual(os.path.basename(shard_path), entry[2])
+            workbook = openpyxl.load_workbook(shard_path, read_only=True)
+            rows = list(workbook[entry[3]].iter_rows(min_row=6, values_only=True))
+            workbook.close()
+            self.assertEqual(len(rows), entry[4])
+            self.assertEqual({row[0] for row in rows}, {entry[5], entry[6]} if entry[5] != entry[6] else {entry[5]})
+            total += len(rows)
+        self.assertEqual(total, len(self.df))
+
+    def test_no_sharding_when_fits(self):
+        """Тест: Таблицы в пределах листа пишутся в одну книгу без оглавления"""
+        path = os.path.join(self.tmp_dir, 'report.xlsx')
+        self.assertTrue(export_full_report(path, self.df, None, self.df, None, max_rows_per_sheet=100))
+        self.assertEqual(os.listdir(self.tmp_dir), ['report.xlsx'])
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Исторический анализ', 'Прогноз и закупки'])
+        workbook.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
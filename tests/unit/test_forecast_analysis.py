@@ -2,6 +2,7 @@
 Unit тесты для forecast_analysis.py
 """
 import unittest
+from unittest import mock
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -12,6 +13,7 @@ import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from src.analysis import forecast_analysis as fa
+from src.analysis import forecasting_models as fm
 
 
 class TestForecastAnalysis(unittest.TestCase):
@@ -185,6 +187,37 @@ class TestForecastAnalysis(unittest.TestCase):
             check_names=False
         )
 
+    def test_forward_rolling_sum_by_group(self):
+        """
+        Тест: Окно будущего спроса не выходит за границы материала/филиала
+        """
+        test_df = pd.DataFrame({
+            'Дата': pd.to_datetime(['2024-02-01', '2024-01-01', '2024-01-01', '2024-03-01', '2024-02-01']),
+            'Материал': ['MAT-001', 'MAT-001', 'MAT-002', 'MAT-001', 'MAT-002'],
+            'Филиал': ['Филиал 1'] * 5,
+            'Потребность': [20, 10, 100, np.nan, 200],
+        })
+
+        result = fa.calculate_forward_rolling_sum(
+            test_df['Потребность'], window=2,
+            groups=[test_df['Материал'], test_df['Филиал']], order=test_df['Дата']
+        )
+
+        # MAT-001 по датам: 10, 20, NaN; MAT-002: 100, 200
+        self.assertEqual(result.tolist(), [20.0, 30.0, 300.0, 0.0, 200.0])
+
+    def test_forward_rolling_sum_matches_loop(self):
+        """
+        Тест: Без групп результат совпадает с построчным суммированием окна
+        """
+        demand = pd.Series(np.random.default_rng(2).random(50) * 100, index=np.arange(50) * 2)
+        expected = [demand.iloc[i:min(i + 3, len(demand))].sum() for i in range(len(demand))]
+
+        result = fa.calculate_forward_rolling_sum(demand, window=3)
+        self.assertTrue(result.index.equals(demand.index))
+        np.testing.assert_allclose(result.to_numpy(), expected)
+
+
 
 class TestForecastAnalysisIssues(unittest.TestCase):
     """Тесты для выявления конкретных проблем"""
@@ -251,6 +284,204 @@ class TestForecastAnalysisIssues(unittest.TestCase):
         self.assertEqual(forward_rolling.iloc[2], 120)
 
 
+class TestAutoForecastParallel(unittest.TestCase):
+    """Тесты параллельного прогнозирования по группам"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        frames = []
+        for i in range(6):
+            periods = 2 if i == 0 else 30
+            frames.append(pd.DataFrame({
+                'Дата': pd.date_range('2021-01-01', periods=periods, freq='MS'),
+                'Материал': [f'MAT-{i:03d}'] * periods,
+                'Филиал': ['Филиал 1'] * periods,
+                'Списание': rng.integers(10, 100, periods).astype(float),
+            }))
+        self.historical_df = pd.concat(frames, ignore_index=True)
+
+    def test_parallel_matches_sequential(self):
+        """Тест: Результат в пуле процессов совпадает с последовательным и упорядочен"""
+        args = (self.historical_df.copy(), 3, 'Дата', 'Материал', 'Филиал', 'Списание')
+        sequential = fa.auto_forecast_demand(*args, forecast_model='exponential_smoothing')
+        parallel = fa.auto_forecast_demand(*args, forecast_model='exponential_smoothing', n_jobs=2, chunk_size=2)
+        pd.testing.assert_frame_equal(sequential, parallel)
+
+    def test_batch_selection_matches_per_series(self):
+        """Тест: Пакетный выбор модели дает тот же прогноз, что и поштучный"""
+        args = (self.historical_df.copy(), 3, 'Дата', 'Материал', 'Филиал', 'Списание')
+        per_series = fa.auto_forecast_demand(*args, forecast_model='auto')
+        batched = fa.auto_forecast_demand(*args, forecast_model='auto', batch_selection=True)
+        pd.testing.assert_frame_equal(per_series, batched)
+
+        # holt_winters проверяется по рядам и в пуле процессов
+        pooled = fa.auto_forecast_demand(*args, forecast_model='auto', batch_selection=True, n_jobs=2)
+        pd.testing.assert_frame_equal(per_series, pooled)
+
+    def test_batch_selection_rejects_folds(self):
+        """Тест: Пакетный выбор не поддерживает rolling-origin валидацию"""
+        with self.assertRaises(ValueError):
+            fa.auto_forecast_demand(self.historical_df.copy(), 3, 'Дата', 'Материал', 'Филиал', 'Списание',
+                                    forecast_model='auto', batch_selection=True, n_folds=3)
+
+    def test_failed_batch_falls_back_to_naive(self):
+        """Тест: Если пачка упала в воркере, для ее рядов используется naive"""
+        from concurrent.futures import Future
+
+        class FailingExecutor:
+            _max_workers = 2
+
+            def submit(self, *args, **kwargs):
+                future = Future()
+                future.set_exception(RuntimeError('worker died'))
+                return future
+
+        series_list = [np.array([1.0, 2.0, 5.0]), np.array([4.0, 7.0, 3.0, 9.0])]
+        result = fa._forecast_all_series(series_list, 2, 'auto', 12, executor=FailingExecutor())
+        self.assertEqual(result, [[5.0, 5.0], [9.0, 9.0]])
+
+
+class TestForecastStartBalanceIndex(unittest.TestCase):
+    """Прогноз начального остатка через индекс (материал, филиал)"""
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        frames = []
+        for i, periods in enumerate([1, 2, 24, 30]):
+            frames.append(pd.DataFrame({
+                'Дата': pd.date_range('2021-01-01', periods=periods, freq='MS'),
+                'Материал': [f'MAT-{i:03d}'] * periods,
+                'Филиал': ['Филиал 1'] * periods,
+                'Конечный запас': rng.integers(10, 100, periods).astype(float),
+            }))
+        # Перемешиваем строки: сортировка по дате - задача функции
+        self.historical_df = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+
+        self.forecast_df = pd.DataFrame({
+            'Дата': list(pd.date_range('2024-01-01', periods=3, freq='MS')) * 5,
+            'Материал': [f'MAT-{i:03d}' for i in range(5) for _ in range(3)],
+            'Филиал': ['Филиал 1'] * 15,
+        }, index=np.arange(100, 115))
+
+    def reference(self, forecast_model):
+        """Построчный расчет, как в исходной реализации"""
+        values = []
+        for _, row in self.forecast_df.iterrows():
+            series = self.historical_df[
+                (self.historical_df['Материал'] == row['Материал']) &
+                (self.historical_df['Филиал'] == row['Филиал'])
+            ].sort_values('Дата')['Конечный запас'].reset_index(drop=True)
+            if len(series) == 0:
+                values.append(0)
+            elif forecast_model == 'naive' or len(series) < 3:
+                values.append(series.iloc[-1])
+            else:
+                values.append(fa.fm.forecast_demand(series, horizon=1, model=forecast_model)['forecast'][0])
+        return values
+
+    def test_matches_row_by_row(self):
+        """Тест: Результат совпадает с построчной фильтрацией истории"""
+        for model in ['naive', 'moving_average', 'holt_winters']:
+            result = fa.forecast_start_balance(
+                self.historical_df, self.forecast_df, 'Дата', 'Материал', 'Филиал', 'Конечный запас',
+                'Дата', 'Материал', 'Филиал', forecast_model=model
+            )
+            self.assertTrue(result.index.equals(self.forecast_df.index))
+            np.testing.assert_allclose(result.to_numpy(dtype=float), self.reference(model))
+
+    def test_one_fit_per_key(self):
+        """Тест: Модель подбирается один раз на материал/филиал"""
+        calls = []
+        original = fa.fm.forecast_demand
+
+        def counting_forecast(series, *args, **kwargs):
+            calls.append(len(series))
+            return original(series, *args, **kwargs)
+
+        fa.fm.forecast_demand = counting_forecast
+        try:
+            fa.forecast_start_balance(
+                self.historical_df, self.forecast_df, 'Дата', 'Материал', 'Филиал', 'Конечный запас',
+                'Дата', 'Материал', 'Филиал', forecast_model='moving_average'
+            )
+        finally:
+            fa.fm.forecast_demand = original
+        self.assertEqual(sorted(calls), [24, 30])
+
+
+class TestForecastTelemetry(unittest.TestCase):
+    """Метаданные подбора: запрошенная/использованная модель, fallback, время, итерации"""
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        t = np.arange(36)
+        self.series = pd.Series(100 + 20 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 3, 36))
+        frames = []
+        for i, periods in enumerate([2, 30, 30]):
+            frames.append(pd.DataFrame({
+                'Дата': pd.date_range('2021-01-01', periods=periods, freq='MS'),
+                'Материал': [f'MAT-{i:03d}'] * periods,
+                'Филиал': ['Филиал 1'] * periods,
+                'Списание': rng.integers(10, 100, periods).astype(float),
+            }))
+        self.historical_df = pd.concat(frames, ignore_index=True)
+
+    def test_successful_fit(self):
+        """Тест: Успешный подбор - без fallback, с итерациями и временем"""
+        result = fm.forecast_demand(self.series, horizon=3, model='holt_winters')
+        self.assertEqual(result['model_requested'], 'holt_winters')
+        self.assertEqual(result['model_used'], 'holt_winters')
+        self.assertEqual(result['fallback_chain'], [])
+        self.assertGreater(result['iterations'], 0)
+        self.assertGreater(result['fit_time_s'], 0)
+
+    def test_sarima_short_series_falls_back(self):
+        """Тест: SARIMA на коротком ряду записывает переход на Holt-Winters"""
+        result = fm.forecast_demand(self.series.iloc[:12], horizon=2, model='sarima')
+        self.assertEqual(result['model_used'], 'holt_winters')
+        self.assertEqual([step['model'] for step in result['fallback_chain']], ['sarima'])
+        self.assertIn('мало данных', result['fallback_chain'][0]['reason'])
+
+    def test_failed_fits_record_chain(self):
+        """Тест: Цепочка fallback Holt-Winters -> без сезонности -> moving average"""
+        with mock.patch.object(fm, 'ExponentialSmoothing', side_effect=ValueError('не сошлось')):
+            result = fm.forecast_demand(self.series, horizon=2, model='holt_winters')
+        self.assertEqual(result['model_used'], 'moving_average')
+        self.assertEqual([step['model'] for step in result['fallback_chain']], ['holt_winters', 'holt_winters_trend'])
+        self.assertEqual(result['fallback_chain'][0]['reason'], 'ValueError: не сошлось')
+        np.testing.assert_allclose(result['forecast'], fm.moving_average_forecast(self.series, 3, 2))
+
+    def test_auto_forecast_metadata(self):
+        """Тест: auto_forecast_demand возвращает метаданные по рядам и не меняет прогноз"""
+        args = (self.historical_df.copy(), 3, 'Дата', 'Материал', 'Филиал', 'Списание')
+        expected = fa.auto_forecast_demand(*args, forecast_model='holt_winters')
+        forecast, metadata = fa.auto_forecast_demand(*args, forecast_model='holt_winters', return_metadata=True)
+        pd.testing.assert_frame_equal(forecast, expected)
+
+        self.assertEqual(list(metadata['Материал']), ['MAT-000', 'MAT-001', 'MAT-002'])
+        short = metadata.iloc[0]
+        self.assertEqual(short['model_used'], 'naive')
+        self.assertTrue(short['fallback'])
+        self.assertEqual(short['fallback_chain'], 'holt_winters → naive')
+        self.assertEqual(list(metadata['n_obs']), [2, 30, 30])
+
+        summary = fa.summarize_forecast_metadata(metadata)
+        self.assertEqual(summary['series'], 3)
+        self.assertEqual(summary['fallbacks'], int(metadata['fallback'].sum()))
+        self.assertEqual(summary['by_model']['holt_winters']['series'], 3)
+        self.assertEqual(sum(summary['used'].values()), 3)
+
+    def test_parallel_metadata(self):
+        """Тест: Метаданные из пула процессов совпадают с последовательными"""
+        args = (self.historical_df.copy(), 3, 'Дата', 'Материал', 'Филиал', 'Списание')
+        _, sequential = fa.auto_forecast_demand(*args, forecast_model='auto', return_metadata=True)
+        _, parallel = fa.auto_forecast_demand(*args, forecast_model='auto', n_jobs=2, chunk_size=1,
+                                              return_metadata=True)
+        columns = ['model_requested', 'model_selected', 'model_used', 'fallback_chain', 'n_obs']
+        pd.testing.assert_frame_equal(sequential[columns], parallel[columns])
+        self.assertTrue((sequential['model_requested'] == 'auto').all())
+
+
 class TestForecastAnalysisIntegration(unittest.TestCase):
     """Интеграционные тесты с реальными данными"""
 
@@ -0,0 +1,178 @@
+"""
+Unit тесты для пакетных вариантов моделей в forecasting_models.py
+"""
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.analysis import forecasting_models as fm
+from src.utils.progress import AnalysisCancelled, CancellationToken
+
+
+class TestBatchForecasts(unittest.TestCase):
+    """Пакетные модели должны совпадать с поштучными"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.series = [rng.random(n) * 100 for n in [1, 2, 3, 5, 9, 10, 11, 24, 36]]
+        self.values, self.lengths = fm.pad_series(self.series)
+
+    def test_pad_series(self):
+        """Тест: Матрица выровнена по левому краю, остаток заполнен NaN"""
+        self.assertEqual(self.values.shape, (9, 36))
+        np.testing.assert_array_equal(self.lengths, [1, 2, 3, 5, 9, 10, 11, 24, 36])
+        self.assertTrue(np.isnan(self.values[0, 1:]).all())
+
+    def test_naive_batch(self):
+        """Тест: Пакетный naive = последнее значение каждого ряда"""
+        expected = np.array([fm.naive_forecast(s, horizon=4) for s in self.series])
+        np.testing.assert_array_equal(fm.naive_forecast_batch(self.values, self.lengths, horizon=4), expected)
+
+    def test_moving_average_batch(self):
+        """Тест: Пакетное скользящее среднее, включая ряды короче окна"""
+        expected = np.array([fm.moving_average_forecast(s, window=3, horizon=2) for s in self.series])
+        result = fm.moving_average_forecast_batch(self.values, self.lengths, window=3, horizon=2)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+    def test_exponential_smoothing_batch(self):
+        """Тест: Пакетный SES совпадает с statsmodels (короткие и длинные ряды)"""
+        expected = np.array([fm.exponential_smoothing_forecast(s, alpha=0.3, horizon=3) for s in self.series])
+        result = fm.exponential_smoothing_forecast_batch(self.values, self.lengths, alpha=0.3, horizon=3)
+        np.testing.assert_allclose(result, expected, rtol=1e-9)
+
+    def test_empty_series_gives_nan(self):
+        """Тест: Пустой ряд дает NaN, а не ошибку"""
+        values, lengths = fm.pad_series([[], [1.0, 2.0]])
+        self.assertTrue(np.isnan(fm.naive_forecast_batch(values, lengths)[0, 0]))
+        self.assertTrue(np.isnan(fm.moving_average_forecast_batch(values, lengths)[0, 0]))
+        self.assertTrue(np.isnan(fm.exponential_smoothing_forecast_batch(values, lengths)[0, 0]))
+
+
+class TestBatchModelSelection(unittest.TestCase):
+    """Пакетный выбор модели должен совпадать с auto_select_best_model"""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.series = [rng.random(n) * 100 for n in [3, 7, 8, 12, 24, 36]]
+        self.series.append(np.r_[np.zeros(5), rng.random(20) * 50])  # нули в тестовой части
+        self.values, self.lengths = fm.pad_series(self.series)
+
+    def test_metrics_batch_matches_single(self):
+        """Тест: calculate_metrics_batch = calculate_metrics по каждой строке"""
+        actual = np.array([[10.0, 0.0, 30.0], [5.0, 5.0, 5.0]])
+        predicted = np.array([[12.0, 1.0, 27.0], [5.0, 6.0, 4.0]])
+        result = fm.calculate_metrics_batch(actual, predicted)
+        for i in range(2):
+            single = fm.calculate_metrics(actual[i], predicted[i])
+            np.testing.assert_allclose(result[i], [single[name] for name in fm.METRIC_NAMES])
+
+    def test_selection_matches_single(self):
+        """Тест: Лучшая модель и метрики совпадают с поштучным выбором"""
+        best_models, metrics = fm.auto_select_best_model_batch(self.values, self.lengths,
+                                                               models=fm.CANDIDATE_MODELS)
+        self.assertEqual(metrics.shape, (len(self.series), len(fm.CANDIDATE_MODELS), 4))
+
+        for i, series in enumerate(self.series):
+            best, single_metrics = fm.auto_select_best_model(pd.Series(series))
+            self.assertEqual(best_models[i], best)
+            if single_metrics:
+                expected = [[single_metrics[m][name] for name in fm.METRIC_NAMES] for m in fm.CANDIDATE_MODELS]
+                np.testing.assert_allclose(metrics[i], expected, rtol=1e-9)
+            else:
+                self.assertTrue(np.isnan(metrics[i]).all())
+
+    def test_default_without_holt_winters(self):
+        """Тест: По умолчанию медленная модель holt_winters в пакетный выбор не входит"""
+        best_models, metrics = fm.auto_select_best_model_batch(self.values, self.lengths)
+        self.assertEqual(metrics.shape[1], len(fm.BATCH_CANDIDATE_MODELS))
+        self.assertNotIn('holt_winters', fm.BATCH_CANDIDATE_MODELS)
+        self.assertTrue(set(best_models) <= set(fm.BATCH_CANDIDATE_MODELS))
+
+    def test_holt_winters_challenge_matches_single(self):
+        """Тест: Пакетный выбор + сравнение с holt_winters по рядам = auto_select_best_model"""
+        best_models, metrics = fm.auto_select_best_model_batch(self.values, self.lengths)
+        for i, series in enumerate(self.series):
+            model = best_models[i]
+            mape = metrics[i, fm.BATCH_CANDIDATE_MODELS.index(model), 0]
+            self.assertEqual(fm.challenge_with_holt_winters(series, model, mape),
+                             fm.auto_select_best_model(pd.Series(series))[0])
+
+    def test_cancel(self):
+        """Тест: Отмененный токен прерывает пакетный выбор"""
+        token = CancellationToken()
+        token.cancel()
+        with self.assertRaises(AnalysisCancelled):
+            fm.auto_select_best_model_batch(self.values, self.lengths, models=fm.CANDIDATE_MODELS,
+                                            cancel_token=token)
+
+    def test_unknown_model(self):
+        """Тест: Неизвестная модель вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            fm.auto_select_best_model_batch(self.values, self.lengths, models=('sarima',))
+
+
+class TestRollingOriginBacktest(unittest.TestCase):
+    """Rolling-origin кросс-валидация с теплым стартом Holt-Winters/SARIMA"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        t = np.arange(36)
+        self.series = pd.Series(100 + 20 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 3, 36))
+
+    def test_single_fold_matches_holdout(self):
+        """Тест: Один фолд совпадает с auto_select_best_model"""
+        best, metrics = fm.auto_select_best_model(self.series)
+        cv_best, cv_metrics = fm.rolling_origin_backtest(self.series, n_folds=1)
+        self.assertEqual(cv_best, best)
+        for name in fm.CANDIDATE_MODELS:
+            for metric in fm.METRIC_NAMES:
+                self.assertAlmostEqual(cv_metrics[name][metric], metrics[name][metric], places=6)
+
+    def test_folds_are_averaged(self):
+        """Тест: Метрики модели - среднее по фолдам"""
+        best, metrics = fm.rolling_origin_backtest(self.series, n_folds=4, horizon=2, step=3)
+        self.assertIn(best, fm.CANDIDATE_MODELS)
+        for name, values in metrics.items():
+            self.assertEqual(len(values['folds']), 4)
+            self.assertAlmostEqual(values['MAE'], np.mean([f['MAE'] for f in values['folds']]))
+
+    def test_auto_select_delegates(self):
+        """Тест: auto_select_best_model(n_folds>1) использует rolling-origin"""
+        best, metrics = fm.auto_select_best_model(self.series, n_folds=3)
+        self.assertEqual(len(metrics['naive']['folds']), 3)
+        result = fm.forecast_demand(self.series, horizon=2, model='auto', n_folds=3)
+        self.assertEqual(result['model_used'], best)
+        self.assertEqual(len(result['forecast']), 2)
+
+    def test_short_series_skips_folds(self):
+        """Тест: Фолды с обучающей частью короче min_train_size пропускаются"""
+        _, metrics = fm.rolling_origin_backtest(self.series.iloc[:9], models=('naive',), n_folds=5,
+                                                horizon=3, min_train_size=5)
+        self.assertEqual(len(metrics['naive']['folds']), 2)
+        self.assertEqual(fm.rolling_origin_backtest(self.series.iloc[:4], n_folds=3), ('moving_average', {}))
+
+    def test_warm_state_reused(self):
+        """Тест: Состояние Holt-Winters переиспользуется и дает близкий прогноз"""
+        cold, state = fm._holt_winters_fit(self.series.iloc[:30], horizon=3, keep_state=True)
+        np.testing.assert_allclose(cold, fm.holt_winters_forecast(self.series.iloc[:30], horizon=3))
+        self.assertEqual(state['config'], ('holt_winters', 'add', 'add', 12))
+
+        warm, warm_state = fm._holt_winters_fit(self.series.iloc[:31], horizon=3, warm_state=state,
+                                                keep_state=True)
+        reference = fm.holt_winters_forecast(self.series.iloc[:31], horizon=3)
+        self.assertEqual(warm_state['config'], state['config'])
+        np.testing.assert_allclose(warm, reference, rtol=0.05)
+
+    def test_unknown_model(self):
+        """Тест: Неизвестная модель вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            fm.rolling_origin_backtest(self.series, models=('prophet',))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
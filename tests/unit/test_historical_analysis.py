@@ -2,11 +2,15 @@
 Unit тесты для historical_analysis.py
 """
 import unittest
+import contextlib
+import io
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import sys
 import os
+import shutil
+import tempfile
 
 # Добавляем путь к модулям
 sys.path.insert(0, os.path.dirname(__file__))
@@ -195,6 +199,120 @@ class TestHistoricalAnalysis(unittest.TestCase):
         self.assertTrue(np.isnan(cv_zero))
 
 
+class TestHistoricalEngineParity(unittest.TestCase):
+    """Сверка быстрого движка (сортировка + смещения) с исходным циклом"""
+
+    def setUp(self):
+        """Несколько групп разной длины, перемешанные строки, дефициты и нули"""
+        rng = np.random.default_rng(42)
+        frames = []
+        for i, periods in enumerate([36, 24, 12, 5, 1, 30]):
+            for branch in ['Филиал 1', 'Филиал 2']:
+                start = rng.integers(0, 200, periods).astype(float)
+                consumption = rng.integers(0, 40, periods).astype(float)
+                consumption[rng.random(periods) < 0.2] = 0
+                end = start - consumption + rng.integers(-30, 30, periods)
+                frames.append(pd.DataFrame({
+                    'Дата': pd.date_range('2021-01-01', periods=periods, freq='MS'),
+                    'Материал': [f'MAT-{i:03d}'] * periods,
+                    'Филиал': [branch] * periods,
+                    'Начальный запас': start,
+                    'Конечный запас': end,
+                    'Списание': consumption,
+                    'Стоимость': np.abs(end) * 12.5,
+                }))
+        self.df = pd.concat(frames).sample(frac=1, random_state=0).reset_index(drop=True)
+        self.args = ('Дата', 'Филиал', 'Материал', 'Начальный запас', 'Конечный запас', 'Стоимость', 5.0)
+
+    def test_parity_with_consumption(self):
+        """Тест: Результаты с колонкой списания совпадают"""
+        fast, _ = ha.analyze_historical_data(self.df, *self.args, consumption_column='Списание', engine='fast')
+        loop, _ = ha.analyze_historical_data(self.df, *self.args, consumption_column='Списание', engine='loop')
+        pd.testing.assert_frame_equal(fast, loop)
+
+    def test_parity_without_consumption(self):
+        """Тест: Результаты без колонки списания (по разнице остатков) совпадают"""
+        fast, _ = ha.analyze_historical_data(self.df, *self.args, engine='fast')
+        loop, _ = ha.analyze_historical_data(self.df, *self.args, engine='loop')
+        pd.testing.assert_frame_equal(fast, loop)
+
+    def test_group_order_matches_groupby(self):
+        """Тест: Порядок групп совпадает с df.groupby по материалу/филиалу"""
+        fast, _ = ha.analyze_historical_data(self.df, *self.args, engine='fast')
+        expected = list(self.df.groupby(['Материал', 'Филиал']).groups.keys())
+        self.assertEqual(list(zip(fast['Материал'], fast['Филиал'])), expected)
+
+    def test_unknown_engine(self):
+        """Тест: Неизвестный движок вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            ha.analyze_historical_data(self.df, *self.args, engine='unknown')
+
+
+class TestHistoricalStreaming(unittest.TestCase):
+    """Потоковый анализ по частям совпадает с анализом всей таблицы"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        frames = []
+        for i, periods in enumerate([36, 24, 5, 1, 30]):
+            for branch in ['Филиал 1', 'Филиал 2']:
+                start = rng.integers(0, 200, periods).astype(float)
+                consumption = -rng.integers(0, 40, periods).astype(float)
+                frames.append(pd.DataFrame({
+                    'Дата': pd.date_range('2021-01-01', periods=periods, freq='MS'),
+                    'Материал': [f'MAT-{i:03d}'] * periods,
+                    'Филиал': [branch] * periods,
+                    'Начальный запас': start,
+                    'Конечный запас': start + consumption + rng.integers(0, 30, periods),
+                    'Списание': consumption,
+                    'Стоимость': rng.integers(100, 1000, periods).astype(float),
+                }))
+        self.df = pd.concat(frames, ignore_index=True)
+        self.args = ('Дата', 'Филиал', 'Материал', 'Начальный запас', 'Конечный запас', 'Стоимость', 5.0, 'Списание')
+        self.expected, _ = ha.analyze_historical_data(self.df, *self.args)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assert_stream_matches(self, source, **kwargs):
+        parts = list(ha.analyze_historical_data_stream(source, *self.args, **kwargs))
+        self.assertGreater(len(parts), 1)
+        pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), self.expected)
+
+    def test_chunks_from_frames(self):
+        """Тест: Группы, разрезанные между частями, собираются целиком"""
+        chunks = [self.df.iloc[i:i + 17] for i in range(0, len(self.df), 17)]
+        self.assert_stream_matches(chunks)
+
+    def test_parquet_row_groups(self):
+        """Тест: Parquet читается по row groups"""
+        path = os.path.join(self.tmp_dir, 'history.parquet')
+        self.df.assign(Комментарий='нет').to_parquet(path, row_group_size=20)
+        self.assert_stream_matches(path, chunk_rows=20)
+
+    def test_csv_chunks(self):
+        """Тест: CSV читается блоками"""
+        path = os.path.join(self.tmp_dir, 'history.csv')
+        self.df.to_csv(path, index=False)
+        self.assert_stream_matches(path, chunk_rows=25)
+
+    def test_convention_detected_once(self):
+        """Тест: Конвенция списания определяется по первой части и не переопределяется в следующих"""
+        chunks = [self.df.iloc[i:i + 17] for i in range(0, len(self.df), 17)]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assert_stream_matches(chunks)
+        self.assertEqual(output.getvalue().count('Нормализация списания'), 1)
+
+    def test_ungrouped_input_rejected(self):
+        """Тест: Повтор уже завершенной группы - ошибка"""
+        shuffled = self.df.sample(frac=1, random_state=0)
+        chunks = [shuffled.iloc[i:i + 20] for i in range(0, len(shuffled), 20)]
+        with self.assertRaises(ValueError):
+            list(ha.analyze_historical_data_stream(chunks, *self.args))
+
+
 class TestHistoricalAnalysisIntegration(unittest.TestCase):
     """Интеграционные тесты с реальными данными"""
 
@@ -0,0 +1,137 @@
+"""
+Unit тесты для инкрементального исторического анализа (historical_incremental.py)
+"""
+import unittest
+import tempfile
+import shutil
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis import historical_analysis as ha
+from src.analysis import historical_metrics as hm
+from src.analysis.historical_incremental import HistoricalAggregates
+
+
+COLUMNS = (gen.DATE_COLUMN, gen.BRANCH_COLUMN, gen.MATERIAL_COLUMN, gen.START_COLUMN, gen.END_COLUMN,
+           gen.COST_COLUMN)
+CONSUMPTION = gen.CONSUMPTION_COLUMN
+
+
+class TestHistoricalAggregates(unittest.TestCase):
+    """Тесты совпадения инкрементального расчета с полным"""
+
+    def setUp(self):
+        self.df = gen.make_irregular_history((40, 30, 24, 13, 5, 1), seed=7)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assert_metrics_equal(self, actual, expected):
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        for column in expected.columns:
+            if expected[column].dtype.kind == 'f':
+                np.testing.assert_allclose(actual[column], expected[column], rtol=1e-9, atol=1e-9,
+                                           equal_nan=True, err_msg=column)
+            else:
+                self.assertEqual(actual[column].tolist(), expected[column].tolist(), column)
+
+    def fold_by_month(self, consumption_column, first_months=8):
+        """Агрегаты: первые месяцы одним обновлением, затем по одному месяцу через сохранение"""
+        dates = np.sort(self.df['Дата'].unique())
+        path = os.path.join(self.tmp_dir, 'aggregates.parquet')
+        aggregates = HistoricalAggregates()
+        aggregates.update(self.df[self.df['Дата'] < dates[first_months]], *COLUMNS, consumption_column)
+        for date in dates[first_months:]:
+            aggregates.save(path)
+            aggregates = HistoricalAggregates.load(path)
+            aggregates.update(self.df[self.df['Дата'] == date], *COLUMNS, consumption_column)
+        return aggregates
+
+    def test_matches_full_recompute(self):
+        """Тест: Помесячное обновление совпадает с полным пересчетом"""
+        for consumption_column in [CONSUMPTION, None]:
+            aggregates = self.fold_by_month(consumption_column)
+            expected = hm.compute_historical_metrics(self.df, *COLUMNS, 5.0, consumption_column,
+                                                     float_dtype=np.float64)
+            self.assert_metrics_equal(aggregates.metrics(5.0, float_dtype=np.float64), expected)
+
+    def test_seasonality_and_trend_present(self):
+        """Тест: Сезонность и тренд считаются для длинных групп и пусты для коротких"""
+        metrics = self.fold_by_month(CONSUMPTION).metrics(5.0)
+        lengths = metrics.set_index(['Материал', 'Филиал'])['periods']
+        seasonality = metrics.set_index(['Материал', 'Филиал'])['seasonality']
+        self.assertTrue(seasonality[lengths >= 24].notna().all())
+        self.assertTrue(seasonality[lengths < 24].isna().all())
+
+    def test_new_group_appears(self):
+        """Тест: Группа, впервые появившаяся в новом периоде, добавляется в порядке ключей"""
+        aggregates = HistoricalAggregates()
+        aggregates.update(self.df[self.df['Материал'] != 'MAT-000'], *COLUMNS, CONSUMPTION)
+        aggregates.update(self.df[self.df['Материал'] == 'MAT-000'], *COLUMNS, CONSUMPTION)
+        expected = hm.compute_historical_metrics(self.df, *COLUMNS, 5.0, CONSUMPTION, float_dtype=np.float64)
+        self.assert_metrics_equal(aggregates.metrics(5.0, float_dtype=np.float64), expected)
+
+    def test_already_folded_rows_skipped(self):
+        """Тест: Строки не позже уже учтенных пропускаются без изменения агрегатов"""
+        aggregates = HistoricalAggregates()
+        aggregates.update(self.df, *COLUMNS, CONSUMPTION)
+        before = {name: values.copy() for name, values in aggregates.data.items()}
+
+        self.assertEqual(aggregates.update(self.df, *COLUMNS, CONSUMPTION), 0)
+        self.assertEqual(aggregates.skipped_rows, len(self.df))
+        for name, values in before.items():
+            np.testing.assert_array_equal(aggregates.data[name], values, err_msg=name)
+
+    def test_same_month_reapplied(self):
+        """Тест: Повторный запуск с тем же последним месяцем не меняет результат"""
+        path = os.path.join(self.tmp_dir, 'state.parquet')
+        last = self.df['Дата'].max()
+        ha.analyze_historical_data_incremental(self.df[self.df['Дата'] < last], path, *COLUMNS, 5.0,
+                                               consumption_column=CONSUMPTION)
+        for _ in range(2):
+            results, _ = ha.analyze_historical_data_incremental(
+                self.df[self.df['Дата'] == last], path, *COLUMNS, 5.0, consumption_column=CONSUMPTION
+            )
+        expected, _ = ha.analyze_historical_data(self.df, *COLUMNS, 5.0, consumption_column=CONSUMPTION)
+        pd.testing.assert_frame_equal(results, expected)
+
+    def test_convention_stored(self):
+        """Тест: Конвенция списания определяется при первом запуске и хранится в агрегатах"""
+        path = os.path.join(self.tmp_dir, 'state.parquet')
+        last = self.df['Дата'].max()
+        ha.analyze_historical_data_incremental(self.df[self.df['Дата'] < last], path, *COLUMNS, 5.0,
+                                               consumption_column=CONSUMPTION)
+        self.assertEqual(HistoricalAggregates.load(path).consumption_convention, 'POSITIVE')
+
+        # Новый месяц в отрицательном формате нормализуется по сохраненной конвенции
+        new_month = self.df[self.df['Дата'] == last].copy()
+        new_month[CONSUMPTION] = -new_month[CONSUMPTION]
+        results, _ = ha.analyze_historical_data_incremental(new_month, path, *COLUMNS, 5.0,
+                                                            consumption_column=CONSUMPTION)
+        expected, _ = ha.analyze_historical_data(self.df, *COLUMNS, 5.0, consumption_column=CONSUMPTION)
+        pd.testing.assert_frame_equal(results, expected)
+        self.assertEqual(HistoricalAggregates.load(path).consumption_convention, 'POSITIVE')
+
+    def test_analyze_incremental_strings(self):
+        """Тест: analyze_historical_data_incremental дает строки полного анализа"""
+        path = os.path.join(self.tmp_dir, 'state.parquet')
+        last = self.df['Дата'].max()
+        ha.analyze_historical_data_incremental(self.df[self.df['Дата'] < last], path, *COLUMNS, 5.0,
+                                               consumption_column=CONSUMPTION)
+        results, explanation = ha.analyze_historical_data_incremental(
+            self.df[self.df['Дата'] == last], path, *COLUMNS, 5.0, consumption_column=CONSUMPTION
+        )
+        expected, _ = ha.analyze_historical_data(self.df, *COLUMNS, 5.0, consumption_column=CONSUMPTION)
+        pd.testing.assert_frame_equal(results, expected)
+        self.assertTrue(len(explanation) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
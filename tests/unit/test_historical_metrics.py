@@ -0,0 +1,150 @@
+"""
+Unit тесты для historical_metrics.py
+"""
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+from scipy import stats
+from statsmodels.tsa.seasonal import seasonal_decompose
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis import historical_analysis as ha
+from src.analysis import historical_metrics as hm
+
+
+ARGS = (gen.DATE_COLUMN, gen.BRANCH_COLUMN, gen.MATERIAL_COLUMN, gen.START_COLUMN, gen.END_COLUMN,
+        gen.COST_COLUMN, 5.0)
+
+
+class TestHistoricalMetrics(unittest.TestCase):
+    """Тесты числового режима и ленивого форматирования"""
+
+    def setUp(self):
+        self.df = gen.make_irregular_history((36, 24, 12, 5, 1, 30), seed=42)
+        self.args = ARGS
+
+    def test_numeric_dtypes(self):
+        """Тест: Числовой режим возвращает float32/int32 колонки"""
+        metrics, explanation = ha.analyze_historical_data(self.df, *self.args, consumption_column=gen.CONSUMPTION_COLUMN,
+                                                          output='numeric')
+        self.assertEqual(metrics['average_usage'].dtype, np.float32)
+        self.assertEqual(metrics['lost_profit'].dtype, np.float32)
+        self.assertEqual(metrics['periods'].dtype, np.int32)
+        self.assertEqual(metrics['deficit_periods'].dtype, np.int32)
+        self.assertEqual(metrics['excess_inventory'].dtype, bool)
+        self.assertEqual(len(metrics), self.df.groupby(['Материал', 'Филиал']).ngroups)
+        self.assertTrue(len(explanation) > 0)
+
+    def test_formatted_matches_string_output(self):
+        """Тест: Форматирование float64-метрик совпадает со строковым режимом"""
+        for consumption_column in [gen.CONSUMPTION_COLUMN, None]:
+            df = self.df.copy()
+            strings, _ = ha.analyze_historical_data(df, *self.args, consumption_column=consumption_column)
+            metrics = hm.compute_historical_metrics(df, *self.args, consumption_column=consumption_column,
+                                                    float_dtype=np.float64)
+            pd.testing.assert_frame_equal(hm.format_historical_metrics(metrics), strings)
+
+    def test_numeric_float64_formats_as_strings(self):
+        """Тест: Числовой режим с float64 форматируется в строки строкового режима"""
+        strings, _ = ha.analyze_historical_data(self.df.copy(), *self.args, consumption_column=gen.CONSUMPTION_COLUMN)
+        metrics, _ = ha.analyze_historical_data(self.df.copy(), *self.args, consumption_column=gen.CONSUMPTION_COLUMN,
+                                                output='numeric', float_dtype=np.float64)
+        self.assertEqual(metrics['average_usage'].dtype, np.float64)
+        pd.testing.assert_frame_equal(hm.format_historical_metrics(metrics), strings)
+
+    def test_float32_close_to_float64(self):
+        """Тест: float32 результат совпадает с float64 в пределах точности"""
+        metrics32 = hm.compute_historical_metrics(self.df, *self.args, consumption_column=gen.CONSUMPTION_COLUMN)
+        metrics64 = hm.compute_historical_metrics(self.df, *self.args, consumption_column=gen.CONSUMPTION_COLUMN,
+                                                  float_dtype=np.float64)
+        np.testing.assert_allclose(metrics32['reorder_point'], metrics64['reorder_point'], rtol=1e-6)
+        np.testing.assert_allclose(metrics32['fill_rate'], metrics64['fill_rate'], rtol=1e-6)
+
+    def test_lazy_view_formats_only_requested_rows(self):
+        """Тест: FormattedHistoricalView форматирует срезы по запросу"""
+        metrics = hm.compute_historical_metrics(self.df, *self.args, consumption_column=gen.CONSUMPTION_COLUMN,
+                                                float_dtype=np.float64)
+        view = hm.FormattedHistoricalView(metrics)
+        full = view.to_frame()
+
+        self.assertEqual(len(view), len(metrics))
+        pd.testing.assert_frame_equal(view.head(3), full.iloc[:3])
+        pd.testing.assert_series_equal(view[4], full.iloc[4])
+        chunks = list(view.iter_chunks(5))
+        pd.testing.assert_frame_equal(pd.concat(chunks), full)
+
+    def test_empty_input(self):
+        """Тест: Пустой DataFrame дает пустой результат с колонками"""
+        metrics = hm.compute_historical_metrics(self.df.iloc[:0], *self.args)
+        self.assertTrue(metrics.empty)
+        self.assertIn('reorder_point', metrics.columns)
+
+
+class TestSeasonalKernel(unittest.TestCase):
+    """Векторное ядро сезонности и тренда против seasonal_decompose/linregress"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.lengths = [24, 25, 30, 36, 47, 60, 12, 5, 1, 18]
+        series = []
+        for n in self.lengths:
+            t = np.arange(n)
+            series.append(100 + 0.8 * t + 15 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 5, n))
+        self.series = series
+        self.values = np.concatenate(series)
+        self.bounds = np.r_[0, np.cumsum(self.lengths)]
+
+    def test_matches_statsmodels(self):
+        """Тест: Сезонность и тренд совпадают с поочередным расчетом по группам"""
+        seasonality, trend = hm.seasonal_strength_and_slope(self.values, self.bounds)
+        for i, series in enumerate(self.series):
+            n = len(series)
+            if n >= 24:
+                decomposition = seasonal_decompose(series, model='additive', period=12)
+                expected = np.nanstd(decomposition.seasonal, ddof=1) / np.nanstd(series, ddof=1)
+                self.assertAlmostEqual(seasonality[i], expected, places=10)
+            else:
+                self.assertTrue(np.isnan(seasonality[i]))
+            if n > 12:
+                self.assertAlmostEqual(trend[i], stats.linregress(np.arange(n), series).slope, places=10)
+            else:
+                self.assertTrue(np.isnan(trend[i]))
+
+    def test_batches_match_single_matrix(self):
+        """Тест: Разбиение на пачки не меняет результат"""
+        expected = hm.seasonal_strength_and_slope(self.values, self.bounds)
+        original = hm._KERNEL_MAX_CELLS
+        hm._KERNEL_MAX_CELLS = 50
+        try:
+            result = hm.seasonal_strength_and_slope(self.values, self.bounds)
+        finally:
+            hm._KERNEL_MAX_CELLS = original
+        np.testing.assert_allclose(result[0], expected[0], equal_nan=True)
+        np.testing.assert_allclose(result[1], expected[1], equal_nan=True)
+
+    def test_missing_values(self):
+        """Тест: Группа с пропуском дает NaN и не влияет на соседние"""
+        values = self.values.copy()
+        values[self.bounds[1] + 3] = np.nan
+        seasonality, trend = hm.seasonal_strength_and_slope(values, self.bounds)
+        expected_seasonality, expected_trend = hm.seasonal_strength_and_slope(self.values, self.bounds)
+        self.assertTrue(np.isnan(seasonality[1]))
+        self.assertTrue(np.isnan(trend[1]))
+        self.assertAlmostEqual(seasonality[0], expected_seasonality[0])
+        self.assertAlmostEqual(trend[3], expected_trend[3])
+
+    def test_engines_agree(self):
+        """Тест: Быстрый движок совпадает с эталонным циклом по группам"""
+        df = gen.make_irregular_history((24, 36, 48, 12, 3), seed=42)
+        fast, _ = ha.analyze_historical_data(df, *ARGS, consumption_column=gen.CONSUMPTION_COLUMN)
+        loop, _ = ha.analyze_historical_data(df, *ARGS, consumption_column=gen.CONSUMPTION_COLUMN, engine='loop')
+        pd.testing.assert_frame_equal(fast.reset_index(drop=True), loop.reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,186 @@
+"""
+Unit тесты для локального хранилища истории (history_store.py)
+"""
+import unittest
+import tempfile
+import shutil
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis import historical_analysis as ha
+from src.utils import history_store as hs
+from src.utils.history_store import HistoryStore
+
+
+class TestHistoryStore(unittest.TestCase):
+    """Тесты загрузки и чтения истории"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'history.sqlite')
+        self.df = gen.make_irregular_history((24, 13, 5, 1), seed=3, start_date='2022-01-01')
+        self.store = HistoryStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_load_and_read_back(self):
+        """Тест: Загруженные строки читаются обратно по ролям, упорядоченными по группе и дате"""
+        stats = self.store.load_frame(self.df, source='test')
+        self.assertEqual(stats['rows'], len(self.df))
+        self.assertEqual(stats['watermark'], self.df['Дата'].max())
+
+        result = self.store.read_groups(categorical=False)
+        expected = self.df.sort_values(['Материал', 'Филиал', 'Дата']).reset_index(drop=True)
+        self.assertEqual(list(result.columns), list(hs.STORE_COLUMNS))
+        self.assertEqual(result['material'].tolist(), expected['Материал'].tolist())
+        pd.testing.assert_series_equal(result['date'], expected['Дата'], check_names=False)
+        np.testing.assert_array_equal(result['consumption'], expected[gen.CONSUMPTION_COLUMN])
+        np.testing.assert_array_equal(result['arrival'], expected[gen.ARRIVAL_COLUMN])
+
+        log = pd.read_sql_query('SELECT * FROM history_loads', self.store.connection)
+        self.assertEqual(log['rows'].tolist(), [len(self.df)])
+        self.assertEqual(log['source'].tolist(), ['test'])
+
+    def test_indexes_exist(self):
+        """Тест: Индексы схемы есть и после массовой загрузки без индексов"""
+        original = hs.BULK_LOAD_ROWS
+        hs.BULK_LOAD_ROWS = 10
+        try:
+            self.store.load_frame(self.df)
+        finally:
+            hs.BULK_LOAD_ROWS = original
+        indexes = {row[1] for row in self.store.connection.execute('PRAGMA index_list(historical_data)')}
+        self.assertTrue(set(hs.TABLE_INDEXES) <= indexes)
+        plan = ' '.join(str(row) for row in self.store.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM historical_data WHERE material = 'MAT-000000' AND branch = 'Филиал 1'"
+        ))
+        self.assertIn('idx_historical_data_group_date', plan)
+
+    def test_append_only_new_dates(self):
+        """Тест: Дозагрузка пропускает строки не позже водяного знака"""
+        cutoff = pd.Timestamp('2022-06-01')
+        old = self.df[self.df['Дата'] <= cutoff]
+        self.store.load_frame(old)
+        self.assertEqual(self.store.watermark(), old['Дата'].max())
+
+        stats = self.store.append_new(self.df)
+        self.assertEqual(stats['skipped_old'], len(old))
+        self.assertEqual(stats['rows'], len(self.df) - len(old))
+        self.assertEqual(self.store.row_count(), len(self.df))
+        self.assertEqual(self.store.append_new(self.df)['rows'], 0)
+
+    def test_branch_files_same_months(self):
+        """Тест: Файлы разных филиалов за одни и те же месяцы загружаются оба"""
+        for branch in ['Филиал 1', 'Филиал 2']:
+            path = os.path.join(self.tmp_dir, f'{branch}.parquet')
+            self.df[self.df['Филиал'] == branch].to_parquet(path)
+            stats = self.store.load_file(path)
+            self.assertEqual(stats['skipped_old'], 0, branch)
+
+        self.assertEqual(self.store.row_count(), len(self.df))
+        self.assertEqual(sorted(self.store.groups()['branch'].unique()), ['Филиал 1', 'Филиал 2'])
+
+        # Новые месяцы дописываются только в своей группе
+        last = self.store.group_watermarks()
+        self.assertEqual(last[('MAT-000003', 'Филиал 1')], pd.Timestamp('2022-01-01'))
+        extra = self.df[(self.df['Материал'] == 'MAT-000003') & (self.df['Филиал'] == 'Филиал 1')].copy()
+        extra['Дата'] = pd.Timestamp('2022-02-01')
+        stats = self.store.append_new(pd.concat([self.df, extra]))
+        self.assertEqual(stats['rows'], len(extra))
+        self.assertEqual(stats['skipped_old'], len(self.df))
+
+    def test_single_branch_file(self):
+        """Тест: Файл без колонки филиала загружается с филиалом NO_BRANCH"""
+        df = self.df[self.df['Филиал'] == 'Филиал 1'].drop(columns=['Филиал'])
+        stats = self.store.load_frame(df)
+        self.assertEqual(stats['rows'], len(df))
+        self.assertEqual(self.store.groups()['branch'].unique().tolist(), [hs.NO_BRANCH])
+        self.assertEqual(self.store.append_new(df)['rows'], 0)
+
+        group = self.store.read_group('MAT-000000', hs.NO_BRANCH)
+        self.assertEqual(len(group), 24)
+
+        with self.assertRaises(KeyError):
+            self.store.load_frame(df.drop(columns=['Материал']))
+
+    def test_load_file_with_chunks(self):
+        """Тест: Файл читается частями, водяной знак не отсекает части одного файла"""
+        path = os.path.join(self.tmp_dir, 'history.parquet')
+        self.df.to_parquet(path, row_group_size=15)
+        stats = self.store.load_file(path, chunk_rows=15)
+        self.assertEqual(stats['rows'], len(self.df))
+        self.assertEqual(self.store.load_file(path)['rows'], 0)
+
+    def test_invalid_rows_skipped(self):
+        """Тест: Строки без даты или материала не загружаются"""
+        df = self.df.copy()
+        df.loc[0, 'Дата'] = pd.NaT
+        df.loc[1, 'Материал'] = None
+        stats = self.store.load_frame(df)
+        self.assertEqual(stats['skipped_invalid'], 2)
+        self.assertEqual(stats['rows'], len(df) - 2)
+
+    def test_group_slices(self):
+        """Тест: Срез по группам и датам"""
+        self.store.load_frame(self.df)
+        group = self.store.read_group('MAT-000001', 'Филиал 2', columns=['consumption'],
+                                      start_date='2022-03-01', end_date='2022-05-01')
+        expected = self.df[(self.df['Материал'] == 'MAT-000001') & (self.df['Филиал'] == 'Филиал 2')
+                           & self.df['Дата'].between('2022-03-01', '2022-05-01')].sort_values('Дата')
+        self.assertEqual(list(group.columns), ['material', 'branch', 'date', 'consumption'])
+        np.testing.assert_array_equal(group['consumption'], expected[gen.CONSUMPTION_COLUMN])
+
+        keys = [('MAT-000002', 'Филиал 1'), ('MAT-000000', 'Филиал 2')]
+        several = self.store.read_groups(keys)
+        self.assertEqual(set(several[['material', 'branch']].drop_duplicates().itertuples(index=False, name=None)),
+                         set(keys))
+        self.assertIsInstance(several['material'].dtype, pd.CategoricalDtype)
+        self.assertEqual(len(self.store.groups()), self.df.groupby(['Материал', 'Филиал']).ngroups)
+
+        with self.assertRaises(KeyError):
+            self.store.read_groups(columns=['unknown'])
+
+    def test_stream_analysis_over_store(self):
+        """Тест: Потоковый анализ по хранилищу совпадает с анализом исходной таблицы"""
+        self.store.load_frame(self.df)
+        expected, _ = ha.analyze_historical_data(
+            self.df, 'Дата', 'Филиал', 'Материал', 'Начальный остаток', 'Конечный остаток', gen.COST_COLUMN, 5.0,
+            gen.CONSUMPTION_COLUMN
+        )
+        chunks = self.store.iter_chunks(chunk_rows=17, columns=['start_quantity', 'end_quantity', 'end_cost',
+                                                                 'consumption'])
+        parts = list(ha.analyze_historical_data_stream(
+            chunks, 'date', 'branch', 'material', 'start_quantity', 'end_quantity', 'end_cost', 5.0, 'consumption'
+        ))
+        self.assertGreater(len(parts), 1)
+        pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), expected, check_dtype=False,
+                                      check_categorical=False)
+
+        # Хранилище передается как источник напрямую
+        direct = list(ha.analyze_historical_data_stream(
+            self.store, 'date', 'branch', 'material', 'start_quantity', 'end_quantity', 'end_cost', 5.0,
+            'consumption'
+        ))
+        pd.testing.assert_frame_equal(pd.concat(direct, ignore_index=True), expected, check_dtype=False,
+                                      check_categorical=False)
+
+    def test_reopen_keeps_data(self):
+        """Тест: Повторное открытие применяет миграции без потери данных"""
+        self.store.load_frame(self.df)
+        self.store.close()
+        with HistoryStore(self.path) as store:
+            self.assertEqual(store.row_count(), len(self.df))
+            self.assertEqual(store.watermark(), self.df['Дата'].max())
+        self.store = HistoryStore(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+"""
+Unit тесты для профилирования этапов (instrumentation.py)
+"""
+import unittest
+import tempfile
+import shutil
+import json
+import os
+import sys
+import time
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.utils.instrumentation import RunProfile, current_rss_mb
+
+
+class TestRunProfile(unittest.TestCase):
+    """Тесты этапов, счетчиков и отчета"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_stage_records_duration_and_rate(self):
+        """Тест: Этап хранит длительность, строки и строки/с"""
+        profile = RunProfile()
+        with profile.stage('historical', rows=1000) as stage:
+            time.sleep(0.01)
+            stage.rows_out = 10
+
+        span = profile.stages[0]
+        self.assertEqual(span.status, 'ok')
+        self.assertGreaterEqual(span.duration_s, 0.01)
+        self.assertAlmostEqual(span.rows_per_s, 1000 / span.duration_s)
+        self.assertEqual(span.to_dict()['rows_out'], 10)
+
+    def test_error_stage(self):
+        """Тест: Исключение отмечает этап как error и пробрасывается"""
+        profile = RunProfile()
+        with self.assertRaises(KeyError):
+            with profile.stage('forecast'):
+                raise KeyError('Дата')
+        self.assertEqual(profile.stages[0].status, 'error')
+        self.assertIn('KeyError', profile.stages[0].error)
+        self.assertIn('(error)', profile.summary_rows()[0][0])
+
+    def test_counters(self):
+        """Тест: Счетчики складываются"""
+        profile = RunProfile()
+        profile.count('fallback')
+        profile.count('fallback', 2)
+        profile.update_counters({'holt_winters': 5, 'naive': 1}, prefix='used:')
+        self.assertEqual(profile.counters, {'fallback': 3, 'used:holt_winters': 5, 'used:naive': 1})
+
+    def test_report_json(self):
+        """Тест: Отчет сохраняется в JSON с этапами, счетчиками и сведениями"""
+        profile = RunProfile('analysis')
+        profile.set_info('file', 'history.xlsx')
+        for name in ['load', 'historical', 'historical']:
+            with profile.stage(name):
+                pass
+        profile.count('series:auto', 4)
+        profile.finish()
+
+        path = os.path.join(self.tmp_dir, 'report.json')
+        profile.save(path)
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+
+        self.assertEqual([stage['name'] for stage in report['stages']], ['load', 'historical', 'historical'])
+        self.assertEqual(report['counters'], {'series:auto': 4})
+        self.assertEqual(report['info']['file'], 'history.xlsx')
+        self.assertGreaterEqual(report['total_s'], sum(stage['duration_s'] for stage in report['stages']))
+        self.assertEqual(set(profile.stage_durations()), {'load', 'historical'})
+
+    def test_rss(self):
+        """Тест: RSS процесса доступен на Linux"""
+        if sys.platform.startswith('linux'):
+            self.assertGreater(current_rss_mb(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
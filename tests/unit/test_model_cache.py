@@ -0,0 +1,91 @@
+"""
+Unit тесты для дискового кэша моделей (model_cache.py)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.analysis import forecasting_models as fm
+from src.analysis.model_cache import ModelCache
+
+
+class TestModelCache(unittest.TestCase):
+    """Тесты хранения и вытеснения записей"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(11)
+        t = np.arange(36)
+        self.series = pd.Series(100 + 20 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 3, 36))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_key_depends_on_inputs(self):
+        """Тест: Ключ зависит от значений ряда, модели, сезонности и параметров"""
+        key = ModelCache.make_key([1, 2, 3], 'holt_winters', 12)
+        self.assertEqual(key, ModelCache.make_key(np.array([1.0, 2.0, 3.0]), 'holt_winters', 12))
+        self.assertNotEqual(key, ModelCache.make_key([1, 2, 4], 'holt_winters', 12))
+        self.assertNotEqual(key, ModelCache.make_key([1, 2, 3], 'sarima', 12))
+        self.assertNotEqual(key, ModelCache.make_key([1, 2, 3], 'holt_winters', 4))
+        self.assertNotEqual(key, ModelCache.make_key([1, 2, 3], 'holt_winters', 12, trend='mul'))
+
+    def test_put_get_roundtrip(self):
+        """Тест: Запись читается обратно, кортежи сохраняются как кортежи"""
+        cache = ModelCache(self.cache_dir)
+        cache.put('k', {'state': {'config': ('sarima', (1, 1, 1)), 'params': np.array([0.5, 1.5])}})
+        entry = ModelCache(self.cache_dir).get('k')
+        self.assertEqual(entry['state']['config'], ('sarima', (1, 1, 1)))
+        self.assertEqual(entry['state']['params'], (0.5, 1.5))
+        self.assertIsNone(cache.get('missing'))
+
+    def test_lru_eviction(self):
+        """Тест: При переполнении удаляются давно не использованные записи"""
+        cache = ModelCache(self.cache_dir, max_bytes=10 ** 6)
+        payload = {'data': 'x' * 100}
+        for i, key in enumerate(['a', 'b', 'c']):
+            cache.put(key, payload)
+            os.utime(os.path.join(self.cache_dir, key + ModelCache.SUFFIX), (1000 + i, 1000 + i))
+        cache.get('a')  # 'a' становится самой свежей
+
+        cache.max_bytes = cache.size_bytes
+        cache.put('d', payload)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertIn('d', cache)
+        self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+
+    def test_forecast_demand_uses_cache(self):
+        """Тест: Прогноз из кэша совпадает с подбором без кэша"""
+        cache = ModelCache(self.cache_dir)
+        for model in ['holt_winters', 'sarima']:
+            expected = fm.forecast_demand(self.series, horizon=3, model=model)['forecast']
+            first = fm.forecast_demand(self.series, horizon=3, model=model, cache=cache)['forecast']
+            second = fm.forecast_demand(self.series, horizon=3, model=model, cache=cache)['forecast']
+            np.testing.assert_allclose(first, expected)
+            np.testing.assert_allclose(second, expected, rtol=1e-6)
+        self.assertEqual(len(cache), 2)
+
+    def test_auto_selection_cached(self):
+        """Тест: Результат выбора модели сохраняется и переиспользуется"""
+        cache = ModelCache(self.cache_dir)
+        best, metrics = fm.auto_select_best_model(self.series, cache=cache)
+        self.assertEqual(len(cache), 1)
+        cached_best, cached_metrics = fm.auto_select_best_model(self.series, cache=cache)
+        self.assertEqual(cached_best, best)
+        self.assertAlmostEqual(cached_metrics[best]['MAPE'], metrics[best]['MAPE'])
+
+        # Изменившийся ряд - новая запись
+        fm.auto_select_best_model(pd.concat([self.series, pd.Series([120.0])]), cache=cache)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,191 @@
+"""
+Unit тесты для отмены и прогресса долгих этапов (src/utils/progress.py)
+"""
+import unittest
+import multiprocessing
+import threading
+import time
+import os
+import sys
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis.historical_analysis import analyze_historical_data
+from src.analysis.forecast_analysis import auto_forecast_demand, forecast_start_balance
+from src.analysis.pipeline import stage_message
+from src.utils.progress import AnalysisCancelled, CancellationToken, ProgressTracker, format_duration
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CancelAfterChecks(CancellationToken):
+    """Токен, который отменяется сам после заданного числа проверок"""
+
+    def __init__(self, checks):
+        super().__init__()
+        self.remaining = checks
+        self.checks = 0
+
+    def raise_if_cancelled(self):
+        self.checks += 1
+        self.remaining -= 1
+        if self.remaining < 0:
+            self.cancel()
+        super().raise_if_cancelled()
+
+
+class TestProgressTracker(unittest.TestCase):
+    """Тесты счетчика прогресса"""
+
+    def test_rate_and_eta(self):
+        """Тест: Скорость и оставшееся время считаются по обработанным группам"""
+        clock = FakeClock()
+        infos = []
+        tracker = ProgressTracker('forecast', 100, callback=infos.append, min_interval_s=0, clock=clock)
+        tracker.start()
+        clock.now = 5.0
+        tracker.advance(25)
+
+        self.assertEqual(infos[0]['done'], 0)
+        self.assertIsNone(infos[0]['eta_s'])
+        self.assertEqual(infos[-1]['done'], 25)
+        self.assertAlmostEqual(infos[-1]['fraction'], 0.25)
+        self.assertAlmostEqual(infos[-1]['rate_per_s'], 5.0)
+        self.assertAlmostEqual(infos[-1]['eta_s'], 15.0)
+        self.assertEqual(stage_message(infos[-1]), 'Прогноз спроса: 25 из 100 рядов, 5 рядов/с, осталось ~15 с')
+
+    def test_throttling_and_final_call(self):
+        """Тест: Callback не чаще min_interval_s, последний вызов - всегда"""
+        clock = FakeClock()
+        infos = []
+        tracker = ProgressTracker('historical', 10, callback=infos.append, min_interval_s=1.0, clock=clock)
+        tracker.start()
+        for _ in range(10):
+            clock.now += 0.1
+            tracker.advance()
+
+        self.assertEqual([info['done'] for info in infos], [0, 10])
+
+    def test_cancel(self):
+        """Тест: После отмены advance бросает AnalysisCancelled"""
+        token = CancellationToken()
+        tracker = ProgressTracker('historical', 3, cancel_token=token)
+        tracker.advance()
+        token.cancel()
+        with self.assertRaises(AnalysisCancelled):
+            tracker.advance()
+
+    def test_format_duration(self):
+        """Тест: Формат длительности для сообщений"""
+        self.assertEqual(format_duration(45.4), '45 с')
+        self.assertEqual(format_duration(185), '3 мин 05 с')
+        self.assertEqual(format_duration(3720), '1 ч 02 мин')
+        self.assertEqual(format_duration(None), '—')
+
+
+class TestCancellableAnalysis(unittest.TestCase):
+    """Тесты прогресса и отмены этапов анализа"""
+
+    def setUp(self):
+        self.df = gen.make_historical_data(n_materials=12, n_branches=2, n_periods=24, seed=3)
+        self.hist_args = (gen.DATE_COLUMN, gen.BRANCH_COLUMN, gen.MATERIAL_COLUMN, 'Начальный остаток',
+                          'Конечный остаток', 'Конечная стоимость', 0.05, 'Потребление')
+        self.forecast_args = (3, gen.DATE_COLUMN, gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN, 'Потребление')
+
+    def test_historical_blocks_match(self):
+        """Тест: Числовой расчет по блокам с прогрессом совпадает с расчетом одним вызовом"""
+        expected, _ = analyze_historical_data(self.df, *self.hist_args, output='numeric')
+        infos = []
+        actual, _ = analyze_historical_data(self.df, *self.hist_args, output='numeric', progress=infos.append,
+                                            cancel_token=CancellationToken())
+
+        pd.testing.assert_frame_equal(actual, expected)
+        self.assertEqual(infos[-1]['done'], 24)
+        self.assertEqual(infos[-1]['total'], 24)
+
+    def test_historical_string_engines(self):
+        """Тест: Строковые движки сообщают прогресс по группам и прерываются отменой"""
+        for engine in ('fast', 'loop'):
+            infos = []
+            analyze_historical_data(self.df, *self.hist_args, engine=engine, progress=infos.append)
+            self.assertEqual(infos[-1]['done'], 24, engine)
+
+            token = CancellationToken()
+            token.cancel()
+            with self.assertRaises(AnalysisCancelled):
+                analyze_historical_data(self.df, *self.hist_args, engine=engine, cancel_token=token)
+
+    def test_forecast_progress_sequential(self):
+        """Тест: Прогресс по рядам монотонный и доходит до общего числа, прогноз не меняется"""
+        expected = auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='moving_average')
+        infos = []
+        actual = auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='moving_average',
+                                      progress=infos.append)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        done = [info['done'] for info in infos]
+        self.assertEqual(done, sorted(done))
+        self.assertEqual(done[-1], 24)
+
+    def test_forecast_cancel_sequential(self):
+        """Тест: Последовательный прогноз прерывается на первой же проверке после отмены"""
+        token = CancelAfterChecks(10)
+        with self.assertRaises(AnalysisCancelled):
+            auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='moving_average',
+                                 cancel_token=token)
+        # После отмены работа не продолжается: проверка, бросившая исключение, - последняя
+        self.assertEqual(token.checks, 11)
+
+    def test_forecast_cancel_stops_pool(self):
+        """Тест: Отмена останавливает собственный пул процессов, не дожидаясь всех рядов"""
+        df = gen.make_historical_data(n_materials=100, n_branches=2, n_periods=36, seed=3)
+        token = CancellationToken()
+        timer = threading.Timer(0.5, token.cancel)
+        timer.start()
+        started = time.perf_counter()
+        try:
+            with self.assertRaises(AnalysisCancelled):
+                auto_forecast_demand(df, *self.forecast_args, forecast_model='auto', n_jobs=2,
+                                     cancel_token=token)
+        finally:
+            timer.cancel()
+
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_forecast_parallel_progress(self):
+        """Тест: Прогресс в пуле процессов доходит до общего числа рядов, прогноз не меняется"""
+        expected = auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='moving_average')
+        infos = []
+        actual = auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='moving_average',
+                                      n_jobs=2, progress=infos.append)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        self.assertEqual(infos[-1]['done'], 24)
+
+    def test_start_balance_progress(self):
+        """Тест: Прогноз начальных остатков сообщает прогресс по уникальным ключам"""
+        forecast_df = auto_forecast_demand(self.df.copy(), *self.forecast_args, forecast_model='naive')
+        columns = (gen.DATE_COLUMN, gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN, 'Конечный остаток',
+                   gen.DATE_COLUMN, gen.MATERIAL_COLUMN, gen.BRANCH_COLUMN)
+        expected = forecast_start_balance(self.df, forecast_df, *columns, forecast_model='moving_average')
+        infos = []
+        actual = forecast_start_balance(self.df, forecast_df, *columns, forecast_model='moving_average',
+                                        progress=infos.append)
+
+        pd.testing.assert_series_equal(actual, expected)
+        self.assertEqual(infos[-1]['done'], 24)
+        self.assertEqual(infos[-1]['stage'], 'start_balance')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
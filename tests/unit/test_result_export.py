@@ -0,0 +1,79 @@
+"""
+Unit тесты для выгрузки результатов в Parquet/CSV (result_export.py)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.utils.result_export import prepare_export_frame, write_result_table, export_result_tables
+
+
+def make_results_df():
+    """Таблица результатов с типизированными колонками"""
+    return pd.DataFrame({
+        'Материал': pd.Categorical(['MAT-1', 'MAT-2', 'MAT-1']),
+        'Дата': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-03-01']),
+        'average_usage': np.array([1.5, 2.25, np.nan], dtype=np.float32),
+        'periods': np.array([24, 12, 6], dtype=np.int32),
+        'excess_inventory': [True, False, True],
+        'Сезонность': [0.57, 'Н/Д', 1.2],
+        'Смешанная': [1.0, 2.0, None],
+    }).astype({'Смешанная': object})
+
+
+class TestResultExport(unittest.TestCase):
+    """Тесты выгрузки таблиц"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = make_results_df()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_prepare_mixed_columns(self):
+        """Тест: Числа в object-колонке становятся числами, смесь с текстом - строками"""
+        prepared = prepare_export_frame(self.df)
+        self.assertTrue(pd.api.types.is_float_dtype(prepared['Смешанная']))
+        self.assertTrue(pd.api.types.is_string_dtype(prepared['Сезонность']))
+        self.assertEqual(prepared['Сезонность'].tolist(), ['0.57', 'Н/Д', '1.2'])
+        self.assertEqual(prepared['average_usage'].dtype, np.float32)
+        self.assertEqual(self.df['Смешанная'].dtype, object)
+
+    def test_parquet_preserves_dtypes(self):
+        """Тест: Parquet сохраняет float32/int32/bool/категории/даты"""
+        path = write_result_table(self.df, os.path.join(self.tmp_dir, 'r.parquet'), 'parquet')
+        loaded = pd.read_parquet(path)
+        self.assertEqual(loaded['average_usage'].dtype, np.float32)
+        self.assertEqual(loaded['periods'].dtype, np.int32)
+        self.assertEqual(loaded['excess_inventory'].dtype, bool)
+        self.assertIsInstance(loaded['Материал'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(loaded['Дата']))
+        self.assertTrue(np.isnan(loaded['average_usage'].iloc[2]))
+
+    def test_csv_gzip_numbers(self):
+        """Тест: Сжатый CSV читается обратно с числовыми колонками"""
+        path = write_result_table(self.df, os.path.join(self.tmp_dir, 'r.csv.gz'), 'csv')
+        loaded = pd.read_csv(path, parse_dates=['Дата'])
+        self.assertEqual(loaded['periods'].tolist(), [24, 12, 6])
+        np.testing.assert_allclose(loaded['average_usage'], [1.5, 2.25, np.nan])
+        self.assertEqual(loaded['Дата'].dt.month.tolist(), [1, 2, 3])
+
+    def test_export_tables(self):
+        """Тест: Файлы называются по отчету, пустые таблицы пропускаются"""
+        paths = export_result_tables(self.tmp_dir, 'Отчет', {'История': self.df, 'Модели': None})
+        self.assertEqual(sorted(os.path.basename(path) for path in paths),
+                         ['Отчет_История.csv.gz', 'Отчет_История.parquet'])
+        with self.assertRaises(ValueError):
+            export_result_tables(self.tmp_dir, 'Отчет', {'История': self.df}, formats=['xlsx'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
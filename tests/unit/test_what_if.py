@@ -0,0 +1,116 @@
+"""
+Unit тесты для режима «что если» (what_if.py, pipeline.apply_parameters)
+"""
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks import data_generators as gen
+from src.analysis.pipeline import run_analysis, apply_parameters
+from src.analysis.what_if import PARAMETER_DEPENDENCIES
+
+
+class TestWhatIf(unittest.TestCase):
+    """Тесты пересчета зависящих от параметров результатов"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp_dir, 'history.parquet')
+        gen.make_historical_data(n_materials=6, n_branches=2, n_periods=30, seed=4).to_parquet(cls.path, index=False)
+        cls.config = {'historical_file': cls.path, 'forecast_mode': 'auto', 'forecast_model': 'naive',
+                      'forecast_periods': 4, 'safety_stock_pct': 0.2, 'interest_rate': 0.05, 'lead_time_days': 30}
+        cls.results = run_analysis(cls.config)
+        cls.new_parameters = {'safety_stock_pct': 0.35, 'interest_rate': 0.12, 'lead_time_days': 45}
+        cls.expected = run_analysis({**cls.config, **cls.new_parameters})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_apply_matches_full_run(self):
+        """Тест: Пересчет из кэша совпадает с полным запуском с новыми параметрами"""
+        updated = self.results['what_if'].apply(self.results, **self.new_parameters)
+        self.assertEqual(sorted(updated['what_if_changed']), sorted(PARAMETER_DEPENDENCIES))
+        pd.testing.assert_frame_equal(updated['historical_metrics'], self.expected['historical_metrics'])
+        pd.testing.assert_frame_equal(updated['historical'], self.expected['historical'])
+        pd.testing.assert_frame_equal(updated['forecast'], self.expected['forecast'])
+        self.assertEqual(updated['historical_explanation'], self.expected['historical_explanation'])
+        self.assertEqual(updated['forecast_explanation'], self.expected['forecast_explanation'])
+
+    def test_only_dependent_stages(self):
+        """Тест: Таблицы, не зависящие от измененного параметра, переиспользуются"""
+        updated = self.results['what_if'].apply(self.results, safety_stock_pct=0.5)
+        self.assertEqual(updated['what_if_changed'], ['safety_stock_pct'])
+        self.assertIs(updated['historical_metrics'], self.results['historical_metrics'])
+        self.assertIs(updated['historical'], self.results['historical'])
+        changed = [col for col in updated['forecast'].columns
+                   if not updated['forecast'][col].equals(self.results['forecast'][col])]
+        self.assertEqual(set(changed), {'Страховой запас', 'Рекомендация по закупке'})
+        # Исходные результаты не изменяются
+        self.assertEqual(self.results['config']['safety_stock_pct'], 0.2)
+
+        updated = self.results['what_if'].apply(self.results, lead_time_days=60)
+        self.assertIs(updated['forecast'], self.results['forecast'])
+        changed = [col for col in updated['historical_metrics'].columns
+                   if not updated['historical_metrics'][col].equals(self.results['historical_metrics'][col])]
+        self.assertEqual(changed, ['reorder_point'])
+
+    def test_apply_parameters_reuse_rules(self):
+        """Тест: Кэш используется, только если изменились лишь параметры «что если» и файл тот же"""
+        updated = apply_parameters(self.results, {**self.config, **self.new_parameters})
+        self.assertIsNotNone(updated)
+        pd.testing.assert_frame_equal(updated['forecast'], self.expected['forecast'])
+        self.assertEqual(updated['profile'].name, 'what_if')
+
+        self.assertIsNone(apply_parameters(self.results, {**self.config, 'forecast_periods': 6}))
+        self.assertIsNone(apply_parameters(None, self.config))
+
+        # Файл изменился - нужен полный запуск
+        results = dict(self.results, source_mtimes={self.path: 0.0})
+        self.assertIsNone(apply_parameters(results, self.config))
+
+    def test_sweep_grid(self):
+        """Тест: Сетка параметров одним вызовом совпадает с пересчетом по каждой точке"""
+        what_if = self.results['what_if']
+        sweep = what_if.sweep(safety_stock_pct=[0.1, 0.35], interest_rate=[0.05, 0.12], lead_time_days=[30, 45, 60])
+        self.assertEqual(len(sweep), 12)
+
+        row = sweep[(sweep['safety_stock_pct'] == 0.35) & (sweep['interest_rate'] == 0.12)
+                    & (sweep['lead_time_days'] == 45)].iloc[0]
+        metrics = self.expected['historical_metrics']
+        self.assertAlmostEqual(row['Упущенная выгода'], metrics['lost_profit'].sum())
+        self.assertAlmostEqual(row['Точка заказа (сумма)'], metrics['reorder_point'].sum())
+        _, recommendation = what_if.recommendations(0.35)
+        self.assertAlmostEqual(row['Объем закупок'], recommendation.sum())
+        self.assertEqual(row['Строк с закупкой'], int((recommendation > 0).sum()))
+
+        arrays = what_if.sweep_arrays(safety_stock_pct=[0.1, 0.2, 0.35], lead_time_days=[30, 45])
+        self.assertEqual(arrays['recommendation'].shape, (3, len(what_if.demand)))
+        self.assertEqual(arrays['reorder_point'].shape, (2, len(metrics)))
+        self.assertEqual(arrays['lost_profit'].shape, (1, len(metrics)))
+        np.testing.assert_array_equal(arrays['reorder_point'][1], metrics['reorder_point'].to_numpy())
+
+    def test_sweep_block_size(self):
+        """Тест: Разбиение сетки на блоки не меняет итогов"""
+        import src.analysis.what_if as wi
+        what_if = self.results['what_if']
+        grid = np.linspace(0, 1, 11)
+        expected = what_if.sweep(safety_stock_pct=grid)
+        original = wi.SWEEP_BLOCK_ELEMENTS
+        wi.SWEEP_BLOCK_ELEMENTS = len(what_if.demand) * 2
+        try:
+            pd.testing.assert_frame_equal(what_if.sweep(safety_stock_pct=grid), expected)
+        finally:
+            wi.SWEEP_BLOCK_ELEMENTS = original
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)